@@ -4,6 +4,38 @@ import mediapipe as mp
 from PIL import Image, ImageDraw, ImageFilter
 import colorsys
 import math
+from src.color_index import SKIN_TONE_PALETTES
+
+# ملفات تعريف محرك كشف الوجه
+# lite: بدون تحسين نقاط القزحية للإطارات الحية (أحمر الشفاه والبلاشر لا تحتاجها)
+# full: مع تحسين النقاط لعرض الإطلالات المحفوظة وظل العيون
+ENGINE_PROFILES = {
+    'lite': {
+        'static_image_mode': False,
+        'refine_landmarks': False,
+        'min_detection_confidence': 0.5,
+        'min_tracking_confidence': 0.5
+    },
+    'full': {
+        'static_image_mode': True,
+        'refine_landmarks': True,
+        'min_detection_confidence': 0.5,
+        'min_tracking_confidence': 0.5
+    }
+}
+
+DEFAULT_PROFILE = 'full'
+
+# أنواع المكياج التي تحتاج إلى نقاط العين المحسنة
+EYE_MAKEUP_TYPES = {'eyeshadow'}
+
+def select_profile(makeup_config):
+    """
+    اختيار ملف تعريف المحرك المناسب لتكوين المكياج
+    """
+    if any(makeup_type in EYE_MAKEUP_TYPES for makeup_type in makeup_config):
+        return 'full'
+    return 'lite'
 
 class GlowMirrorAI:
     """
@@ -11,7 +43,12 @@ class GlowMirrorAI:
     يتضمن جميع وظائف كشف الوجه وتطبيق المكياج والتوصيات الذكية
     """
     
-    def __init__(self):
+    def __init__(self, profile=DEFAULT_PROFILE):
+        if profile not in ENGINE_PROFILES:
+            raise ValueError(f"Unknown engine profile: {profile}")
+        
+        self.profile = profile
+        
         # تهيئة MediaPipe للوجه
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_drawing = mp.solutions.drawing_utils
@@ -19,11 +56,8 @@ class GlowMirrorAI:
         
         # تهيئة كاشف الوجه
         self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
             max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
+            **ENGINE_PROFILES[profile]
         )
         
         # نقاط الوجه المهمة
@@ -230,27 +264,10 @@ class GlowMirrorAI:
 
     def get_color_recommendations(self, skin_tone):
         """
-        الحصول على توصيات الألوان بناءً على لون البشرة
+        الحصول على لوحة الألوان المستهدفة بناءً على لون البشرة
+        (التوصيات الفعلية من المنتجات المتوفرة تأتي من فهرس الألوان)
         """
-        recommendations = {
-            'light': {
-                'lipstick': ['#ff6b9d', '#ff7675', '#fd79a8', '#e84393'],
-                'eyeshadow': ['#a55eea', '#3742fa', '#ff6348', '#f8b500'],
-                'blush': ['#ff9ff3', '#ff6b9d', '#fd79a8', '#ff7675']
-            },
-            'medium': {
-                'lipstick': ['#ff4757', '#c44569', '#f8b500', '#e84393'],
-                'eyeshadow': ['#2f3542', '#ff6348', '#ff9ff3', '#a55eea'],
-                'blush': ['#ff7675', '#fd79a8', '#e84393', '#c44569']
-            },
-            'dark': {
-                'lipstick': ['#c44569', '#8b0000', '#ff4757', '#e84393'],
-                'eyeshadow': ['#2f3542', '#8b4513', '#ff6348', '#a55eea'],
-                'blush': ['#e84393', '#ff7675', '#c44569', '#ff4757']
-            }
-        }
-        
-        return recommendations.get(skin_tone, recommendations['medium'])
+        return SKIN_TONE_PALETTES.get(skin_tone, SKIN_TONE_PALETTES['medium'])
 
     def enhance_image_quality(self, image):
         """
@@ -6,20 +6,43 @@ from werkzeug.utils import secure_filename
 import base64
 from io import BytesIO
 from PIL import Image
-from src.ai_engine import GlowMirrorAI
+from src.ai_engine import GlowMirrorAI, ENGINE_PROFILES, DEFAULT_PROFILE, select_profile
+from src.upload_store import UploadStore, UploadError
+from src.color_index import color_index
+from src.derivatives import DERIVATIVE_FORMATS, derivative_store, derivative_urls
 
 ai_bp = Blueprint('ai', __name__)
 
-# تهيئة محرك الذكاء الاصطناعي
-ai_engine = GlowMirrorAI()
+# تهيئة محرك ذكاء اصطناعي جاهز لكل ملف تعريف
+ai_engines = {profile: GlowMirrorAI(profile) for profile in ENGINE_PROFILES}
+ai_engine = ai_engines[DEFAULT_PROFILE]
+
+def get_ai_engine(data, default_profile):
+    """اختيار محرك الذكاء الاصطناعي حسب ملف التعريف المطلوب"""
+    profile = data.get('profile') or default_profile
+    return ai_engines.get(profile)
+
+def invalid_profile_response():
+    """استجابة خطأ لملف تعريف غير صالح"""
+    return jsonify({
+        'success': False,
+        'error': f"Invalid profile. Must be one of: {', '.join(ai_engines)}"
+    }), 400
 
 # مجلد حفظ الصور
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'uploads')
-PROCESSED_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'processed')
 
 # إنشاء المجلدات إذا لم تكن موجودة
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+
+# مخزن الصور المرفوعة حسب بصمة المحتوى
+upload_store = UploadStore(
+    UPLOAD_FOLDER,
+    max_file_size=int(os.environ.get('GLOWMIRROR_UPLOAD_MAX_MB', 16)) * 1024 * 1024,
+    quota_bytes=int(os.environ.get('GLOWMIRROR_UPLOAD_QUOTA_MB', 1024)) * 1024 * 1024,
+    ttl_seconds=int(os.environ.get('GLOWMIRROR_UPLOAD_TTL', 24 * 60 * 60))
+)
+upload_store.start_sweeper()
 
 def allowed_file(filename):
     """التحقق من امتداد الملف المسموح"""
@@ -51,6 +74,20 @@ def base64_to_image(base64_string):
     except Exception as e:
         return None
 
+def load_request_image(data):
+    """تحميل الصورة من base64 أو من بصمة ملف مرفوع مسبقاً"""
+    if data.get('upload_hash'):
+        path = upload_store.resolve(data['upload_hash'])
+        if path is None:
+            return None, ('Upload not found', 404)
+        image = cv2.imread(path)
+    else:
+        image = base64_to_image(data['image'])
+    
+    if image is None:
+        return None, ('Invalid image format', 400)
+    return image, None
+
 def image_to_base64(image):
     """تحويل الصورة إلى base64"""
     try:
@@ -77,22 +114,25 @@ def detect_face():
     try:
         data = request.get_json()
         
-        if 'image' not in data:
+        if 'image' not in data and 'upload_hash' not in data:
             return jsonify({
                 'success': False,
                 'error': 'No image provided'
             }), 400
         
-        # تحويل base64 إلى صورة
-        image = base64_to_image(data['image'])
+        # تحويل base64 أو الملف المرفوع إلى صورة
+        image, error = load_request_image(data)
         if image is None:
             return jsonify({
                 'success': False,
-                'error': 'Invalid image format'
-            }), 400
+                'error': error[0]
+            }), error[1]
         
         # كشف الوجه
-        result = ai_engine.detect_face_landmarks(image)
+        engine = get_ai_engine(data, 'lite')
+        if engine is None:
+            return invalid_profile_response()
+        result = engine.detect_face_landmarks(image)
         
         return jsonify(result), 200 if result['success'] else 400
         
@@ -108,29 +148,51 @@ def apply_makeup():
     try:
         data = request.get_json()
         
-        if 'image' not in data or 'makeup_config' not in data:
+        if ('image' not in data and 'upload_hash' not in data) or 'makeup_config' not in data:
             return jsonify({
                 'success': False,
                 'error': 'Missing image or makeup configuration'
             }), 400
         
-        # تحويل base64 إلى صورة
-        image = base64_to_image(data['image'])
-        if image is None:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid image format'
-            }), 400
-        
-        # حفظ الصورة مؤقتاً
-        temp_filename = 'temp_image.jpg'
-        temp_path = os.path.join(UPLOAD_FOLDER, temp_filename)
-        cv2.imwrite(temp_path, image)
+        # اختيار المحرك (أحمر الشفاه والبلاشر لا يحتاجان تحسين نقاط العين)
+        engine = get_ai_engine(data, select_profile(data['makeup_config']))
+        if engine is None:
+            return invalid_profile_response()
+        
+        temp_path = None
+        if data.get('upload_hash'):
+            # استخدام الملف المرفوع مباشرة دون نسخة مؤقتة
+            image_path = upload_store.resolve(data['upload_hash'])
+            if image_path is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Upload not found'
+                }), 404
+        else:
+            # تحويل base64 إلى صورة
+            image = base64_to_image(data['image'])
+            if image is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid image format'
+                }), 400
+            
+            # حفظ الصورة مؤقتاً
+            temp_filename = 'temp_image.jpg'
+            temp_path = os.path.join(UPLOAD_FOLDER, temp_filename)
+            cv2.imwrite(temp_path, image)
+            image_path = temp_path
         
         # تطبيق المكياج
-        result = ai_engine.process_makeup_application(temp_path, data['makeup_config'])
-        
-        if result['success']:
+        result = engine.process_makeup_application(image_path, data['makeup_config'])
+        
+        if result['success'] and data.get('save_result'):
+            # حفظ النتيجة مرة واحدة بجميع المقاسات وإرجاع الروابط بدلاً من base64
+            render_id = derivative_store.save(result['image'])
+            result['render_id'] = render_id
+            result['derivatives'] = derivative_urls(render_id)
+            del result['image']
+        elif result['success']:
             # تحويل الصورة المعالجة إلى base64
             processed_image_base64 = image_to_base64(result['image'])
             
@@ -143,7 +205,7 @@ def apply_makeup():
                 result['error'] = 'Failed to encode processed image'
         
         # حذف الملف المؤقت
-        if os.path.exists(temp_path):
+        if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
         
         return jsonify(result), 200 if result['success'] else 400
@@ -160,31 +222,34 @@ def analyze_skin_tone():
     try:
         data = request.get_json()
         
-        if 'image' not in data:
+        if 'image' not in data and 'upload_hash' not in data:
             return jsonify({
                 'success': False,
                 'error': 'No image provided'
             }), 400
         
-        # تحويل base64 إلى صورة
-        image = base64_to_image(data['image'])
+        # تحويل base64 أو الملف المرفوع إلى صورة
+        image, error = load_request_image(data)
         if image is None:
             return jsonify({
                 'success': False,
-                'error': 'Invalid image format'
-            }), 400
+                'error': error[0]
+            }), error[1]
         
         # كشف الوجه أولاً
-        face_result = ai_engine.detect_face_landmarks(image)
+        engine = get_ai_engine(data, 'lite')
+        if engine is None:
+            return invalid_profile_response()
+        face_result = engine.detect_face_landmarks(image)
         if not face_result['success']:
             return jsonify(face_result), 400
         
         # تحليل لون البشرة
-        skin_result = ai_engine.analyze_skin_tone(image, face_result)
+        skin_result = engine.analyze_skin_tone(image, face_result)
         
         if skin_result['success']:
             # الحصول على توصيات الألوان
-            recommendations = ai_engine.get_color_recommendations(skin_result['skin_tone'])
+            recommendations = color_index.recommend_for_skin_tone(skin_result['skin_tone'])
             skin_result['color_recommendations'] = recommendations
         
         return jsonify(skin_result), 200 if skin_result['success'] else 400
@@ -201,19 +266,19 @@ def enhance_image():
     try:
         data = request.get_json()
         
-        if 'image' not in data:
+        if 'image' not in data and 'upload_hash' not in data:
             return jsonify({
                 'success': False,
                 'error': 'No image provided'
             }), 400
         
-        # تحويل base64 إلى صورة
-        image = base64_to_image(data['image'])
+        # تحويل base64 أو الملف المرفوع إلى صورة
+        image, error = load_request_image(data)
         if image is None:
             return jsonify({
                 'success': False,
-                'error': 'Invalid image format'
-            }), 400
+                'error': error[0]
+            }), error[1]
         
         # تحسين الصورة
         result = ai_engine.enhance_image_quality(image)
@@ -248,7 +313,8 @@ def get_color_recommendations(skin_tone):
                 'error': 'Invalid skin tone. Must be light, medium, or dark'
             }), 400
         
-        recommendations = ai_engine.get_color_recommendations(skin_tone)
+        # أقرب الدرجات المتوفرة في المخزون إلى لوحة لون البشرة
+        recommendations = color_index.recommend_for_skin_tone(skin_tone)
         
         return jsonify({
             'success': True,
@@ -262,43 +328,78 @@ def get_color_recommendations(skin_tone):
             'error': str(e)
         }), 500
 
+@ai_bp.route('/processed/<render_id>/<size>.<fmt>', methods=['GET'])
+def get_processed_image(render_id, size, fmt):
+    """تقديم صورة معالجة بمقاس وصيغة محددين"""
+    path = derivative_store.path_for(render_id, size, fmt)
+    if path is None or not os.path.exists(path):
+        return jsonify({
+            'success': False,
+            'error': 'Image not found'
+        }), 404
+    
+    # المحتوى ثابت لكل رابط، لذلك الـ ETag قوي والتخزين المؤقت طويل
+    response = send_file(
+        path,
+        mimetype=DERIVATIVE_FORMATS[fmt]['mimetype'],
+        etag=f"{render_id}-{size}-{fmt}",
+        conditional=True,
+        max_age=365 * 24 * 60 * 60
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @ai_bp.route('/upload-image', methods=['POST'])
 def upload_image():
     """رفع صورة للمعالجة"""
     try:
-        if 'file' not in request.files:
-            return jsonify({
-                'success': False,
-                'error': 'No file provided'
-            }), 400
+        if request.mimetype and request.mimetype.startswith('image/'):
+            # جسم الطلب هو الصورة نفسها: تدفق مباشر إلى القرص
+            filename = None
+            stream = request.stream
+        else:
+            if 'file' not in request.files:
+                return jsonify({
+                    'success': False,
+                    'error': 'No file provided'
+                }), 400
+            
+            file = request.files['file']
+            
+            if file.filename == '':
+                return jsonify({
+                    'success': False,
+                    'error': 'No file selected'
+                }), 400
+            
+            if not allowed_file(file.filename):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid file type'
+                }), 400
+            
+            filename = secure_filename(file.filename)
+            stream = file.stream
         
-        file = request.files['file']
+        # الحفظ حسب بصمة المحتوى مع إزالة التكرار
+        stored = upload_store.save(stream)
         
-        if file.filename == '':
-            return jsonify({
-                'success': False,
-                'error': 'No file selected'
-            }), 400
+        return jsonify({
+            'success': True,
+            'filename': filename,
+            'upload_hash': stored['hash'],
+            'size': stored['size'],
+            'deduplicated': stored['deduplicated']
+        }), 200
         
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
-            
-            return jsonify({
-                'success': True,
-                'filename': filename,
-                'filepath': filepath
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid file type'
-            }), 400
-            
+    except UploadError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
-
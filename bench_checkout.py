@@ -0,0 +1,109 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Checkout load test with idempotent retries')
+    parser.add_argument('--users', type=int, default=32, help='concurrent shoppers')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--retry-rate', type=float, default=0.2, help='share of checkouts retried with the same key')
+    parser.add_argument('--lines', type=int, default=3, help='cart lines per checkout')
+    args = parser.parse_args()
+
+    # Throwaway database; must be set before the app is imported
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{path}'
+
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.product import Product, ProductColor
+    from src.models.order import Order
+    from src.models.payment import PaymentMethod
+
+    with app.app_context():
+        products = []
+        for index in range(20):
+            product = Product(name=f'Product {index}', category='lipstick', brand='Bench', price=50.0 + index)
+            product.colors.append(ProductColor(color_name='Shade', color_hex='#c44569', stock_quantity=10 ** 6))
+            products.append(product)
+        db.session.add_all(products)
+        db.session.add(PaymentMethod(name='credit_card', display_name='Card', is_active=True))
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        catalog = [(product.id, product.colors[0].id) for product in products]
+        user_ids = [user.id for user in users]
+        payment_method_id = PaymentMethod.query.first().id
+
+    latencies = []
+    counts = {'checkouts': 0, 'replays': 0, 'errors': 0}
+    keys = set()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def shopper(user_id):
+        client = app.test_client()
+        rng = random.Random(user_id)
+        while time.perf_counter() < deadline:
+            items = [
+                {'product_id': product_id, 'color_id': color_id, 'quantity': rng.randint(1, 3)}
+                for product_id, color_id in rng.sample(catalog, args.lines)
+            ]
+            client.post(f'/api/cart/{user_id}/items', json={'items': items})
+
+            key = uuid.uuid4().hex
+            body = {'user_id': user_id, 'payment_method_id': payment_method_id, 'shipping_address': 'Riyadh'}
+            attempts = 2 if rng.random() < args.retry_rate else 1
+            for _ in range(attempts):
+                started = time.perf_counter()
+                response = client.post('/api/checkout', json=body, headers={'Idempotency-Key': key})
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if response.status_code != 200:
+                        counts['errors'] += 1
+                    elif response.headers.get('Idempotent-Replayed'):
+                        counts['replays'] += 1
+                    else:
+                        counts['checkouts'] += 1
+                        keys.add(key)
+                        latencies.append(elapsed * 1000)
+
+            # Checkout leaves the cart for payment; empty it for the next round
+            client.delete(f'/api/cart/{user_id}/clear')
+
+    threads = [threading.Thread(target=shopper, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        orders = Order.query.count()
+
+    print(f"shoppers: {args.users}, duration: {args.duration}s, retry rate: {args.retry_rate}")
+    print(f"checkouts: {counts['checkouts']} ({counts['checkouts'] / args.duration:.1f}/s), "
+          f"replayed retries: {counts['replays']}, errors: {counts['errors']}")
+    if latencies:
+        print(f"latency ms: p50 {percentile(latencies, 0.5):.1f}, p95 {percentile(latencies, 0.95):.1f}, "
+              f"p99 {percentile(latencies, 0.99):.1f}")
+    print(f"orders in database: {orders} (distinct keys: {len(keys)}) -> "
+          f"{'no duplicates' if orders == len(keys) else 'DUPLICATES'}")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
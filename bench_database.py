@@ -0,0 +1,111 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import random
+import argparse
+import tempfile
+import threading
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src.database_config import engine_options, install_sqlite_pragmas
+
+def make_engine(path, tuned, environment):
+    """Bare engine (previous main.py setup) or the configured profile"""
+    uri = f"sqlite:///{path}"
+    if not tuned:
+        return create_engine(uri)
+    engine = create_engine(uri, **engine_options(uri, environment))
+    install_sqlite_pragmas(engine, environment)
+    return engine
+
+def setup(engine, carts):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE cart_item (id INTEGER PRIMARY KEY, cart_id INTEGER NOT NULL, '
+            'product_id INTEGER NOT NULL, quantity INTEGER NOT NULL)'
+        ))
+        connection.execute(text('CREATE INDEX ix_cart_item_cart_id ON cart_item (cart_id)'))
+        connection.execute(
+            text('INSERT INTO cart_item (cart_id, product_id, quantity) VALUES (:c, :p, 1)'),
+            [{'c': cart, 'p': product} for cart in range(carts) for product in range(3)]
+        )
+
+def run(tuned, readers, writers, duration, environment):
+    """Mixed read/write load from concurrent shoppers; returns throughput numbers"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    carts = 1000
+
+    engine = make_engine(path, tuned, environment)
+    setup(engine, carts)
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def reader():
+        while time.perf_counter() < deadline:
+            try:
+                with engine.connect() as connection:
+                    connection.execute(
+                        text('SELECT * FROM cart_item WHERE cart_id = :c'),
+                        {'c': random.randrange(carts)}
+                    ).fetchall()
+                key = 'reads'
+            except OperationalError:
+                key = 'locked'
+            with lock:
+                counts[key] += 1
+
+    def writer():
+        while time.perf_counter() < deadline:
+            cart = random.randrange(carts)
+            try:
+                with engine.begin() as connection:
+                    connection.execute(
+                        text('UPDATE cart_item SET quantity = quantity + 1 WHERE cart_id = :c'),
+                        {'c': cart}
+                    )
+                    connection.execute(
+                        text('INSERT INTO cart_item (cart_id, product_id, quantity) VALUES (:c, 99, 1)'),
+                        {'c': cart}
+                    )
+                key = 'writes'
+            except OperationalError:
+                key = 'locked'
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    return {key: value / duration for key, value in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite engine profile concurrency benchmark')
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--env', default='production')
+    args = parser.parse_args()
+
+    print(f"readers: {args.readers}, writers: {args.writers}, duration: {args.duration}s")
+    print(f"{'engine':>10} {'reads/s':>10} {'writes/s':>10} {'locked/s':>10}")
+    for label, tuned in (('default', False), (args.env, True)):
+        result = run(tuned, args.readers, args.writers, args.duration, args.env)
+        print(f"{label:>10} {result['reads']:>10.0f} {result['writes']:>10.0f} {result['locked']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming finance export throughput and memory')
+    parser.add_argument('--rows', type=int, default=1000000, help='payment transactions to export')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    args = parser.parse_args()
+
+    # Throwaway database and export directory; must be set before the app is imported
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    out = tempfile.mkdtemp()
+    os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{path}'
+
+    from sqlalchemy import insert
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.order import Order
+    from src.models.payment import PaymentMethod, PaymentTransaction
+    from src.exports import export_to_file
+
+    with app.app_context():
+        user = User(username='finance', email='finance@example.com')
+        method = PaymentMethod(name='mada', display_name='Mada', is_active=True)
+        db.session.add_all([user, method])
+        db.session.flush()
+        order = Order(user_id=user.id, total_amount=100.0, status='confirmed')
+        db.session.add(order)
+        db.session.flush()
+
+        base = datetime.utcnow() - timedelta(days=2)
+        for start in range(0, args.rows, 50000):
+            db.session.execute(insert(PaymentTransaction), [
+                {
+                    'transaction_id': f'TXN_{index:012d}', 'order_id': order.id, 'payment_method_id': method.id,
+                    'amount': 100.0, 'currency': 'SAR', 'status': 'completed',
+                    'created_at': base + timedelta(milliseconds=index), 'updated_at': base + timedelta(milliseconds=index)
+                }
+                for index in range(start, min(start + 50000, args.rows))
+            ])
+        db.session.commit()
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        file_path, _, until = export_to_file('transactions', args.format, out)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as exported:
+            lines = sum(1 for _ in exported)
+
+        # A second incremental run only picks up rows changed since the watermark
+        db.session.query(PaymentTransaction).filter(PaymentTransaction.id <= 10).update(
+            {'status': 'refunded', 'updated_at': until + timedelta(seconds=1)}, synchronize_session=False
+        )
+        db.session.commit()
+        second_path, since, _ = export_to_file('transactions', args.format, out, grace_seconds=0)
+        with open(second_path, 'rb') as exported:
+            second_lines = sum(1 for _ in exported)
+
+    header = 1 if args.format == 'csv' else 0
+    print(f"rows: {args.rows}, format: {args.format}")
+    print(f"exported {lines - header} rows, {size / 1e6:.1f} MB in {elapsed:.1f}s "
+          f"({(lines - header) / elapsed:.0f} rows/s), peak Python memory {peak / 1e6:.1f} MB")
+    print(f"incremental run since {since.isoformat()}: {second_lines - header} rows (expected 10)")
+
+    for name in os.listdir(out):
+        os.remove(os.path.join(out, name))
+    os.rmdir(out)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
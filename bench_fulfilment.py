@@ -0,0 +1,98 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk order status transitions versus one request per order')
+    parser.add_argument('--orders', type=int, default=10000, help='orders in the fulfilment batch')
+    parser.add_argument('--single', type=int, default=500, help='orders updated one request at a time for comparison')
+    parser.add_argument('--cancel-rate', type=float, default=0.05, help='share of the batch cancelled instead of shipped')
+    args = parser.parse_args()
+
+    # Throwaway database; must be set before the app is imported
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{path}'
+
+    from sqlalchemy import insert
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.product import Product, ProductColor
+    from src.models.order import Order
+    from src.models.stock_reservation import StockReservation
+
+    total = args.orders + args.single
+    with app.app_context():
+        product = Product(name='Fulfilment lipstick', category='lipstick', brand='Bench', price=49.0)
+        product.colors.append(ProductColor(color_name='Ruby', color_hex='#c44569', stock_quantity=0))
+        user = User(username='warehouse', email='warehouse@example.com')
+        db.session.add_all([product, user])
+        db.session.flush()
+        color_id = product.colors[0].id
+
+        db.session.execute(insert(Order), [
+            {'user_id': user.id, 'total_amount': 49.0, 'status': 'confirmed'} for _ in range(total)
+        ])
+        order_ids = db.session.query(Order.id).order_by(Order.id).all()
+        order_ids = [order_id for order_id, in order_ids]
+        db.session.execute(insert(StockReservation), [
+            {'order_id': order_id, 'color_id': color_id, 'quantity': 1, 'status': 'committed',
+             'expires_at': datetime.utcnow() + timedelta(minutes=15)}
+            for order_id in order_ids
+        ])
+        db.session.commit()
+
+    client = app.test_client()
+    single_ids, batch_ids = order_ids[:args.single], order_ids[args.single:]
+
+    started = time.perf_counter()
+    for order_id in single_ids:
+        client.put(f'/api/orders/{order_id}/status', json={'status': 'shipped'})
+    single_elapsed = time.perf_counter() - started
+
+    cancel_every = int(1 / args.cancel_rate) if args.cancel_rate else 0
+    lines = [
+        {'id': order_id, 'status': 'cancelled' if cancel_every and index % cancel_every == 0 else 'shipped'}
+        for index, order_id in enumerate(batch_ids)
+    ]
+    body = '\n'.join(json.dumps(line) for line in lines)
+
+    started = time.perf_counter()
+    response = client.post('/api/orders/status', data=body, content_type='application/x-ndjson')
+    bulk_elapsed = time.perf_counter() - started
+    shipped = response.get_json()
+
+    # Re-sending the same batch is harmless: everything is already in its target status
+    replay = client.post('/api/orders/status', data=body, content_type='application/x-ndjson').get_json()
+
+    started = time.perf_counter()
+    delivered = client.post('/api/orders/status', json={'updates': [
+        {'id': line['id'], 'status': 'delivered'} for line in lines
+    ]}).get_json()
+    deliver_elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stock = db.session.get(ProductColor, color_id).stock_quantity
+    cancelled = sum(1 for line in lines if line['status'] == 'cancelled')
+
+    per_order = single_elapsed / args.single
+    print(f"one request per order: {args.single} orders in {single_elapsed:.2f}s "
+          f"({per_order * 1000:.1f}ms each, ~{per_order * args.orders:.0f}s for {args.orders})")
+    print(f"bulk ship/cancel: {args.orders} orders in {bulk_elapsed:.2f}s "
+          f"({args.orders / bulk_elapsed:.0f} orders/s), counts {shipped['counts']}")
+    print(f"bulk deliver: {deliver_elapsed:.2f}s, counts {delivered['counts']}")
+    print(f"replayed batch: counts {replay['counts']}")
+    print(f"stock returned by cancellations: {stock} (expected {cancelled})")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
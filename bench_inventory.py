@@ -0,0 +1,91 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import argparse
+import tempfile
+import threading
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Flash-sale contention on a single shade')
+    parser.add_argument('--buyers', type=int, default=300, help='concurrent buyers of the same colour')
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--quantity', type=int, default=1, help='units per order')
+    args = parser.parse_args()
+
+    # Throwaway database; must be set before the app is imported
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{path}'
+
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.product import Product, ProductColor
+    from src.models.order import Order
+    from src.inventory import OutOfStockError, reserve
+
+    with app.app_context():
+        product = Product(name='Flash sale lipstick', category='lipstick', brand='Bench', price=49.0)
+        product.colors.append(ProductColor(color_name='Ruby', color_hex='#c44569', stock_quantity=args.stock))
+        user = User(username='flash', email='flash@example.com')
+        db.session.add_all([product, user])
+        db.session.commit()
+        color_id, user_id = product.colors[0].id, user.id
+
+    latencies = []
+    counts = {'sold': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(args.buyers)
+
+    def buyer():
+        with app.app_context():
+            start.wait()
+            started = time.perf_counter()
+            try:
+                # Same write section as checkout: the order row, then the reservation
+                order = Order(user_id=user_id, total_amount=49.0 * args.quantity, status='pending')
+                db.session.add(order)
+                db.session.flush()
+                reserve(order.id, [(color_id, args.quantity)])
+                db.session.commit()
+                key = 'sold'
+            except OutOfStockError:
+                db.session.rollback()
+                key = 'rejected'
+            except Exception:
+                db.session.rollback()
+                key = 'errors'
+            elapsed = time.perf_counter() - started
+            with lock:
+                counts[key] += 1
+                latencies.append(elapsed * 1000)
+
+    threads = [threading.Thread(target=buyer) for _ in range(args.buyers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        remaining = db.session.get(ProductColor, color_id).stock_quantity
+
+    expected = min(args.buyers, args.stock // args.quantity)
+    print(f"buyers: {args.buyers}, stock: {args.stock}, units per order: {args.quantity}")
+    print(f"sold: {counts['sold']} (expected {expected}), rejected: {counts['rejected']}, errors: {counts['errors']}")
+    print(f"remaining stock: {remaining} -> {'no oversell' if remaining >= 0 and counts['sold'] <= expected else 'OVERSOLD'}")
+    print(f"{args.buyers / elapsed:.0f} attempts/s; latency ms: p50 {percentile(latencies, 0.5):.1f}, "
+          f"p95 {percentile(latencies, 0.95):.1f}, max {max(latencies):.1f}")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import random
+import secrets
+import argparse
+import tempfile
+import threading
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Payment throughput against the local mock gateway')
+    parser.add_argument('--users', type=int, default=32, help='concurrent shoppers')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='share of gateway calls answered with 503')
+    parser.add_argument('--decline-rate', type=float, default=0.05)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--webhook', action='store_true', help='gateway answers pending and reports results by webhook')
+    args = parser.parse_args()
+
+    from werkzeug.serving import make_server
+    from src.mock_gateway import start_in_thread
+    gateway = start_in_thread(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+        decline_rate=args.decline_rate, timeout_rate=args.timeout_rate, hang_seconds=5.0
+    )
+    host, port = gateway.server_address
+
+    # Throwaway database and gateway URL; must be set before the app is imported
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{path}'
+    os.environ['GLOWMIRROR_GATEWAY_URL'] = f'http://{host}:{port}'
+    os.environ.setdefault('GLOWMIRROR_GATEWAY_CREDIT_CARD_TIMEOUT', '1,2')
+    os.environ['GLOWMIRROR_GATEWAY_WEBHOOK_SECRET'] = secrets.token_hex(32)
+
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.product import Product, ProductColor
+    from src.models.payment import PaymentMethod, PaymentTransaction
+    from src.gateway_client import gateway_client
+
+    with app.app_context():
+        products = []
+        for index in range(20):
+            product = Product(name=f'Product {index}', category='lipstick', brand='Bench', price=50.0 + index)
+            product.colors.append(ProductColor(color_name='Shade', color_hex='#c44569', stock_quantity=10 ** 6))
+            products.append(product)
+        db.session.add_all(products)
+        db.session.add(PaymentMethod(name='credit_card', display_name='Card', is_active=True))
+        users = [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        catalog = [(product.id, product.colors[0].id) for product in products]
+        user_ids = [user.id for user in users]
+        payment_method_id = PaymentMethod.query.first().id
+
+    if args.webhook:
+        # Serve the app over HTTP so the mock gateway can call /api/payment-webhook
+        app_server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=app_server.serve_forever, daemon=True).start()
+        gateway.config['webhook_url'] = f'http://127.0.0.1:{app_server.server_port}/api/payment-webhook'
+        gateway.config['webhook_secret'] = os.environ['GLOWMIRROR_GATEWAY_WEBHOOK_SECRET']
+
+    latencies = []
+    counts = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def shopper(user_id):
+        client = app.test_client()
+        rng = random.Random(user_id)
+        while time.perf_counter() < deadline:
+            product_id, color_id = rng.choice(catalog)
+            client.post(f'/api/cart/{user_id}/items', json={'items': [{'product_id': product_id, 'color_id': color_id}]})
+            checkout = client.post('/api/checkout', json={
+                'user_id': user_id, 'payment_method_id': payment_method_id, 'shipping_address': 'Riyadh'
+            }).get_json()
+            if not checkout.get('success'):
+                client.delete(f'/api/cart/{user_id}/clear')
+                continue
+
+            started = time.perf_counter()
+            response = client.post('/api/process-payment', json={
+                'transaction_id': checkout['transaction_id'], 'card_data': {'token': 'tok_bench'}
+            })
+            elapsed = time.perf_counter() - started
+            with lock:
+                counts[response.status_code] = counts.get(response.status_code, 0) + 1
+                latencies.append(elapsed * 1000)
+            client.delete(f'/api/cart/{user_id}/clear')
+
+    threads = [threading.Thread(target=shopper, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Wait for outstanding gateway calls and webhooks to settle
+    settle_deadline = time.perf_counter() + 30
+    with app.app_context():
+        while time.perf_counter() < settle_deadline:
+            if not PaymentTransaction.query.filter_by(status='processing').count():
+                break
+            db.session.commit()
+            time.sleep(0.2)
+        outcomes = dict(
+            db.session.query(PaymentTransaction.status, db.func.count()).group_by(PaymentTransaction.status).all()
+        )
+
+    total = sum(counts.values())
+    print(f"shoppers: {args.users}, duration: {args.duration}s, gateway latency: {args.latency_ms}ms, "
+          f"503 rate: {args.failure_rate}, decline rate: {args.decline_rate}, webhook: {args.webhook}")
+    print(f"payments initiated: {total} ({total / args.duration:.1f}/s), responses: {counts}")
+    if latencies:
+        print(f"request-thread ms: p50 {percentile(latencies, 0.5):.1f}, p95 {percentile(latencies, 0.95):.1f}, "
+              f"p99 {percentile(latencies, 0.99):.1f}")
+    print(f"settled transactions: {outcomes}")
+    print(f"gateway charges: {gateway.charges}, webhooks delivered: {gateway.webhooks}, "
+          f"circuit: {gateway_client.breaker_state('credit_card')}")
+
+    gateway.shutdown()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
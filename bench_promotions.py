@@ -0,0 +1,121 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Promotion validation cost and redemption burst')
+    parser.add_argument('--buyers', type=int, default=1000, help='concurrent redemptions of the same code')
+    parser.add_argument('--limit', type=int, default=250, help='usage_limit of the promotion')
+    parser.add_argument('--lookups', type=int, default=20000, help='validations per lookup strategy')
+    args = parser.parse_args()
+
+    # Throwaway database; must be set before the app is imported
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{path}'
+
+    from src.main import app
+    from src.models.user import db, User
+    from src.models.order import Order
+    from src.models.payment import Promotion
+    from src.promotion_index import PromotionError, promotion_index
+
+    with app.app_context():
+        db.session.add_all([
+            Promotion(
+                code=f'CODE{index}', name=f'Promotion {index}', discount_type='percentage', discount_value=10.0,
+                min_order_amount=0, usage_limit=args.limit if index == 0 else None, used_count=0, is_active=True,
+                start_date=datetime.utcnow() - timedelta(days=1), end_date=datetime.utcnow() + timedelta(days=30)
+            )
+            for index in range(50)
+        ])
+        user = User(username='promo', email='promo@example.com')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+        # Validation: the previous per-request query versus the in-memory index
+        def from_database(code):
+            promotion = Promotion.query.filter_by(code=code).first()
+            return promotion.is_valid()[0] and promotion.calculate_discount(300.0)
+
+        def from_index(code):
+            promotion = promotion_index.get(code)
+            return promotion.is_valid()[0] and promotion.calculate_discount(300.0)
+
+        costs = {}
+        for name, lookup in (('database', from_database), ('index', from_index)):
+            started = time.perf_counter()
+            for index in range(args.lookups):
+                lookup(f'CODE{index % 50}')
+            costs[name] = (time.perf_counter() - started) / args.lookups * 1e6
+            db.session.rollback()
+
+    counts = {'redeemed': 0, 'limit_reached': 0, 'errors': 0}
+    latencies = []
+    lock = threading.Lock()
+    start = threading.Barrier(args.buyers)
+
+    def buyer():
+        with app.app_context():
+            start.wait()
+            started = time.perf_counter()
+            try:
+                # Same write section as checkout: the order row, then the redemption
+                promotion = promotion_index.get('CODE0')
+                order = Order(user_id=user_id, total_amount=90.0, status='pending')
+                db.session.add(order)
+                db.session.flush()
+                promotion_index.redeem(promotion)
+                db.session.commit()
+                key = 'redeemed'
+            except PromotionError:
+                db.session.rollback()
+                key = 'limit_reached'
+            except Exception:
+                db.session.rollback()
+                key = 'errors'
+            elapsed = time.perf_counter() - started
+            with lock:
+                counts[key] += 1
+                latencies.append(elapsed * 1000)
+
+    threads = [threading.Thread(target=buyer) for _ in range(args.buyers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        used_count = Promotion.query.filter_by(code='CODE0').one().used_count
+        orders = Order.query.count()
+
+    expected = min(args.buyers, args.limit)
+    print(f"validation us/op: database {costs['database']:.1f}, index {costs['index']:.2f} "
+          f"({costs['database'] / costs['index']:.0f}x)")
+    print(f"buyers: {args.buyers}, usage limit: {args.limit}")
+    print(f"redeemed: {counts['redeemed']} (expected {expected}), limit reached: {counts['limit_reached']}, "
+          f"errors: {counts['errors']}")
+    print(f"used_count: {used_count}, orders committed: {orders} -> "
+          f"{'exact' if used_count == counts['redeemed'] == orders == expected else 'MISMATCH'}")
+    print(f"{args.buyers / elapsed:.0f} attempts/s; latency ms: p50 {percentile(latencies, 0.5):.1f}, "
+          f"p95 {percentile(latencies, 0.95):.1f}, max {max(latencies):.1f}")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+if __name__ == '__main__':
+    main()
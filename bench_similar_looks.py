@@ -0,0 +1,68 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import random
+import argparse
+import numpy as np
+
+from src.similar_looks import MAX_EXACT_POSTINGS, SimilarLooksIndex
+
+def synthetic_looks(count, products, users, seed):
+    """Looks of 2-6 products drawn from a Zipf-like popularity curve"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, products + 1)
+    weights /= weights.sum()
+    sizes = rng.integers(2, 7, count)
+    picks = rng.choice(products, size=int(sizes.sum()), p=weights) + 1
+    owners = rng.integers(1, users + 1, count)
+
+    offset = 0
+    for look_id in range(1, count + 1):
+        size = sizes[look_id - 1]
+        yield look_id, int(owners[look_id - 1]), [
+            {'product_id': int(product_id)} for product_id in picks[offset:offset + size]
+        ]
+        offset += size
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Similar-looks index benchmark')
+    parser.add_argument('--looks', type=int, default=1000000)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    index = SimilarLooksIndex()
+    started = time.perf_counter()
+    index.load(synthetic_looks(args.looks, args.products, args.users, args.seed))
+    print(f"indexed {args.looks} looks over {args.products} products in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(args.seed)
+    timings = {'exact': [], 'minhash': []}
+    for _ in range(args.queries):
+        # A user's product set: a few popular products plus some from the long tail
+        product_ids = {rng.randint(1, 20) for _ in range(rng.randint(1, 3))}
+        product_ids |= {rng.randint(1, args.products) for _ in range(rng.randint(1, 6))}
+
+        started = time.perf_counter()
+        index.query(product_ids, exclude_user=rng.randint(1, args.users), k=20)
+        elapsed = (time.perf_counter() - started) * 1000
+
+        postings = sum(len(index._postings.get(p, ())) for p in product_ids)
+        timings['exact' if postings <= MAX_EXACT_POSTINGS else 'minhash'].append(elapsed)
+
+    print(f"{'path':>8} {'queries':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for path, samples in timings.items():
+        if samples:
+            print(f"{path:>8} {len(samples):>8} {percentile(samples, 0.5):>8.1f} "
+                  f"{percentile(samples, 0.95):>8.1f} {max(samples):>8.1f}")
+
+if __name__ == '__main__':
+    main()
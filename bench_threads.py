@@ -0,0 +1,91 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import time
+import argparse
+import multiprocessing as mp
+
+from src.resource_config import available_cpus
+
+def _worker(threads, duration, size, results):
+    """عملية عامل تحاكي معالجة الصور بميزانية خيوط محددة"""
+    # يجب ضبط الخيوط قبل استيراد numpy و cv2
+    if threads:
+        from src.resource_config import configure_threads
+        configure_threads(workers_per_host=1, cpu_count=threads)
+
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    matrix = rng.random((256, 256))
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+
+        # نفس مراحل تحسين الصورة في محرك الذكاء الاصطناعي
+        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        l = clahe.apply(l)
+        enhanced = cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2BGR)
+        enhanced = cv2.GaussianBlur(enhanced, (51, 51), 0)
+        np.dot(matrix, matrix)
+
+        latencies.append(time.perf_counter() - start)
+
+    results.put(latencies)
+
+def run(workers, threads, duration, size):
+    """تشغيل عدة عمليات متزامنة وقياس الإنتاجية وزمن الاستجابة"""
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=_worker, args=(threads, duration, size, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    return {
+        'throughput': len(latencies) / duration,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'p95_ms': p95 * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Thread budget throughput benchmark')
+    parser.add_argument('--workers', type=int, default=available_cpus())
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--size', type=int, default=640)
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    budgeted = max(1, cpus // args.workers)
+    candidates = sorted({1, budgeted, cpus})
+
+    print(f"CPUs: {cpus}, workers: {args.workers}, budget per worker: {budgeted}")
+    print(f"{'threads/worker':>15} {'img/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+
+    # الإعداد الافتراضي (كل مكتبة تستخدم جميع الأنوية)
+    result = run(args.workers, None, args.duration, args.size)
+    print(f"{'default':>15} {result['throughput']:>10.1f} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f}")
+
+    for threads in candidates:
+        result = run(args.workers, threads, args.duration, args.size)
+        print(f"{threads:>15} {result['throughput']:>10.1f} {result['p50_ms']:>10.1f} {result['p95_ms']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,13 @@ from flask import Blueprint, request, jsonify
 from src.models.user import db, User
 from src.models.payment import ShoppingCart, CartItem
 from src.models.product import Product, ProductColor
+from src.models.gallery import SavedLook
+from src.models.cart_totals import CartTotals
+from src.cart_store import CartError, apply_lines, look_lines, merge_session_cart, refresh_cart_totals
+from src.session_cart import (
+    apply_session_lines, clear_session_cart, load_session_cart, save_session_cart,
+    session_cart_items, session_cart_to_dict
+)
 
 cart_bp = Blueprint('cart', __name__)
 
@@ -11,15 +18,33 @@ def get_cart(user_id):
     try:
         cart = ShoppingCart.query.filter_by(user_id=user_id).first()
         
-        if not cart:
-            # إنشاء سلة جديدة إذا لم تكن موجودة
-            cart = ShoppingCart(user_id=user_id)
-            db.session.add(cart)
-            db.session.commit()
+        # لا نكتب شيئاً عند القراءة: السلة تُنشأ عند أول إضافة فقط
+        cart_dict = cart.to_dict() if cart else {
+            'id': None,
+            'user_id': user_id,
+            'items': [],
+            'total_items': 0,
+            'total_amount': 0
+        }
+        
+        return jsonify({
+            'success': True,
+            'cart': cart_dict
+        }), 200
         
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cart_bp.route('/cart/session', methods=['GET'])
+def get_session_cart():
+    """سلة الزائر المجهول (من ملف الارتباط الموقّع دون أي قراءة أو كتابة في قاعدة البيانات)"""
+    try:
         return jsonify({
             'success': True,
-            'cart': cart.to_dict()
+            'cart': session_cart_to_dict(load_session_cart(request))
         }), 200
         
     except Exception as e:
@@ -28,73 +53,129 @@ def get_cart(user_id):
             'error': str(e)
         }), 500
 
+@cart_bp.route('/cart/session/items', methods=['POST'])
+def update_session_cart():
+    """إضافة أو تعديل عناصر سلة الزائر"""
+    try:
+        data = request.get_json()
+        
+        cart = apply_session_lines(load_session_cart(request), data.get('items'), data.get('mode', 'add'))
+        
+        response = jsonify({
+            'success': True,
+            'message': 'Cart updated successfully',
+            'cart': session_cart_to_dict(cart)
+        })
+        return save_session_cart(response, cart)
+        
+    except CartError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cart_bp.route('/cart/session', methods=['DELETE'])
+def clear_session_cart_route():
+    """مسح سلة الزائر"""
+    return clear_session_cart(jsonify({
+        'success': True,
+        'message': 'Cart cleared successfully'
+    }))
+
+@cart_bp.route('/cart/<int:user_id>/merge', methods=['POST'])
+def merge_cart(user_id):
+    """دمج سلة الزائر في سلة المستخدم بعد تسجيل الدخول"""
+    try:
+        guest_cart = load_session_cart(request)
+        delta = merge_session_cart(user_id, guest_cart['session_id'], session_cart_items(guest_cart))
+        db.session.commit()
+        
+        response = jsonify({
+            'success': True,
+            'message': 'Cart merged successfully' if delta else 'Nothing to merge',
+            'delta': delta
+        })
+        return clear_session_cart(response)
+        
+    except CartError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @cart_bp.route('/cart/<int:user_id>/add', methods=['POST'])
 def add_to_cart(user_id):
     """إضافة منتج إلى السلة"""
     try:
         data = request.get_json()
         
-        if 'product_id' not in data or 'color_id' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Product ID and Color ID are required'
-            }), 400
-        
-        # التحقق من وجود المنتج واللون
-        product = Product.query.get(data['product_id'])
-        if not product:
-            return jsonify({
-                'success': False,
-                'error': 'Product not found'
-            }), 404
-        
-        color = ProductColor.query.get(data['color_id'])
-        if not color or color.product_id != product.id:
-            return jsonify({
-                'success': False,
-                'error': 'Color not found or does not belong to this product'
-            }), 404
+        # إضافة ذرية عبر upsert وإرجاع فرق السلة فقط
+        delta = apply_lines(user_id, [data])
+        db.session.commit()
         
-        # الحصول على السلة أو إنشاؤها
-        cart = ShoppingCart.query.filter_by(user_id=user_id).first()
-        if not cart:
-            cart = ShoppingCart(user_id=user_id)
-            db.session.add(cart)
-            db.session.flush()
-        
-        # التحقق من وجود العنصر في السلة
-        existing_item = CartItem.query.filter_by(
-            cart_id=cart.id,
-            product_id=data['product_id'],
-            color_id=data['color_id']
-        ).first()
+        return jsonify({
+            'success': True,
+            'message': 'Product added to cart successfully',
+            'delta': delta
+        }), 200
         
-        quantity = data.get('quantity', 1)
+    except CartError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cart_bp.route('/cart/<int:user_id>/items', methods=['POST'])
+def add_items_to_cart(user_id):
+    """إضافة أو تعديل عدة عناصر في السلة دفعة واحدة (مثل منتجات إطلالة محفوظة)"""
+    try:
+        data = request.get_json()
         
-        if existing_item:
-            # تحديث الكمية
-            existing_item.quantity += quantity
+        if data.get('look_id') is not None:
+            look = SavedLook.query.filter_by(id=data['look_id'], user_id=user_id).first()
+            if not look:
+                return jsonify({
+                    'success': False,
+                    'error': 'Look not found'
+                }), 404
+            items = look_lines(look)
         else:
-            # إضافة عنصر جديد
-            cart_item = CartItem(
-                cart_id=cart.id,
-                product_id=data['product_id'],
-                color_id=data['color_id'],
-                quantity=quantity
-            )
-            db.session.add(cart_item)
+            items = data.get('items')
         
+        delta = apply_lines(user_id, items, data.get('mode', 'add'))
         db.session.commit()
         
-        # إعادة تحميل السلة مع العناصر المحدثة
-        cart = ShoppingCart.query.get(cart.id)
-        
         return jsonify({
             'success': True,
-            'message': 'Product added to cart successfully',
-            'cart': cart.to_dict()
+            'message': 'Cart updated successfully',
+            'delta': delta
         }), 200
         
+    except CartError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -140,6 +221,7 @@ def update_cart_item(user_id, item_id):
             # تحديث الكمية
             cart_item.quantity = quantity
         
+        refresh_cart_totals(cart_item.cart_id, user_id)
         db.session.commit()
         
         # إعادة تحميل السلة
@@ -175,6 +257,7 @@ def remove_from_cart(user_id, item_id):
             }), 404
         
         db.session.delete(cart_item)
+        refresh_cart_totals(cart_item.cart_id, user_id)
         db.session.commit()
         
         # إعادة تحميل السلة
@@ -202,6 +285,7 @@ def clear_cart(user_id):
         if cart:
             # حذف جميع العناصر
             CartItem.query.filter_by(cart_id=cart.id).delete()
+            refresh_cart_totals(cart.id, user_id)
             db.session.commit()
         
         return jsonify({
@@ -220,9 +304,10 @@ def clear_cart(user_id):
 def get_cart_summary(user_id):
     """الحصول على ملخص السلة"""
     try:
-        cart = ShoppingCart.query.filter_by(user_id=user_id).first()
+        # قراءة واحدة للإجماليات المخزنة بدلاً من تحميل العناصر والمنتجات
+        totals = CartTotals.query.filter_by(user_id=user_id).order_by(CartTotals.cart_id).first()
         
-        if not cart:
+        if not totals:
             return jsonify({
                 'success': True,
                 'summary': {
@@ -232,21 +317,19 @@ def get_cart_summary(user_id):
                 }
             }), 200
         
-        summary = {
-            'total_items': cart.get_total_items(),
-            'total_amount': cart.get_total_amount(),
-            'currency': 'SAR',
-            'items_count': len(cart.items)
-        }
+        summary = totals.to_dict()
+        summary['currency'] = 'SAR'
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'summary': summary
-        }), 200
+        })
+        # شارة السلة تستطلع الملخص باستمرار؛ الإصدار يسمح بالرد 304
+        response.set_etag(f'cart-{totals.cart_id}-{totals.version}')
+        return response.make_conditional(request)
         
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
-
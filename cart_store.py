@@ -0,0 +1,281 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+from datetime import datetime
+from sqlalchemy import and_, delete, event, func, inspect, literal, select, tuple_, update
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.payment import ShoppingCart, CartItem
+from src.models.product import Product, ProductColor
+from src.models.cart_totals import CartTotals
+from src.database_config import dialect_insert
+
+# الحد الأقصى لعدد الأسطر في طلب إضافة جماعي واحد
+MAX_BULK_LINES = 100
+
+class CartError(Exception):
+    """خطأ في تعديل السلة"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def parse_lines(items):
+    """
+    التحقق من أسطر الطلب ودمج الأسطر المكررة لنفس المنتج واللون
+    يعيد قاموس {(product_id, color_id): quantity} بترتيب الطلب
+    """
+    if not isinstance(items, list) or not items:
+        raise CartError('Items are required')
+    if len(items) > MAX_BULK_LINES:
+        raise CartError(f'At most {MAX_BULK_LINES} items per request')
+
+    lines = {}
+    for item in items:
+        if not isinstance(item, dict) or 'product_id' not in item or 'color_id' not in item:
+            raise CartError('Product ID and Color ID are required')
+        product_id, color_id = item['product_id'], item['color_id']
+        quantity = item.get('quantity', 1)
+        if not all(isinstance(value, int) and not isinstance(value, bool) for value in (product_id, color_id, quantity)):
+            raise CartError('Product ID, Color ID and quantity must be integers')
+        if quantity < 0:
+            raise CartError('Quantity cannot be negative')
+        key = (product_id, color_id)
+        lines[key] = lines.get(key, 0) + quantity
+    return lines
+
+def validate_lines(lines):
+    """
+    التحقق من وجود المنتجات وانتماء الألوان إليها في استعلام واحد
+    يعيد {color_id: المخزون المتوفر}
+    """
+    product_ids = {product_id for product_id, _ in lines}
+    color_ids = {color_id for _, color_id in lines}
+
+    rows = db.session.query(Product.id, ProductColor.id, ProductColor.stock_quantity).outerjoin(
+        ProductColor,
+        and_(ProductColor.product_id == Product.id, ProductColor.id.in_(color_ids))
+    ).filter(Product.id.in_(product_ids)).all()
+
+    known_products = {product_id for product_id, _, _ in rows}
+    valid_pairs = {(product_id, color_id) for product_id, color_id, _ in rows if color_id is not None}
+
+    for product_id, color_id in lines:
+        if product_id not in known_products:
+            raise CartError('Product not found', 404)
+        if (product_id, color_id) not in valid_pairs:
+            raise CartError('Color not found or does not belong to this product', 404)
+
+    return {color_id: stock or 0 for _, color_id, stock in rows if color_id is not None}
+
+def get_or_create_cart_id(user_id):
+    """
+    رقم سلة المستخدم، مع إنشائها إن لم توجد
+    الإنشاء upsert على القيد الفريد user_id فلا ينشئ طلبان متزامنان سلتين
+    """
+    cart_id = db.session.query(ShoppingCart.id).filter_by(user_id=user_id).scalar()
+    if cart_id is None:
+        db.session.execute(
+            dialect_insert(ShoppingCart, db.session)
+            .values(user_id=user_id)
+            .on_conflict_do_nothing(index_elements=[ShoppingCart.user_id])
+        )
+        cart_id = db.session.query(ShoppingCart.id).filter_by(user_id=user_id).scalar()
+    return cart_id
+
+def apply_lines(user_id, items, mode='add'):
+    """
+    إضافة أو تعديل عدة أسطر في السلة داخل معاملة واحدة
+    mode='add' يضيف الكمية إلى السطر الموجود و mode='set' يستبدلها (الصفر يحذف السطر)
+    التعديل يتم بعبارة upsert واحدة على القيد الفريد (cart_id, product_id, color_id)
+    ويعيد فرق السلة (الأسطر المعدلة والمحذوفة) بدلاً من السلة كاملة
+    """
+    if mode not in ('add', 'set'):
+        raise CartError("Mode must be 'add' or 'set'")
+
+    lines = parse_lines(items)
+    stock = validate_lines(lines)
+    cart_id = get_or_create_cart_id(user_id)
+
+    upserts = [
+        {'cart_id': cart_id, 'product_id': product_id, 'color_id': color_id, 'quantity': quantity}
+        for (product_id, color_id), quantity in lines.items()
+        if quantity > 0
+    ]
+    removals = [key for key, quantity in lines.items() if quantity == 0 and mode == 'set']
+
+    changed = []
+    if upserts:
+        statement = dialect_insert(CartItem, db.session).values(upserts)
+        if mode == 'add':
+            quantity = CartItem.quantity + statement.excluded.quantity
+        else:
+            quantity = statement.excluded.quantity
+        statement = statement.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_id, CartItem.color_id],
+            set_={'quantity': quantity}
+        ).returning(CartItem.id, CartItem.product_id, CartItem.color_id, CartItem.quantity)
+        changed = [dict(row._mapping) for row in db.session.execute(statement)]
+
+        # السلة لا تحجز المخزون (الحجز عند الدفع) لكنها لا تقبل أكثر من المتوفر
+        if any(line['quantity'] > stock[line['color_id']] for line in changed):
+            raise CartError('Insufficient stock', 409)
+
+    removed = []
+    if removals:
+        statement = delete(CartItem).where(
+            CartItem.cart_id == cart_id,
+            tuple_(CartItem.product_id, CartItem.color_id).in_(removals)
+        ).returning(CartItem.id)
+        removed = [row.id for row in db.session.execute(statement)]
+
+    totals = refresh_cart_totals(cart_id, user_id)
+
+    return {
+        'cart_id': cart_id,
+        'items': sorted(changed, key=lambda line: line['id']),
+        'removed_item_ids': sorted(removed),
+        'totals': totals
+    }
+
+def merge_session_cart(user_id, session_id, items):
+    """
+    دمج سلة الزائر في سلة المستخدم بعد تسجيل الدخول أو عند الدفع
+    رقم الجلسة يُحفظ في session_id فلا تُدمج نفس السلة مرتين
+    """
+    merged_session = db.session.query(ShoppingCart.session_id).filter_by(user_id=user_id).scalar()
+    if merged_session == session_id or not items:
+        return None
+
+    delta = apply_lines(user_id, items, 'add')
+    db.session.execute(
+        update(ShoppingCart).where(ShoppingCart.id == delta['cart_id']).values(session_id=session_id)
+    )
+    return delta
+
+def look_lines(look):
+    """أسطر السلة لمنتجات إطلالة محفوظة (العناصر التي تحدد المنتج واللون)"""
+    items = []
+    for product in look.products_used or []:
+        if isinstance(product, dict) and isinstance(product.get('product_id'), int) and isinstance(product.get('color_id'), int):
+            items.append({'product_id': product['product_id'], 'color_id': product['color_id'], 'quantity': 1})
+    return items
+
+def _computed_totals(cart_id):
+    """عبارة SELECT تحسب إجماليات السلة من أسطرها"""
+    return select(
+        func.coalesce(func.sum(CartItem.quantity), 0),
+        func.count(CartItem.id),
+        func.coalesce(func.sum(CartItem.quantity * Product.price), 0)
+    ).select_from(CartItem).join(Product, Product.id == CartItem.product_id).where(CartItem.cart_id == cart_id)
+
+def refresh_cart_totals(cart_id, user_id):
+    """
+    إعادة حساب إجماليات السلة المخزنة داخل معاملة التعديل نفسها
+    بعبارة upsert واحدة، مع زيادة رقم الإصدار
+    """
+    computed = _computed_totals(cart_id).add_columns(
+        literal(cart_id), literal(user_id), literal(1), literal(datetime.utcnow())
+    )
+    statement = dialect_insert(CartTotals, db.session).from_select(
+        ['total_items', 'line_count', 'subtotal', 'cart_id', 'user_id', 'version', 'updated_at'],
+        computed
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[CartTotals.cart_id],
+        set_={
+            'total_items': statement.excluded.total_items,
+            'line_count': statement.excluded.line_count,
+            'subtotal': statement.excluded.subtotal,
+            'version': CartTotals.version + 1,
+            'updated_at': statement.excluded.updated_at
+        }
+    ).returning(CartTotals.total_items, CartTotals.line_count, CartTotals.subtotal, CartTotals.version)
+
+    row = db.session.execute(statement).one()
+    return {
+        'total_items': row.total_items,
+        'items_count': row.line_count,
+        'total_amount': row.subtotal,
+        'version': row.version
+    }
+
+def reprice_carts(connection, product_ids):
+    """تحديث مجاميع السلال المفتوحة التي تحتوي منتجات تغير سعرها"""
+    line_total = select(
+        func.coalesce(func.sum(CartItem.quantity * Product.price), 0)
+    ).select_from(CartItem).join(Product, Product.id == CartItem.product_id).where(
+        CartItem.cart_id == CartTotals.cart_id
+    ).scalar_subquery()
+
+    affected = select(CartItem.cart_id).where(CartItem.product_id.in_(product_ids))
+
+    connection.execute(
+        update(CartTotals)
+        .where(CartTotals.cart_id.in_(affected))
+        .values(subtotal=line_total, version=CartTotals.version + 1, updated_at=datetime.utcnow())
+    )
+
+@event.listens_for(Session, 'after_flush')
+def _propagate_price_changes(session, flush_context):
+    product_ids = [
+        product.id for product in session.dirty
+        if isinstance(product, Product) and inspect(product).attrs.price.history.has_changes()
+    ]
+    if product_ids:
+        reprice_carts(session.connection(), product_ids)
+
+def find_totals_drift():
+    """السلال التي تختلف إجمالياتها المخزنة عن أسطرها الفعلية"""
+    lines = select(
+        CartItem.cart_id.label('cart_id'),
+        func.sum(CartItem.quantity).label('total_items'),
+        func.count(CartItem.id).label('line_count'),
+        func.sum(CartItem.quantity * Product.price).label('subtotal')
+    ).join(Product, Product.id == CartItem.product_id).group_by(CartItem.cart_id).subquery()
+
+    rows = db.session.query(
+        ShoppingCart.id,
+        ShoppingCart.user_id,
+        CartTotals.total_items,
+        CartTotals.line_count,
+        CartTotals.subtotal,
+        func.coalesce(lines.c.total_items, 0),
+        func.coalesce(lines.c.line_count, 0),
+        func.coalesce(lines.c.subtotal, 0)
+    ).outerjoin(CartTotals, CartTotals.cart_id == ShoppingCart.id).outerjoin(
+        lines, lines.c.cart_id == ShoppingCart.id
+    ).all()
+
+    drift = []
+    for cart_id, user_id, items, line_count, subtotal, actual_items, actual_lines, actual_subtotal in rows:
+        stored = (items or 0, line_count or 0, round(subtotal or 0, 2))
+        actual = (actual_items, actual_lines, round(actual_subtotal, 2))
+        if stored != actual:
+            drift.append({'cart_id': cart_id, 'user_id': user_id, 'stored': stored, 'actual': actual})
+    return drift
+
+def reconcile_cart_totals(fix=False):
+    drift = find_totals_drift()
+    if fix:
+        for entry in drift:
+            refresh_cart_totals(entry['cart_id'], entry['user_id'])
+        db.session.commit()
+    return drift
+
+if __name__ == '__main__':
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description='التحقق من انحراف إجماليات السلال')
+    parser.add_argument('--fix', action='store_true', help='إعادة حساب السلال المنحرفة')
+    args = parser.parse_args()
+
+    with app.app_context():
+        drift = reconcile_cart_totals(fix=args.fix)
+        for entry in drift:
+            print(f"cart {entry['cart_id']}: stored {entry['stored']} actual {entry['actual']}")
+        print(f"{len(drift)} carts drifted" + (' (fixed)' if args.fix and drift else ''))
+        if drift and not args.fix:
+            sys.exit(1)
@@ -0,0 +1,29 @@
+from src.models.user import db
+from datetime import datetime
+
+class CartTotals(db.Model):
+    """Denormalized totals per shopping cart, updated with every cart mutation"""
+    cart_id = db.Column(db.Integer, db.ForeignKey('shopping_cart.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    subtotal = db.Column(db.Float, nullable=False, default=0)
+    # Bumped on every change so clients can poll with If-None-Match
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_cart_totals_user_id', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f'<CartTotals {self.cart_id}>'
+
+    def to_dict(self):
+        return {
+            'cart_id': self.cart_id,
+            'total_items': self.total_items,
+            'items_count': self.line_count,
+            'total_amount': self.subtotal,
+            'version': self.version
+        }
@@ -0,0 +1,129 @@
+import time
+import threading
+from flask import current_app
+
+class CatalogCache:
+    """
+    In-memory snapshot of the serialized product/colour catalog.
+
+    Product dicts and the encoded /api/products bodies (one per category plus
+    the full list) are kept ready to send. Catalog writes in this process
+    update the snapshot incrementally; the snapshot is reloaded from the
+    database when older than max_age so writes from other workers show up.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._products = {}
+        self._color_products = {}
+        self._encoded = {}
+        self._built_at = None
+
+    def build(self):
+        """Load the whole catalog in two queries and encode it"""
+        from src.models.user import db
+        from src.models.product import Product
+
+        products = Product.query.options(
+            db.selectinload(Product.colors)
+        ).order_by(Product.id).all()
+
+        with self._lock:
+            self._products = {product.id: product.to_dict() for product in products}
+            self._color_products = {
+                color.id: product.id for product in products for color in product.colors
+            }
+            self._encode_all()
+            self._built_at = time.monotonic()
+
+    def _encode(self, products):
+        return current_app.json.dumps({
+            'success': True,
+            'products': products,
+            'next_cursor': None
+        }).encode('utf-8')
+
+    def _encode_category(self, category):
+        products = [p for p in self._products.values() if p['category'] == category]
+        if products:
+            self._encoded[category] = self._encode(products)
+        else:
+            self._encoded.pop(category, None)
+
+    def _encode_all(self):
+        self._encoded = {None: self._encode(list(self._products.values()))}
+        for category in {p['category'] for p in self._products.values()}:
+            self._encode_category(category)
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.build()
+
+    def invalidate(self):
+        """Force a full reload on the next read"""
+        self._built_at = None
+
+    def upsert_product(self, product):
+        """Re-serialize one product after a write and re-encode its category"""
+        if self._built_at is None:
+            return
+        with self._lock:
+            previous = self._products.get(product.id)
+            product_dict = product.to_dict()
+            self._products[product.id] = product_dict
+            for color in product_dict['colors']:
+                self._color_products[color['id']] = product.id
+
+            self._encoded[None] = self._encode(list(self._products.values()))
+            self._encode_category(product_dict['category'])
+            if previous and previous['category'] != product_dict['category']:
+                self._encode_category(previous['category'])
+
+    def update_stock(self, stock_by_color):
+        """Apply {color_id: stock_quantity} changes to the snapshot"""
+        if self._built_at is None:
+            return
+        with self._lock:
+            categories = set()
+            for color_id, stock_quantity in stock_by_color.items():
+                product = self._products.get(self._color_products.get(color_id))
+                if product is None:
+                    continue
+                for color in product['colors']:
+                    if color['id'] == color_id:
+                        color['stock_quantity'] = stock_quantity
+                categories.add(product['category'])
+
+            if categories:
+                self._encoded[None] = self._encode(list(self._products.values()))
+                for category in categories:
+                    self._encode_category(category)
+
+    def encoded_products(self, category=None):
+        """Pre-encoded /api/products body for a category (or all products)"""
+        self.ensure_fresh()
+        encoded = self._encoded.get(category)
+        if encoded is None:
+            encoded = self._encode([])
+        return encoded
+
+    def get_product(self, product_id):
+        self.ensure_fresh()
+        return self._products.get(product_id)
+
+    def products(self, category=None):
+        """Serialized products ordered by id, optionally for one category"""
+        self.ensure_fresh()
+        products = sorted(self._products.values(), key=lambda p: p['id'])
+        if category:
+            products = [p for p in products if p['category'] == category]
+        return products
+
+    def categories(self):
+        self.ensure_fresh()
+        return sorted({p['category'] for p in self._products.values()})
+
+# Shared per-process snapshot
+catalog_cache = CatalogCache()
@@ -0,0 +1,245 @@
+import re
+import time
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+
+# '#RRGGBB' (the '#' is optional), as accepted by hex_to_rgb
+HEX_COLOR_PATTERN = re.compile(r'#?[0-9a-fA-F]{6}')
+
+# Target palettes per skin tone; recommendations snap these to stocked shades
+SKIN_TONE_PALETTES = {
+    'light': {
+        'lipstick': ['#ff6b9d', '#ff7675', '#fd79a8', '#e84393'],
+        'eyeshadow': ['#a55eea', '#3742fa', '#ff6348', '#f8b500'],
+        'blush': ['#ff9ff3', '#ff6b9d', '#fd79a8', '#ff7675']
+    },
+    'medium': {
+        'lipstick': ['#ff4757', '#c44569', '#f8b500', '#e84393'],
+        'eyeshadow': ['#2f3542', '#ff6348', '#ff9ff3', '#a55eea'],
+        'blush': ['#ff7675', '#fd79a8', '#e84393', '#c44569']
+    },
+    'dark': {
+        'lipstick': ['#c44569', '#8b0000', '#ff4757', '#e84393'],
+        'eyeshadow': ['#2f3542', '#8b4513', '#ff6348', '#a55eea'],
+        'blush': ['#e84393', '#ff7675', '#c44569', '#ff4757']
+    }
+}
+
+# D65 reference white
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041]
+])
+
+def hex_to_rgb(color_hex):
+    """Convert '#RRGGBB' to an (r, g, b) tuple of ints"""
+    color_hex = color_hex.lstrip('#')
+    return tuple(int(color_hex[i:i + 2], 16) for i in (0, 2, 4))
+
+def rgb_to_lab(rgb):
+    """Convert an (..., 3) array of sRGB values in 0-255 to CIELAB"""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2])
+    ], axis=-1)
+
+def hex_to_lab(color_hex):
+    return rgb_to_lab(hex_to_rgb(color_hex))
+
+class ColorIndex:
+    """
+    In-memory CIELAB index over every ProductColor in the catalog.
+
+    Shades live in a KD-tree plus a small pending list of recent writes that
+    is scanned linearly; the tree is rebuilt from memory once the pending
+    list grows, and from the database when the snapshot is older than max_age
+    (so writes handled by other worker processes are picked up).
+    """
+
+    def __init__(self, max_age=300, rebuild_threshold=64):
+        self.max_age = max_age
+        self.rebuild_threshold = rebuild_threshold
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._tree = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        self._pending = set()
+        self._built_at = None
+
+    def _entry(self, color, product):
+        return {
+            'color_id': color.id,
+            'product_id': product.id,
+            'product_name': product.name,
+            'brand': product.brand,
+            'category': product.category,
+            'price': product.price,
+            'color_name': color.color_name,
+            'color_hex': color.color_hex,
+            'stock_quantity': color.stock_quantity or 0,
+            'lab': hex_to_lab(color.color_hex)
+        }
+
+    def build(self):
+        """Load all shades from the database and rebuild the tree"""
+        from src.models.user import db
+        from src.models.product import Product, ProductColor
+
+        rows = db.session.query(ProductColor, Product).join(
+            Product, ProductColor.product_id == Product.id
+        ).all()
+
+        with self._lock:
+            self._entries = {color.id: self._entry(color, product) for color, product in rows}
+            self._rebuild_tree()
+            self._built_at = time.monotonic()
+
+    def _rebuild_tree(self):
+        ids = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+        if len(ids):
+            labs = np.array([self._entries[color_id]['lab'] for color_id in ids])
+            self._tree = cKDTree(labs)
+        else:
+            self._tree = None
+        self._tree_ids = ids
+        self._pending = set()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.build()
+
+    def invalidate(self):
+        """Force a rebuild from the database on the next query"""
+        self._built_at = None
+
+    def upsert_color(self, color, product):
+        """Add or update a shade after a catalog write"""
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._entries[color.id] = self._entry(color, product)
+            self._pending.add(color.id)
+            if len(self._pending) > self.rebuild_threshold:
+                self._rebuild_tree()
+
+    def upsert_product(self, product):
+        for color in product.colors:
+            self.upsert_color(color, product)
+
+    def update_stock(self, color_id, stock_quantity):
+        """Update the stock level of an indexed shade"""
+        entry = self._entries.get(color_id)
+        if entry is not None:
+            entry['stock_quantity'] = stock_quantity
+
+    def remove_color(self, color_id):
+        if self._built_at is None:
+            return
+        with self._lock:
+            self._entries.pop(color_id, None)
+            self._pending.discard(color_id)
+
+    def nearest(self, color_hex=None, lab=None, k=5, category=None, in_stock=True,
+                exclude_brand=None, exclude_product=None):
+        """
+        Return up to k shades nearest to a colour (delta E 1976), filtered
+        by category, stock and brand.
+        """
+        self.ensure_fresh()
+        target = np.asarray(lab if lab is not None else hex_to_lab(color_hex))
+
+        entries = self._entries
+        tree, tree_ids, pending = self._tree, self._tree_ids, list(self._pending)
+
+        def accept(entry):
+            if entry is None:
+                return False
+            if category and entry['category'] != category:
+                return False
+            if in_stock and entry['stock_quantity'] <= 0:
+                return False
+            if exclude_brand and entry['brand'] == exclude_brand:
+                return False
+            if exclude_product and entry['product_id'] == exclude_product:
+                return False
+            return True
+
+        candidates = {}
+
+        # Shades written since the last rebuild are scanned directly
+        for color_id in pending:
+            entry = entries.get(color_id)
+            if accept(entry):
+                candidates[color_id] = float(np.linalg.norm(entry['lab'] - target))
+
+        # Widen the KD-tree query until enough shades pass the filters
+        if tree is not None:
+            query_k = min(len(tree_ids), max(k * 4, 16))
+            while True:
+                distances, indexes = tree.query(target, k=query_k)
+                distances, indexes = np.atleast_1d(distances), np.atleast_1d(indexes)
+                found = 0
+                for distance, index in zip(distances, indexes):
+                    color_id = int(tree_ids[index])
+                    # Skip stale tree points for updated or removed shades
+                    if color_id in candidates or color_id in pending:
+                        continue
+                    if accept(entries.get(color_id)):
+                        candidates[color_id] = float(distance)
+                        found += 1
+                if found >= k or query_k >= len(tree_ids):
+                    break
+                query_k = min(len(tree_ids), query_k * 4)
+
+        nearest = sorted(candidates.items(), key=lambda item: item[1])[:k]
+        return [self._public(entries[color_id], distance) for color_id, distance in nearest]
+
+    def dupes(self, color_id, k=5, in_stock=True):
+        """Closest shades from other brands in the same category"""
+        self.ensure_fresh()
+        entry = self._entries.get(color_id)
+        if entry is None:
+            return None
+        return self.nearest(
+            lab=entry['lab'],
+            k=k,
+            category=entry['category'],
+            in_stock=in_stock,
+            exclude_brand=entry['brand']
+        )
+
+    def recommend_for_skin_tone(self, skin_tone, per_category=4):
+        """Snap the skin tone palette to the nearest in-stock shades"""
+        palette = SKIN_TONE_PALETTES.get(skin_tone, SKIN_TONE_PALETTES['medium'])
+        recommendations = {}
+
+        for category, targets in palette.items():
+            shades = []
+            seen = set()
+            for color_hex in targets[:per_category]:
+                for shade in self.nearest(color_hex=color_hex, k=per_category, category=category):
+                    if shade['color_id'] not in seen:
+                        seen.add(shade['color_id'])
+                        shade['target_hex'] = color_hex
+                        shades.append(shade)
+                        break
+            recommendations[category] = shades
+
+        return recommendations
+
+    def _public(self, entry, distance):
+        shade = {key: value for key, value in entry.items() if key != 'lab'}
+        shade['delta_e'] = round(distance, 2)
+        return shade
+
+# Shared per-process index
+color_index = ColorIndex()
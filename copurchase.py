@@ -0,0 +1,286 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import json
+import time
+import fcntl
+import argparse
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from scipy import sparse
+
+MODEL_DIR = os.environ.get(
+    'GLOWMIRROR_COPURCHASE_DIR',
+    os.path.join(os.path.dirname(__file__), 'database', 'copurchase')
+)
+MANIFEST = 'manifest.json'
+
+# A saved look counts as a weaker signal than an actual order
+LOOK_WEIGHT = 0.5
+
+# Neighbours kept per product in the published similarity matrix
+MAX_NEIGHBORS = 50
+
+# Orders younger than this are left for the next run, so transactions that
+# commit out of id order are not skipped by the id watermark
+GRACE_SECONDS = int(os.environ.get('GLOWMIRROR_COPURCHASE_GRACE_SECONDS', 60))
+
+def _basket_pairs(baskets, weight):
+    """COO triples for every ordered pair of distinct products in each basket"""
+    rows, cols, data = [], [], []
+    for basket in baskets:
+        items = sorted(basket)
+        for i in items:
+            for j in items:
+                if i != j:
+                    rows.append(i)
+                    cols.append(j)
+                    data.append(weight)
+    return rows, cols, data
+
+def _resize(matrix, size):
+    if matrix.shape[0] < size:
+        matrix = matrix.tocoo()
+        matrix = sparse.csr_matrix((matrix.data, (matrix.row, matrix.col)), shape=(size, size))
+    return matrix
+
+def normalize(counts, occurrences):
+    """
+    Cosine-normalize co-occurrence counts (c_ij / sqrt(n_i * n_j)) so
+    bestsellers do not co-occur with everything, then keep the top
+    MAX_NEIGHBORS per row.
+    """
+    counts = counts.tocsr()
+    norms = np.sqrt(np.maximum(occurrences, 1e-9))
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    data = counts.data / (norms[rows] * norms[counts.indices])
+
+    indptr = [0]
+    indices, values = [], []
+    for row in range(counts.shape[0]):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        row_values = data[start:end]
+        keep = np.argsort(-row_values, kind='stable')[:MAX_NEIGHBORS]
+        indices.append(counts.indices[start:end][keep])
+        values.append(row_values[keep])
+        indptr.append(indptr[-1] + len(keep))
+
+    return (
+        np.array(indptr, dtype=np.int64),
+        np.concatenate(indices).astype(np.int32) if indices else np.zeros(0, dtype=np.int32),
+        np.concatenate(values).astype(np.float32) if values else np.zeros(0, dtype=np.float32)
+    )
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def update_model(directory=MODEL_DIR, full=False, grace_seconds=GRACE_SECONDS):
+    """
+    Fold orders and looks added since the last run into the raw counts and
+    publish a new normalized similarity matrix. Returns the new manifest.
+    """
+    from src.models.user import db
+    from src.models.order import Order, OrderItem
+    from src.models.product import Product
+    from src.models.gallery import SavedLook
+    from src.similar_looks import look_product_ids
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        # One job at a time; workers only read published files
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        published = _read_manifest(directory)
+        manifest = None if full else published
+        if manifest:
+            raw = np.load(os.path.join(directory, manifest['counts']))
+            counts = sparse.csr_matrix((raw['data'], raw['indices'], raw['indptr']), shape=tuple(raw['shape']))
+            occurrences = raw['occurrences']
+            last_order_id, last_look_id = manifest['last_order_id'], manifest['last_look_id']
+        else:
+            counts = sparse.csr_matrix((1, 1), dtype=np.float32)
+            occurrences = np.zeros(1, dtype=np.float32)
+            last_order_id = last_look_id = 0
+
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        baskets = {}
+        rows = db.session.query(OrderItem.order_id, OrderItem.product_id).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(
+            Order.id > last_order_id,
+            Order.created_at <= cutoff,
+            Order.status != 'cancelled'
+        ).order_by(OrderItem.order_id)
+        for order_id, product_id in rows.yield_per(10000):
+            baskets.setdefault(order_id, set()).add(product_id)
+        if baskets:
+            last_order_id = max(baskets)
+
+        # Looks carry client-supplied ids; only catalog products may size the matrix
+        catalog = {product_id for product_id, in db.session.query(Product.id)}
+        looks = []
+        query = SavedLook.query.with_entities(SavedLook.id, SavedLook.products_used).filter(
+            SavedLook.id > last_look_id
+        ).order_by(SavedLook.id)
+        for look_id, products_used in query.yield_per(10000):
+            looks.append(look_product_ids(products_used) & catalog)
+            last_look_id = look_id
+
+        groups = ((list(baskets.values()), 1.0), (looks, LOOK_WEIGHT))
+        size = max([counts.shape[0]] + [max(basket) + 1 for group, _ in groups for basket in group if basket])
+        counts = _resize(counts, size)
+        occurrences = np.pad(occurrences, (0, size - len(occurrences)))
+
+        for group, weight in groups:
+            pair_rows, pair_cols, pair_data = _basket_pairs(group, weight)
+            if pair_rows:
+                counts = counts + sparse.csr_matrix(
+                    (np.array(pair_data, dtype=np.float32), (pair_rows, pair_cols)), shape=(size, size)
+                )
+            for basket in group:
+                occurrences[list(basket)] += weight
+
+        counts = counts.tocsr()
+        counts.sum_duplicates()
+        indptr, indices, data = normalize(counts, occurrences)
+
+        version = int(time.time() * 1000)
+        files = {
+            'counts': f'counts-{version}.npz',
+            'indptr': f'indptr-{version}.npy',
+            'indices': f'indices-{version}.npy',
+            'data': f'data-{version}.npy'
+        }
+        np.savez(
+            os.path.join(directory, files['counts']),
+            data=counts.data, indices=counts.indices, indptr=counts.indptr,
+            shape=np.array(counts.shape), occurrences=occurrences
+        )
+        np.save(os.path.join(directory, files['indptr']), indptr)
+        np.save(os.path.join(directory, files['indices']), indices)
+        np.save(os.path.join(directory, files['data']), data)
+
+        new_manifest = dict(
+            files,
+            version=version,
+            size=size,
+            last_order_id=last_order_id,
+            last_look_id=last_look_id,
+            orders=len(baskets),
+            looks=len(looks),
+            built_at=datetime.utcnow().isoformat()
+        )
+        # Publish atomically; readers switch on their next manifest check
+        tmp_path = os.path.join(directory, MANIFEST + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(new_manifest, f)
+        os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+        # Keep the previous version for workers that have not switched yet
+        _remove_old_versions(directory, keep={version, published['version'] if published else version})
+
+        return new_manifest
+
+def _remove_old_versions(directory, keep):
+    for name in os.listdir(directory):
+        stem, _, ext = name.partition('.')
+        prefix, _, version = stem.rpartition('-')
+        if ext in ('npy', 'npz') and version.isdigit() and int(version) not in keep:
+            os.remove(os.path.join(directory, name))
+
+class CoPurchaseModel:
+    """
+    Read side of the item-item model: memory-maps the published CSR arrays
+    and re-reads the manifest every check_interval seconds.
+    """
+
+    def __init__(self, directory=MODEL_DIR, check_interval=60):
+        self.directory = directory
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._arrays = None
+        self._checked_at = None
+
+    def _refresh(self):
+        if self._checked_at is not None and time.monotonic() - self._checked_at <= self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+
+        manifest = _read_manifest(self.directory)
+        if manifest is None or manifest['version'] == self._version:
+            return
+        try:
+            arrays = tuple(
+                np.load(os.path.join(self.directory, manifest[key]), mmap_mode='r')
+                for key in ('indptr', 'indices', 'data')
+            )
+        except OSError:
+            return
+        with self._lock:
+            self._arrays = arrays
+            self._version = manifest['version']
+
+    def _row(self, product_id):
+        indptr, indices, data = self._arrays
+        if product_id < 0 or product_id + 1 >= len(indptr):
+            return indices[:0], data[:0]
+        start, end = indptr[product_id], indptr[product_id + 1]
+        return indices[start:end], data[start:end]
+
+    def related(self, product_id, k=10):
+        """Products most often bought with product_id, as (product_id, score)"""
+        self._refresh()
+        if self._arrays is None:
+            return []
+        indices, data = self._row(product_id)
+        top = np.lexsort((indices, -data))[:k]
+        return [(int(indices[i]), float(data[i])) for i in top]
+
+    def related_scores(self, product_ids, candidates):
+        """
+        Summed similarity from a set of products to each of `candidates`
+        (an array of product ids), as an array aligned with candidates.
+        """
+        self._refresh()
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        if self._arrays is None or not product_ids:
+            return scores
+
+        size = len(self._arrays[0]) - 1
+        totals = np.zeros(size, dtype=np.float32)
+        for product_id in product_ids:
+            indices, data = self._row(product_id)
+            np.add.at(totals, indices, data)
+
+        known = candidates < size
+        scores[known] = totals[candidates[known]]
+        return scores
+
+# Shared per-process reader
+copurchase_model = CoPurchaseModel()
+
+if __name__ == '__main__':
+    from src.main import app
+    from src.models.user import db
+
+    parser = argparse.ArgumentParser(description='Build the item-item co-purchase model')
+    parser.add_argument('--full', action='store_true', help='rebuild from all orders and looks')
+    parser.add_argument('--grace', type=int, default=GRACE_SECONDS)
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        manifest = update_model(full=args.full, grace_seconds=args.grace)
+        print(
+            f"Added {manifest['orders']} orders and {manifest['looks']} looks "
+            f"(watermarks: order {manifest['last_order_id']}, look {manifest['last_look_id']}) "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
@@ -0,0 +1,157 @@
+import os
+import math
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Engine profiles per environment (GLOWMIRROR_ENV)
+ENGINE_PROFILES = {
+    'development': {
+        'pool_size': 5,
+        'max_overflow': 5,
+        'busy_timeout_ms': 5000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL'
+        }
+    },
+    'production': {
+        'pool_size': 10,
+        'max_overflow': 10,
+        'busy_timeout_ms': 10000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            # WAL + NORMAL is durable across application crashes; only an OS
+            # crash can lose the last transactions
+            'synchronous': 'NORMAL',
+            'cache_size': -64000,        # 64 MB page cache per connection
+            'mmap_size': 268435456,      # 256 MB memory-mapped reads
+            'temp_store': 'MEMORY',
+            'wal_autocheckpoint': 1000
+        }
+    },
+    'test': {
+        'pool_size': 2,
+        'max_overflow': 2,
+        'busy_timeout_ms': 1000,
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'OFF'
+        }
+    }
+}
+
+def get_environment():
+    return os.environ.get('GLOWMIRROR_ENV', 'development')
+
+def get_profile(environment=None):
+    environment = environment or get_environment()
+    if environment not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown environment: {environment}")
+    return ENGINE_PROFILES[environment]
+
+def get_database_uri(default_path):
+    """Database URI for this environment, defaulting to the bundled SQLite file"""
+    return (
+        os.environ.get('GLOWMIRROR_DATABASE_URI')
+        or os.environ.get('DATABASE_URL')
+        or f"sqlite:///{default_path}"
+    )
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+def engine_options(uri, environment=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the given URI and environment"""
+    profile = get_profile(environment)
+    url = make_url(uri)
+
+    # In-memory SQLite uses a per-thread pool that takes no sizing options
+    if is_sqlite(uri) and url.database in (None, '', ':memory:'):
+        return {}
+
+    options = {
+        'pool_size': int(os.environ.get('GLOWMIRROR_DB_POOL_SIZE', profile['pool_size'])),
+        'max_overflow': profile['max_overflow'],
+        'pool_pre_ping': not is_sqlite(uri)
+    }
+
+    if is_sqlite(uri):
+        options['connect_args'] = {
+            # sqlite3 busy timeout in seconds; pooled connections move between threads
+            'timeout': profile['busy_timeout_ms'] / 1000,
+            'check_same_thread': False
+        }
+
+    return options
+
+def install_sqlite_pragmas(engine, environment=None):
+    """Apply the profile's PRAGMAs to every new SQLite connection"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    profile = get_profile(environment)
+    pragmas = dict(profile['pragmas'])
+    pragmas['busy_timeout'] = profile['busy_timeout_ms']
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        # SQLite builds without the math functions (the trending upsert uses them)
+        try:
+            cursor.execute('SELECT ln(1), exp(0)')
+        except sqlite3.OperationalError:
+            dbapi_connection.create_function('ln', 1, math.log, deterministic=True)
+            dbapi_connection.create_function('exp', 1, math.exp, deterministic=True)
+        cursor.close()
+
+def configure_database(app, db, default_path):
+    """Configure URI and engine options on the app and initialise db"""
+    from src.db_routing import REPLICA_BIND, configure_read_routing, start_sqlite_replication
+
+    uri = get_database_uri(default_path)
+    replica_uri = os.environ.get('GLOWMIRROR_REPLICA_URI')
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if replica_uri:
+        # Read-only bind used by GET requests (see db_routing)
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: dict(url=replica_uri, **engine_options(replica_uri))
+        }
+    db.init_app(app)
+
+    with app.app_context():
+        install_sqlite_pragmas(db.engine)
+        if replica_uri:
+            replica = db.engines[REPLICA_BIND]
+            install_sqlite_pragmas(replica)
+            if replica.dialect.name == 'sqlite':
+                install_query_only(replica)
+
+    if replica_uri:
+        configure_read_routing(app, db)
+
+        # Local stand-in for replication between two SQLite files
+        sync_interval = os.environ.get('GLOWMIRROR_REPLICA_SYNC_SECONDS')
+        if sync_interval and is_sqlite(uri) and is_sqlite(replica_uri):
+            start_sqlite_replication(uri, replica_uri, float(sync_interval))
+
+def install_query_only(engine):
+    """Reject writes on a SQLite replica connection"""
+    @event.listens_for(engine, 'connect')
+    def set_query_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+def dialect_insert(model, session):
+    """INSERT construct with on_conflict_do_update() for the session's database"""
+    if session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
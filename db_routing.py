@@ -0,0 +1,102 @@
+import os
+import time
+import sqlite3
+import threading
+from functools import wraps
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+
+# Cookie marking a client that recently wrote, so its reads go to the primary
+STICKY_COOKIE = 'glowmirror_primary_until'
+STICKY_SECONDS = int(os.environ.get('GLOWMIRROR_READ_YOUR_WRITES_SECONDS', 5))
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+class RoutingSession(Session):
+    """
+    Session that sends reads of read-only requests to the replica bind.
+    Anything flushed, and every request that is not a GET, uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _use_replica():
+    return has_request_context() and g.get('db_route') == REPLICA_BIND
+
+def use_primary(view):
+    """Force a read-only view to read from the primary (e.g. it also writes)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_route = None
+        return view(*args, **kwargs)
+    return wrapper
+
+def _choose_route():
+    g.db_route = None
+    if request.method not in READ_METHODS:
+        return
+
+    # Read-your-writes: stay on the primary shortly after our own mutation
+    try:
+        sticky_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        sticky_until = 0
+    if sticky_until > time.time():
+        return
+
+    g.db_route = REPLICA_BIND
+
+def _mark_sticky(response):
+    if STICKY_SECONDS and request.method not in READ_METHODS and response.status_code < 400:
+        response.set_cookie(
+            STICKY_COOKIE,
+            str(time.time() + STICKY_SECONDS),
+            max_age=STICKY_SECONDS,
+            httponly=True,
+            samesite='Lax'
+        )
+    return response
+
+def start_sqlite_replication(primary_uri, replica_uri, interval):
+    """
+    Copy a SQLite primary into a SQLite replica file every interval seconds,
+    standing in for asynchronous replication when testing locally.
+    """
+    primary_path = make_url(primary_uri).database
+    replica_path = make_url(replica_uri).database
+
+    def copy():
+        source = sqlite3.connect(primary_path)
+        target = sqlite3.connect(replica_path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+
+    def run():
+        while True:
+            try:
+                copy()
+            except sqlite3.Error:
+                pass
+            time.sleep(interval)
+
+    copy()
+    thread = threading.Thread(target=run, name='sqlite-replication', daemon=True)
+    thread.start()
+    return thread
+
+def configure_read_routing(app, db):
+    """Install the routing session and per-request route selection"""
+    db.session.session_factory.class_ = RoutingSession
+    app.before_request(_choose_route)
+    app.after_request(_mark_sticky)
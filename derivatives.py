@@ -0,0 +1,111 @@
+import os
+import re
+import uuid
+import shutil
+import hashlib
+import cv2
+from PIL import Image
+
+# المقاسات المشتقة (الحد الأقصى للضلع الأطول، None = المقاس الأصلي)
+DERIVATIVE_SIZES = [
+    ('full', None),
+    ('medium', 768),
+    ('thumb', 256)
+]
+
+# صيغ الحفظ وإعدادات الضغط
+DERIVATIVE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4, 'mimetype': 'image/webp'},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True, 'mimetype': 'image/jpeg'}
+}
+
+PROCESSED_URL_PREFIX = '/api/ai/processed'
+
+# مجلد الصور المعالجة
+PROCESSED_FOLDER = os.path.join(os.path.dirname(__file__), 'processed')
+
+RENDER_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+RENDER_URL_PATTERN = re.compile(r'^' + re.escape(PROCESSED_URL_PREFIX) + r'/([0-9a-f]{32})/')
+
+def derivative_urls(render_id):
+    """روابط جميع المقاسات والصيغ لصورة معالجة"""
+    return {
+        size: {fmt: f"{PROCESSED_URL_PREFIX}/{render_id}/{size}.{fmt}" for fmt in DERIVATIVE_FORMATS}
+        for size, _ in DERIVATIVE_SIZES
+    }
+
+def render_id_from_url(url):
+    """استخراج معرف الصورة المعالجة من رابطها، أو None"""
+    match = RENDER_URL_PATTERN.match(url or '')
+    return match.group(1) if match else None
+
+class DerivativeStore:
+    """
+    حفظ الصور المعالجة مرة واحدة بجميع المقاسات والصيغ
+    المعرف مشتق من محتوى الصورة، لذلك الملفات لا تتغير أبداً بعد حفظها
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def render_dir(self, render_id):
+        return os.path.join(self.root, render_id[:2], render_id)
+
+    def exists(self, render_id):
+        """هل حُفظت الصورة بهذا المعرف (المجلد يُنقل كاملاً بعد كتابة كل المقاسات)"""
+        if not isinstance(render_id, str) or not RENDER_ID_PATTERN.match(render_id):
+            return False
+        return os.path.isdir(self.render_dir(render_id))
+
+    def path_for(self, render_id, size, fmt):
+        """مسار ملف مشتق، أو None إذا كان الطلب غير صالح"""
+        if not RENDER_ID_PATTERN.match(render_id or ''):
+            return None
+        if size not in dict(DERIVATIVE_SIZES) or fmt not in DERIVATIVE_FORMATS:
+            return None
+        return os.path.join(self.render_dir(render_id), f"{size}.{fmt}")
+
+    def save(self, image):
+        """
+        حفظ صورة BGR بجميع المقاسات في تمريرة واحدة وإرجاع معرفها
+        """
+        digest = hashlib.sha256(str(image.shape).encode())
+        digest.update(image.tobytes())
+        render_id = digest.hexdigest()[:32]
+
+        final_dir = self.render_dir(render_id)
+        if os.path.isdir(final_dir):
+            return render_id
+
+        # الكتابة في مجلد مؤقت ثم نقله دفعة واحدة
+        tmp_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+
+        try:
+            # كل مقاس يُصغر من المقاس الأكبر السابق له
+            current = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+            for size, max_side in DERIVATIVE_SIZES:
+                if max_side and max(current.size) > max_side:
+                    current = current.copy()
+                    current.thumbnail((max_side, max_side), Image.LANCZOS)
+
+                for fmt, options in DERIVATIVE_FORMATS.items():
+                    save_options = {k: v for k, v in options.items() if k != 'mimetype'}
+                    current.save(os.path.join(tmp_dir, f"{size}.{fmt}"), **save_options)
+
+            os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+            try:
+                os.rename(tmp_dir, final_dir)
+            except OSError:
+                # عملية أخرى حفظت نفس الصورة في الوقت نفسه
+                if not os.path.isdir(final_dir):
+                    raise
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return render_id
+
+# الصور المعالجة بجميع المقاسات والصيغ (مشترك لكل العملية)
+derivative_store = DerivativeStore(PROCESSED_FOLDER)
@@ -0,0 +1,176 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import io
+import csv
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select
+from src.models.user import db
+from src.models.order import Order
+from src.models.payment import PaymentTransaction, Invoice
+
+EXPORT_DIR = os.environ.get(
+    'GLOWMIRROR_EXPORT_DIR',
+    os.path.join(os.path.dirname(__file__), 'database', 'exports')
+)
+STATE_FILE = 'watermarks.json'
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# Rows fetched per round trip from the (server-side) cursor
+CHUNK_ROWS = 1000
+
+# Bytes buffered before a chunk is handed to the response or file
+CHUNK_BYTES = 64 * 1024
+
+# Rows changed more recently than this are left for the next export, so
+# transactions that commit with an older timestamp are not skipped
+GRACE_SECONDS = int(os.environ.get('GLOWMIRROR_EXPORT_GRACE_SECONDS', 60))
+
+# dataset -> (change column the watermark follows, exported columns).
+# Invoices have no updated_at; paying one sets paid_date, so the
+# coalesce re-exports an invoice when it gets paid.
+EXPORTS = {
+    'orders': (Order.updated_at, [
+        Order.id, Order.user_id, Order.total_amount, Order.status,
+        Order.payment_method, Order.created_at, Order.updated_at
+    ]),
+    'invoices': (func.coalesce(Invoice.paid_date, Invoice.created_at), [
+        Invoice.id, Invoice.invoice_number, Invoice.order_id, Invoice.user_id, Invoice.subtotal,
+        Invoice.tax_amount, Invoice.discount_amount, Invoice.shipping_amount, Invoice.total_amount,
+        Invoice.currency, Invoice.status, Invoice.due_date, Invoice.paid_date, Invoice.created_at
+    ]),
+    'transactions': (PaymentTransaction.updated_at, [
+        PaymentTransaction.id, PaymentTransaction.transaction_id, PaymentTransaction.order_id,
+        PaymentTransaction.payment_method_id, PaymentTransaction.amount, PaymentTransaction.currency,
+        PaymentTransaction.status, PaymentTransaction.gateway_transaction_id,
+        PaymentTransaction.created_at, PaymentTransaction.updated_at
+    ])
+}
+
+def parse_timestamp(value):
+    """
+    ISO date or timestamp from a query string / CLI flag; raises ValueError.
+    Values with an offset are converted to naive UTC like the stored timestamps.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def export_window(since=None, until=None, now=None, grace_seconds=GRACE_SECONDS):
+    """
+    Half-open change window [since, until) for an export. until is capped
+    at now minus the grace period and becomes the next export's watermark.
+    """
+    settled = (now or datetime.utcnow()) - timedelta(seconds=grace_seconds)
+    until = min(until, settled) if until else settled
+    if since and since > until:
+        raise ValueError('Start of the export window is after its end')
+    return since, until
+
+def iter_rows(dataset, since, until, chunk_rows=CHUNK_ROWS):
+    """
+    Rows changed in [since, until), oldest change first, streamed through
+    yield_per so only one chunk is held in memory (a server-side cursor on
+    PostgreSQL).
+    """
+    changed_at, columns = EXPORTS[dataset]
+    statement = select(*columns).where(changed_at < until).order_by(changed_at, columns[0])
+    if since:
+        statement = statement.where(changed_at >= since)
+
+    result = db.session.execute(statement.execution_options(yield_per=chunk_rows))
+    for partition in result.partitions():
+        yield from partition
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_export(dataset, fmt, since, until, chunk_bytes=CHUNK_BYTES):
+    """Encoded export body in chunks of about chunk_bytes"""
+    names = [column.key for column in EXPORTS[dataset][1]]
+    buffer = io.StringIO()
+
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        write = lambda row: writer.writerow([_value(value) for value in row])
+    else:
+        write = lambda row: buffer.write(json.dumps(dict(zip(names, map(_value, row))), ensure_ascii=False) + '\n')
+
+    for row in iter_rows(dataset, since, until):
+        write(row)
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def load_watermarks(directory=EXPORT_DIR):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as state:
+        return json.load(state)
+
+def _replace_json(path, data):
+    with open(path + '.tmp', 'w') as state:
+        json.dump(data, state, indent=2)
+    os.replace(path + '.tmp', path)
+
+def export_to_file(dataset, fmt='csv', directory=EXPORT_DIR, since=None, until=None, incremental=True,
+                   grace_seconds=GRACE_SECONDS):
+    """
+    Write one export file and, for incremental runs, advance the dataset's
+    watermark only after the file is complete.
+    Returns (path, since, until).
+    """
+    os.makedirs(directory, exist_ok=True)
+    watermarks = load_watermarks(directory)
+    if incremental and since is None and dataset in watermarks:
+        since = datetime.fromisoformat(watermarks[dataset])
+    since, until = export_window(since, until, grace_seconds=grace_seconds)
+
+    path = os.path.join(directory, f"{dataset}-{until.strftime('%Y%m%dT%H%M%S')}.{fmt}")
+    with open(path + '.tmp', 'wb') as output:
+        for chunk in stream_export(dataset, fmt, since, until):
+            output.write(chunk)
+    os.replace(path + '.tmp', path)
+
+    if incremental:
+        watermarks = load_watermarks(directory)
+        watermarks[dataset] = until.isoformat()
+        _replace_json(os.path.join(directory, STATE_FILE), watermarks)
+    return path, since, until
+
+if __name__ == '__main__':
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description='Export orders, invoices and payment transactions')
+    parser.add_argument('datasets', nargs='*', help=f"any of {', '.join(sorted(EXPORTS))} (default: all)")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--out', default=EXPORT_DIR, help='output directory (also holds the watermarks)')
+    parser.add_argument('--from', dest='since', type=parse_timestamp, help='start of the change window')
+    parser.add_argument('--to', dest='until', type=parse_timestamp, help='end of the change window')
+    parser.add_argument('--full', action='store_true', help='ignore and do not advance the watermarks')
+    parser.add_argument('--grace', type=int, default=GRACE_SECONDS)
+    args = parser.parse_args()
+    unknown = set(args.datasets) - set(EXPORTS)
+    if unknown:
+        parser.error(f"unknown datasets: {', '.join(sorted(unknown))}")
+
+    with app.app_context():
+        for dataset in args.datasets or sorted(EXPORTS):
+            path, since, until = export_to_file(
+                dataset, args.format, args.out, args.since, args.until,
+                incremental=not args.full, grace_seconds=args.grace
+            )
+            print(f"{dataset}: {path} ({since.isoformat() if since else 'beginning'} -> {until.isoformat()})")
@@ -0,0 +1,88 @@
+import os
+import hmac
+import threading
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.exports import EXPORTS, FORMATS, export_window, parse_timestamp, stream_export
+
+finance_bp = Blueprint('finance', __name__)
+
+# رمز حماية بيانات المالية (Authorization: Bearer <token>)؛ بدونه التصدير معطل
+EXPORT_TOKEN = os.environ.get('GLOWMIRROR_EXPORT_TOKEN')
+
+# أقصى عدد تصديرات متزامنة لكل عملية حتى لا تشغل التصديرات الطويلة كل خيوط الخادم
+MAX_CONCURRENT_EXPORTS = int(os.environ.get('GLOWMIRROR_MAX_CONCURRENT_EXPORTS', 2))
+_export_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EXPORTS)
+
+@finance_bp.route('/exports/<dataset>', methods=['GET'])
+def export_dataset(dataset):
+    """
+    تصدير الطلبات أو الفواتير أو معاملات الدفع كملف CSV أو NDJSON متدفق
+    ?from و ?to نطاق تاريخ التعديل، و ?since علامة آخر تصدير (من الترويسة X-Export-Watermark)
+    """
+    if not EXPORT_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Finance exports are not configured'
+        }), 503
+
+    if not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {EXPORT_TOKEN}'
+    ):
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 401
+
+    if dataset not in EXPORTS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown dataset. Use one of: {', '.join(sorted(EXPORTS))}"
+        }), 404
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({
+            'success': False,
+            'error': "Format must be 'csv' or 'ndjson'"
+        }), 400
+
+    try:
+        since = max(filter(None, [
+            parse_timestamp(request.args.get('from')),
+            parse_timestamp(request.args.get('since'))
+        ]), default=None)
+        since, until = export_window(since, parse_timestamp(request.args.get('to')))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    if not _export_slots.acquire(blocking=False):
+        response = jsonify({
+            'success': False,
+            'error': 'Too many exports in progress'
+        })
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+    released = []
+    def release():
+        if not released:
+            released.append(True)
+            _export_slots.release()
+
+    def generate():
+        try:
+            yield from stream_export(dataset, fmt, since, until)
+        finally:
+            release()
+
+    # بدون Content-Length يُرسل الرد على دفعات (chunked) صفاً بصف من المؤشر
+    response = Response(stream_with_context(generate()), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = (
+        f"attachment; filename={dataset}-{until.strftime('%Y%m%dT%H%M%S')}.{fmt}"
+    )
+    response.headers['X-Export-Watermark'] = until.isoformat()
+    response.call_on_close(release)
+    return response
@@ -1,17 +1,58 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, User
 from src.models.gallery import SavedLook, UserPreference
+from src.models.product import Product
+from src.similar_looks import look_product_ids, similar_looks_index
+from src.recommender import recommender
+from src.pagination import parse_page_args, paginate_query, project
+from src.derivatives import derivative_store, derivative_urls, render_id_from_url
 
 gallery_bp = Blueprint('gallery', __name__)
 
+LOOK_FIELDS = ['id', 'user_id', 'image_url', 'look_name', 'products_used', 'created_at', 'is_favorite', 'derivatives']
+
+def look_to_dict(look):
+    """Serialize a look with derivative URLs so clients can load thumbnails"""
+    look_dict = look.to_dict()
+    render_id = render_id_from_url(look.image_url)
+    look_dict['derivatives'] = derivative_urls(render_id) if render_id else None
+    return look_dict
+
+def unknown_product_ids(products_used):
+    """Product ids referenced by a look that are not products in the catalog"""
+    referenced = [
+        product['product_id'] for product in products_used
+        if isinstance(product, dict) and 'product_id' in product
+    ]
+    candidates = look_product_ids(products_used)
+    known = {
+        product_id for product_id, in db.session.query(Product.id).filter(Product.id.in_(candidates))
+    } if candidates else set()
+    return [product_id for product_id in referenced if not (type(product_id) is int and product_id in known)]
+
 @gallery_bp.route('/users/<int:user_id>/looks', methods=['GET'])
 def get_user_looks(user_id):
     """Get all saved looks for a user"""
     try:
-        looks = SavedLook.query.filter_by(user_id=user_id).order_by(SavedLook.created_at.desc()).all()
+        try:
+            limit, cursor, fields = parse_page_args(LOOK_FIELDS)
+            looks, next_cursor = paginate_query(
+                SavedLook.query.filter_by(user_id=user_id),
+                [SavedLook.created_at, SavedLook.id],
+                limit,
+                cursor,
+                descending=True
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         return jsonify({
             'success': True,
-            'looks': [look.to_dict() for look in looks]
+            'looks': [project(look_to_dict(look), fields) for look in looks],
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({
@@ -25,19 +66,47 @@ def save_look(user_id):
     try:
         data = request.get_json()
         
+        # Looks rendered by the AI endpoint reference their stored derivatives
+        if data.get('render_id'):
+            if not derivative_store.exists(data['render_id']):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid render_id'
+                }), 400
+            image_url = derivative_urls(data['render_id'])['full']['jpg']
+        else:
+            image_url = data['image_url']
+        
+        products_used = data.get('products_used', [])
+        if not isinstance(products_used, list):
+            return jsonify({
+                'success': False,
+                'error': 'products_used must be a list'
+            }), 400
+        unknown = unknown_product_ids(products_used)
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': 'Unknown product ids in products_used',
+                'product_ids': unknown
+            }), 400
+        
         look = SavedLook(
             user_id=user_id,
-            image_url=data['image_url'],
+            image_url=image_url,
             look_name=data.get('look_name', ''),
-            products_used=data.get('products_used', [])
+            products_used=products_used
         )
         
         db.session.add(look)
         db.session.commit()
         
+        similar_looks_index.add(look.id, look.user_id, look.products_used)
+        recommender.invalidate_user(look.user_id)
+        
         return jsonify({
             'success': True,
-            'look': look.to_dict()
+            'look': look_to_dict(look)
         }), 201
     except Exception as e:
         db.session.rollback()
@@ -51,9 +120,13 @@ def delete_look(look_id):
     """Delete a saved look"""
     try:
         look = SavedLook.query.get_or_404(look_id)
+        user_id = look.user_id
         db.session.delete(look)
         db.session.commit()
         
+        similar_looks_index.remove(look_id)
+        recommender.invalidate_user(user_id)
+        
         return jsonify({
             'success': True,
             'message': 'Look deleted successfully'
@@ -75,7 +148,7 @@ def toggle_favorite(look_id):
         
         return jsonify({
             'success': True,
-            'look': look.to_dict()
+            'look': look_to_dict(look)
         }), 200
     except Exception as e:
         db.session.rollback()
@@ -131,6 +204,8 @@ def save_user_preferences(user_id):
         
         db.session.commit()
         
+        recommender.invalidate_user(user_id)
+        
         return jsonify({
             'success': True,
             'preferences': preferences.to_dict()
@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import http.client
+from queue import Empty, Full, LifoQueue
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# مهلة الاتصال ومهلة القراءة (بالثواني) لكل مزود
+DEFAULT_TIMEOUTS = {
+    'stc_pay': (2.0, 8.0),
+    'apple_pay': (2.0, 5.0),
+    'google_pay': (2.0, 5.0),
+    'credit_card': (2.0, 10.0),
+    'mada': (2.0, 10.0)
+}
+
+# بادئات معرفات البوابة للمزودين المحاكين
+SIMULATED_PREFIXES = {
+    'stc_pay': ('STC', 'STC Pay'),
+    'apple_pay': ('APPLE', 'Apple Pay'),
+    'google_pay': ('GOOGLE', 'Google Pay'),
+    'credit_card': ('CARD', 'Credit Card'),
+    'mada': ('MADA', 'Mada')
+}
+
+class GatewayError(Exception):
+    """فشل الاتصال بالبوابة بعد استنفاد المحاولات"""
+
+class CircuitOpenError(GatewayError):
+    """قاطع الدائرة مفتوح: المزود متعطل ولا تُرسل إليه طلبات مؤقتاً"""
+
+class _TransientError(Exception):
+    pass
+
+def _json_or_empty(payload):
+    """جسم رد JSON، أو {} إذا لم يكن JSON صالحاً (مثل صفحة خطأ من وكيل)"""
+    try:
+        result = json.loads(payload)
+    except ValueError:
+        return {}
+    return result if isinstance(result, dict) else {}
+
+class PaymentGateway:
+    """فئة محاكاة بوابة الدفع (تُستخدم للمزودين الذين لم يُضبط لهم عنوان)"""
+
+    @staticmethod
+    def simulate(provider, amount, reference, payment_data):
+        prefix, display_name = SIMULATED_PREFIXES[provider]
+        return {
+            'success': True,
+            'gateway_transaction_id': f"{prefix}_{uuid.uuid4().hex[:12]}",
+            'status': 'completed',
+            'message': f'Payment processed successfully via {display_name}'
+        }
+
+class CircuitBreaker:
+    """
+    قاطع دائرة لكل مزود: يفتح بعد failure_threshold إخفاقات متتالية،
+    ويسمح بطلب تجريبي واحد بعد reset_timeout ثانية (half-open)
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+class ConnectionPool:
+    """مجمع اتصالات HTTP دائمة (keep-alive) لمضيف واحد"""
+
+    def __init__(self, url, maxsize=10, connect_timeout=2.0):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self._idle = LifoQueue(maxsize)
+
+    def _new_connection(self):
+        factory = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return factory(self.host, self.port, timeout=self.connect_timeout)
+
+    def request(self, method, path, body, headers, read_timeout):
+        try:
+            connection = self._idle.get_nowait()
+        except Empty:
+            connection = self._new_connection()
+
+        try:
+            if connection.sock is None:
+                connection.connect()
+            connection.sock.settimeout(read_timeout)
+            connection.request(method, self.base_path + path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                self._idle.put_nowait(connection)
+            except Full:
+                connection.close()
+        return response.status, payload
+
+class GatewayClient:
+    """
+    عميل بوابات الدفع: اتصالات مجمعة، مهلات لكل مزود، إعادة المحاولة مع
+    تراجع أسي للأخطاء العابرة، وقاطع دائرة لكل مزود.
+    مرجع المعاملة يُرسل كمفتاح Idempotency-Key فإعادة المحاولة لا تكرر الخصم.
+    """
+
+    def __init__(self, providers, max_retries=2, backoff=0.2, pool_size=10, workers=16):
+        self.providers = providers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._pools = {
+            name: ConnectionPool(config['url'], pool_size, config['timeouts'][0])
+            for name, config in providers.items() if config.get('url')
+        }
+        self._breakers = {name: CircuitBreaker() for name in providers}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gateway')
+
+    @classmethod
+    def from_env(cls):
+        """
+        GLOWMIRROR_GATEWAY_<PROVIDER>_URL يحدد عنوان المزود (أو GLOWMIRROR_GATEWAY_URL للجميع)؛
+        المزود بلا عنوان يُحاكى محلياً. المهلات عبر GLOWMIRROR_GATEWAY_<PROVIDER>_TIMEOUT=connect,read
+        """
+        providers = {}
+        for name, timeouts in DEFAULT_TIMEOUTS.items():
+            prefix = f'GLOWMIRROR_GATEWAY_{name.upper()}'
+            timeout_env = os.environ.get(f'{prefix}_TIMEOUT')
+            if timeout_env:
+                timeouts = tuple(float(value) for value in timeout_env.split(','))
+            providers[name] = {
+                'url': os.environ.get(f'{prefix}_URL') or os.environ.get('GLOWMIRROR_GATEWAY_URL'),
+                'timeouts': timeouts
+            }
+        return cls(
+            providers,
+            max_retries=int(os.environ.get('GLOWMIRROR_GATEWAY_RETRIES', 2)),
+            pool_size=int(os.environ.get('GLOWMIRROR_GATEWAY_POOL_SIZE', 10))
+        )
+
+    def supports(self, provider):
+        return provider in self.providers
+
+    def breaker_state(self, provider):
+        return self._breakers[provider].state
+
+    def charge(self, provider, amount, currency, reference, payment_data):
+        """تنفيذ الدفع وإرجاع رد البوابة {'success', 'gateway_transaction_id', 'status', 'message'}"""
+        if provider not in self.providers:
+            raise GatewayError(f'Unsupported payment method: {provider}')
+        if provider not in self._pools:
+            return PaymentGateway.simulate(provider, amount, reference, payment_data)
+
+        breaker = self._breakers[provider]
+        if not breaker.allow():
+            raise CircuitOpenError(f'{provider} gateway is temporarily unavailable')
+
+        body = json.dumps({
+            'amount': amount,
+            'currency': currency,
+            'reference': reference,
+            'method': provider,
+            'payment_data': payment_data
+        })
+        headers = {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': reference,
+            'Connection': 'keep-alive'
+        }
+        read_timeout = self.providers[provider]['timeouts'][1]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                status, payload = self._pools[provider].request('POST', '/v1/payments', body, headers, read_timeout)
+                if status >= 500 or status == 429:
+                    raise _TransientError(f'HTTP {status}')
+                if 400 <= status < 500:
+                    # رفض من البوابة وليس عطلاً فيها: نهائي، بلا إعادة محاولة ولا يُحتسب على القاطع
+                    result = _json_or_empty(payload)
+                else:
+                    result = json.loads(payload)
+                breaker.record_success()
+                return {
+                    'success': status == 200 and result.get('status') == 'completed',
+                    'gateway_transaction_id': result.get('gateway_transaction_id'),
+                    'status': result.get('status', 'failed'),
+                    'message': result.get('message', f'HTTP {status}')
+                }
+            except (_TransientError, OSError, http.client.HTTPException, ValueError) as error:
+                last_error = error
+                if attempt < self.max_retries:
+                    # تراجع أسي مع عشوائية لتفادي موجات إعادة المحاولة المتزامنة
+                    time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+        breaker.record_failure()
+        raise GatewayError(f'{provider} gateway error: {last_error}')
+
+    def lookup(self, provider, reference):
+        """
+        حالة دفعة سابقة لدى البوابة بمرجعها، أو None إذا لم تصلها
+        المزودون المحاكون لا يحتفظون بحالة فيعيدون None دائماً
+        """
+        if provider not in self._pools:
+            return None
+
+        breaker = self._breakers[provider]
+        if not breaker.allow():
+            raise CircuitOpenError(f'{provider} gateway is temporarily unavailable')
+
+        try:
+            status, payload = self._pools[provider].request(
+                'GET', f'/v1/payments/{quote(reference)}', None, {}, self.providers[provider]['timeouts'][1]
+            )
+            if status >= 500 or status == 429:
+                raise _TransientError(f'HTTP {status}')
+        except (_TransientError, OSError, http.client.HTTPException) as error:
+            breaker.record_failure()
+            raise GatewayError(f'{provider} gateway error: {error}')
+
+        breaker.record_success()
+        if status == 404:
+            return None
+        if 400 <= status < 500:
+            # الحالة غير معروفة: تبقى المعاملة كما هي حتى المطابقة التالية
+            raise GatewayError(f'{provider} gateway rejected the lookup: HTTP {status}')
+        try:
+            result = json.loads(payload)
+        except ValueError as error:
+            raise GatewayError(f'{provider} gateway error: {error}')
+        return {
+            'success': result.get('status') == 'completed',
+            'gateway_transaction_id': result.get('gateway_transaction_id'),
+            'status': result.get('status', 'failed'),
+            'message': result.get('message', f'HTTP {status}')
+        }
+
+    def submit(self, provider, amount, currency, reference, payment_data):
+        """تنفيذ الدفع في مجمع خيوط محدود وإرجاع Future دون حجز خيط الطلب"""
+        return self._executor.submit(self.charge, provider, amount, currency, reference, payment_data)
+
+# عميل مشترك لكل عملية
+gateway_client = GatewayClient.from_env()
@@ -0,0 +1,66 @@
+import json
+import hashlib
+from datetime import datetime, timedelta
+from flask import jsonify
+from src.models.user import db
+from src.models.idempotency_key import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+class IdempotencyError(Exception):
+    """خطأ في مفتاح عدم التكرار"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def request_key(request):
+    """المفتاح من الترويسة Idempotency-Key أو من الحقل idempotency_key في الجسم"""
+    key = request.headers.get(HEADER)
+    if key is None:
+        key = (request.get_json(silent=True) or {}).get('idempotency_key')
+    if key is None:
+        return None
+    if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError('Invalid idempotency key')
+    return key
+
+def request_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def find_response(scope, key, body_hash):
+    """الرد المخزن لطلب سابق بنفس المفتاح، أو None إذا لم يُعالج بعد"""
+    stored = IdempotencyKey.query.filter_by(scope=scope, key=key).first()
+    if stored is None:
+        return None
+    if stored.request_hash != body_hash:
+        raise IdempotencyError('Idempotency key was already used with a different request', 422)
+    return replay(stored)
+
+def replay(stored):
+    response = jsonify(stored.response_body)
+    response.status_code = stored.response_status
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def store_response(scope, key, body_hash, status, body):
+    """
+    حفظ الرد داخل معاملة الطلب نفسها؛ القيد الفريد (scope, key) يجعل
+    الطلب المكرر المتزامن يفشل عند الإدراج فيعيد الرد المخزن بدلاً من التكرار
+    """
+    db.session.add(IdempotencyKey(
+        scope=scope,
+        key=key,
+        request_hash=body_hash,
+        response_status=status,
+        response_body=body
+    ))
+
+def purge_expired(max_age=timedelta(days=1)):
+    """حذف المفاتيح الأقدم من max_age"""
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.created_at < datetime.utcnow() - max_age
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
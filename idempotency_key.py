@@ -0,0 +1,22 @@
+from src.models.user import db
+from datetime import datetime
+
+class IdempotencyKey(db.Model):
+    """Stored response of a request made with a client-supplied Idempotency-Key"""
+    id = db.Column(db.Integer, primary_key=True)
+    # Endpoint and caller the key belongs to, e.g. 'checkout:42'
+    scope = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    # SHA-256 of the request body, so a reused key with a different body is rejected
+    request_hash = db.Column(db.String(64), nullable=False)
+    response_status = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_idempotency_key_scope_key'),
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.scope} {self.key}>'
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, update
+from src.models.user import db
+from src.models.product import ProductColor
+from src.models.order import Order
+from src.models.payment import PaymentTransaction
+from src.models.stock_reservation import StockReservation
+
+# مدة حجز المخزون لطلب لم يُدفع بعد
+RESERVATION_TTL = timedelta(minutes=int(os.environ.get('GLOWMIRROR_RESERVATION_TTL_MINUTES', 15)))
+SWEEP_INTERVAL = int(os.environ.get('GLOWMIRROR_RESERVATION_SWEEP_SECONDS', 60))
+
+class OutOfStockError(Exception):
+    """الكمية المطلوبة من اللون غير متوفرة"""
+
+    def __init__(self, color_id, status_code=409):
+        super().__init__('Insufficient stock')
+        self.color_id = color_id
+        self.status_code = status_code
+
+def reserve(order_id, lines):
+    """
+    حجز المخزون لأسطر الطلب [(color_id, quantity)] داخل معاملة الطلب
+    كل لون يُخصم بتحديث شرطي ذري (stock_quantity >= الكمية) فلا يتجاوز البيع المخزون
+    ولا يُقرأ الصف قبل الكتابة؛ الألوان تُرتب لتفادي الجمود بين معاملات متزامنة
+    يعيد {color_id: المخزون الجديد}
+    """
+    quantities = {}
+    for color_id, quantity in lines:
+        quantities[color_id] = quantities.get(color_id, 0) + quantity
+
+    stock = {}
+    for color_id in sorted(quantities):
+        remaining = db.session.execute(
+            update(ProductColor)
+            .where(ProductColor.id == color_id, ProductColor.stock_quantity >= quantities[color_id])
+            .values(stock_quantity=ProductColor.stock_quantity - quantities[color_id])
+            .returning(ProductColor.stock_quantity)
+        ).scalar()
+        if remaining is None:
+            raise OutOfStockError(color_id)
+        stock[color_id] = remaining
+
+    expires_at = datetime.utcnow() + RESERVATION_TTL
+    db.session.execute(insert(StockReservation), [
+        {'order_id': order_id, 'color_id': color_id, 'quantity': quantity, 'status': 'held', 'expires_at': expires_at}
+        for color_id, quantity in quantities.items()
+    ])
+    return stock
+
+def commit_reservations(order_id):
+    """تثبيت الحجز بعد نجاح الدفع (المخزون خُصم مسبقاً)"""
+    db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id == order_id, StockReservation.status == 'held')
+        .values(status='committed')
+    )
+
+def release_reservations(order_id, include_committed=False):
+    """
+    إرجاع المخزون المحجوز لطلب فشل دفعه أو أُلغي أو انتهت مهلته
+    التحويل الشرطي لحالة الحجز يجعل الإرجاع يحدث مرة واحدة فقط
+    يعيد {color_id: المخزون الجديد}
+    """
+    return release_order_reservations([order_id], include_committed)
+
+def release_order_reservations(order_ids, include_committed=False):
+    """
+    إرجاع مخزون عدة طلبات معاً: تحديث واحد لحالات الحجز ثم تحديث واحد لكل لون
+    (مرتبة لتفادي الجمود) مهما كان عدد الطلبات
+    """
+    if not order_ids:
+        return {}
+
+    statuses = ['held', 'committed'] if include_committed else ['held']
+    released = db.session.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id.in_(order_ids), StockReservation.status.in_(statuses))
+        .values(status='released')
+        .returning(StockReservation.color_id, StockReservation.quantity)
+    ).all()
+
+    quantities = {}
+    for color_id, quantity in released:
+        quantities[color_id] = quantities.get(color_id, 0) + quantity
+
+    stock = {}
+    for color_id in sorted(quantities):
+        stock[color_id] = db.session.execute(
+            update(ProductColor)
+            .where(ProductColor.id == color_id)
+            .values(stock_quantity=ProductColor.stock_quantity + quantities[color_id])
+            .returning(ProductColor.stock_quantity)
+        ).scalar()
+    return stock
+
+def publish_stock(stock):
+    """تحديث لقطة الكتالوج وفهرس الألوان بعد حفظ المعاملة"""
+    from src.catalog_cache import catalog_cache
+    from src.color_index import color_index
+
+    if not stock:
+        return
+    catalog_cache.update_stock(stock)
+    for color_id, stock_quantity in stock.items():
+        color_index.update_stock(color_id, stock_quantity)
+
+def expire_reservations(now=None):
+    """
+    إلغاء الطلبات التي انتهت مهلة حجزها ولم تبدأ معالجة دفعها
+    تحويل المعاملة من pending إلى expired شرطي، فلا يتعارض مع دفع بدأ للتو
+    """
+    now = now or datetime.utcnow()
+    order_ids = db.session.execute(
+        select(StockReservation.order_id).where(
+            StockReservation.status == 'held',
+            StockReservation.expires_at < now
+        ).distinct()
+    ).scalars().all()
+
+    expired = 0
+    for order_id in order_ids:
+        claimed = db.session.execute(
+            update(PaymentTransaction)
+            .where(PaymentTransaction.order_id == order_id, PaymentTransaction.status == 'pending')
+            .values(status='expired')
+        ).rowcount
+        if not claimed:
+            continue
+        db.session.execute(
+            update(Order).where(Order.id == order_id, Order.status == 'pending').values(status='expired')
+        )
+        stock = release_reservations(order_id)
+        db.session.commit()
+        publish_stock(stock)
+        expired += 1
+
+    db.session.commit()
+    return expired
+
+def start_reservation_sweeper(app, interval=SWEEP_INTERVAL):
+    """تشغيل إلغاء الحجوزات المنتهية دورياً في خيط خلفي"""
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    expire_reservations()
+                except Exception:
+                    db.session.rollback()
+
+    thread = threading.Thread(target=run, name='reservation-sweeper', daemon=True)
+    thread.start()
+    return thread
@@ -3,9 +3,14 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+# ضبط ميزانية الخيوط قبل تحميل numpy و cv2 و mediapipe
+from src.resource_config import init_resources
+init_resources()
+
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.database_config import configure_database
 from src.routes.user import user_bp
 from src.routes.products import products_bp
 from src.routes.orders import orders_bp
@@ -14,6 +19,7 @@ from src.routes.recommendations import recommendations_bp
 from src.routes.ai_processing import ai_bp
 from src.routes.cart import cart_bp
 from src.routes.payment import payment_bp
+from src.routes.finance import finance_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -30,20 +36,35 @@ app.register_blueprint(recommendations_bp, url_prefix='/api')
 app.register_blueprint(ai_bp, url_prefix='/api/ai')
 app.register_blueprint(cart_bp, url_prefix='/api')
 app.register_blueprint(payment_bp, url_prefix='/api')
+app.register_blueprint(finance_bp, url_prefix='/api')
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Database configuration (URI, pool and SQLite pragmas per GLOWMIRROR_ENV)
+configure_database(app, db, os.path.join(os.path.dirname(__file__), 'database', 'app.db'))
 
 # Import all models to ensure they are registered
 from src.models.product import Product, ProductColor
 from src.models.order import Order, OrderItem
 from src.models.gallery import SavedLook, UserPreference
+from src.models.popularity import ProductPopularity
+from src.models.cart_totals import CartTotals
+from src.models.idempotency_key import IdempotencyKey
+from src.models.stock_reservation import StockReservation
 from src.models.payment import PaymentMethod, PaymentTransaction, ShoppingCart, CartItem, Promotion, Invoice
 
+from src.migrations import upgrade
+from src.inventory import start_reservation_sweeper
+from src.payment_settlement import start_settlement_sweeper
+
 with app.app_context():
     db.create_all()
+    # Bring existing databases up to the current schema version
+    upgrade(db.engine)
+
+# Release stock held by orders that were never paid
+start_reservation_sweeper(app)
+
+# Settle payments stuck in processing and purge old idempotency keys
+start_settlement_sweeper(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,281 @@
+import os
+import re
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from datetime import datetime
+from sqlalchemy import text
+from src.models.user import db
+
+# Registered on db.metadata so drop_all()/create_all() reset it together with
+# the tables, and the next upgrade() re-applies every migration
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(255)),
+    db.Column('applied_at', db.DateTime, nullable=False),
+    extend_existing=True
+)
+
+def backfill_product_popularity(connection):
+    """Seed the trending counters from the existing order history"""
+    from src.trending import log_add, log_weight
+
+    rows = connection.execute(text(
+        'SELECT order_item.product_id, product.category, "order".created_at '
+        'FROM order_item '
+        'JOIN "order" ON "order".id = order_item.order_id '
+        'JOIN product ON product.id = order_item.product_id'
+    )).fetchall()
+
+    counters = {}
+    for product_id, category, created_at in rows:
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        counter = counters.get(product_id)
+        if counter is None:
+            counters[product_id] = {'id': product_id, 'category': category, 'score': log_weight(created_at), 'count': 1}
+        else:
+            counter['score'] = log_add(counter['score'], log_weight(created_at))
+            counter['count'] += 1
+
+    if counters:
+        connection.execute(text('DELETE FROM product_popularity'))
+        connection.execute(
+            text(
+                'INSERT INTO product_popularity (product_id, category, score, order_count, updated_at) '
+                'VALUES (:id, :category, :score, :count, :now)'
+            ),
+            [dict(counter, now=datetime.utcnow()) for counter in counters.values()]
+        )
+
+def merge_duplicate_carts(connection):
+    """
+    Fold every user's extra carts into their oldest one (concurrent first adds
+    used to create two), so shopping_cart.user_id can become unique
+    """
+    duplicates = connection.execute(text(
+        'SELECT shopping_cart.id, keeper.id FROM shopping_cart '
+        'JOIN (SELECT user_id, MIN(id) AS id FROM shopping_cart WHERE user_id IS NOT NULL '
+        'GROUP BY user_id HAVING COUNT(*) > 1) AS keeper '
+        'ON keeper.user_id = shopping_cart.user_id AND keeper.id <> shopping_cart.id'
+    )).fetchall()
+
+    for cart_id, keeper_id in duplicates:
+        lines = connection.execute(
+            text('SELECT id, product_id, color_id, quantity FROM cart_item WHERE cart_id = :cart'),
+            {'cart': cart_id}
+        ).fetchall()
+        for line_id, product_id, color_id, quantity in lines:
+            merged = connection.execute(
+                text(
+                    'UPDATE cart_item SET quantity = quantity + :quantity '
+                    'WHERE cart_id = :keeper AND product_id = :product AND color_id = :color'
+                ),
+                {'quantity': quantity, 'keeper': keeper_id, 'product': product_id, 'color': color_id}
+            ).rowcount
+            if merged:
+                connection.execute(text('DELETE FROM cart_item WHERE id = :id'), {'id': line_id})
+            else:
+                connection.execute(
+                    text('UPDATE cart_item SET cart_id = :keeper WHERE id = :id'),
+                    {'keeper': keeper_id, 'id': line_id}
+                )
+        connection.execute(
+            text('DELETE FROM cart_totals WHERE cart_id IN (:cart, :keeper)'),
+            {'cart': cart_id, 'keeper': keeper_id}
+        )
+        connection.execute(text('DELETE FROM shopping_cart WHERE id = :cart'), {'cart': cart_id})
+
+# Rebuilds cart_totals rows for carts that have none
+BACKFILL_CART_TOTALS = (
+    'INSERT INTO cart_totals (cart_id, user_id, total_items, line_count, subtotal, version, updated_at) '
+    'SELECT shopping_cart.id, shopping_cart.user_id, COALESCE(SUM(cart_item.quantity), 0), '
+    'COUNT(cart_item.id), COALESCE(SUM(cart_item.quantity * product.price), 0), 1, CURRENT_TIMESTAMP '
+    'FROM shopping_cart '
+    'LEFT JOIN cart_item ON cart_item.cart_id = shopping_cart.id '
+    'LEFT JOIN product ON product.id = cart_item.product_id '
+    'WHERE shopping_cart.id NOT IN (SELECT cart_id FROM cart_totals) '
+    'GROUP BY shopping_cart.id, shopping_cart.user_id'
+)
+
+# Versioned schema migrations, applied in order on top of db.create_all().
+# Steps are SQL statements or callables taking the connection, and must be
+# safe to run on a fresh database where create_all() already produced the
+# current tables.
+MIGRATIONS = [
+    (1, 'Indexes on foreign keys and lookup columns', [
+        'CREATE INDEX IF NOT EXISTS ix_product_category ON product (category)',
+        'CREATE INDEX IF NOT EXISTS ix_product_color_product_id ON product_color (product_id)',
+        'CREATE INDEX IF NOT EXISTS ix_order_user_id_created_at ON "order" (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_order_item_order_id ON order_item (order_id)',
+        'CREATE INDEX IF NOT EXISTS ix_order_item_product_id ON order_item (product_id)',
+        'CREATE INDEX IF NOT EXISTS ix_saved_look_user_id_created_at ON saved_look (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_user_preference_user_id ON user_preference (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_shopping_cart_user_id ON shopping_cart (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_cart_item_cart_id ON cart_item (cart_id)',
+        'CREATE INDEX IF NOT EXISTS ix_payment_transaction_order_id ON payment_transaction (order_id)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_order_id ON invoice (order_id)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_user_id ON invoice (user_id)'
+    ]),
+    (2, 'Backfill time-decayed product popularity counters', [
+        backfill_product_popularity
+    ]),
+    (3, 'One cart line per (cart, product, colour)', [
+        # Merge duplicate lines into the oldest one before adding the constraint
+        'UPDATE cart_item SET quantity = ('
+        'SELECT SUM(duplicate.quantity) FROM cart_item AS duplicate '
+        'WHERE duplicate.cart_id = cart_item.cart_id '
+        'AND duplicate.product_id = cart_item.product_id '
+        'AND duplicate.color_id = cart_item.color_id'
+        ') WHERE id IN (SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_id, color_id HAVING COUNT(*) > 1)',
+        'DELETE FROM cart_item WHERE id NOT IN (SELECT MIN(id) FROM cart_item GROUP BY cart_id, product_id, color_id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_item_line ON cart_item (cart_id, product_id, color_id)'
+    ]),
+    (4, 'Backfill denormalized cart totals', [
+        BACKFILL_CART_TOTALS
+    ]),
+    (5, 'Indexes for incremental finance exports', [
+        'CREATE INDEX IF NOT EXISTS ix_order_updated_at ON "order" (updated_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_payment_transaction_updated_at ON payment_transaction (updated_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_changed_at ON invoice (COALESCE(paid_date, created_at), id)'
+    ]),
+    (6, 'One cart per user', [
+        merge_duplicate_carts,
+        BACKFILL_CART_TOTALS,
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_cart_user_id ON shopping_cart (user_id)',
+        'DROP INDEX IF EXISTS ix_shopping_cart_user_id'
+    ]),
+    (7, 'Rebuild product popularity counters as log scores', [
+        backfill_product_popularity
+    ])
+]
+
+# Hot read queries and their parameters; none of them may scan a table
+HOT_QUERIES = {
+    'product_colors': ('SELECT * FROM product_color WHERE product_id = :id', {'id': 1}),
+    'products_by_category': ('SELECT * FROM product WHERE category = :category', {'category': 'lipstick'}),
+    'user_orders': (
+        'SELECT * FROM "order" WHERE user_id = :id ORDER BY created_at DESC, id DESC LIMIT 51',
+        {'id': 1}
+    ),
+    'order_items': ('SELECT * FROM order_item WHERE order_id IN (1, 2, 3)', {}),
+    'product_order_items': ('SELECT * FROM order_item WHERE product_id = :id', {'id': 1}),
+    'user_looks': (
+        'SELECT * FROM saved_look WHERE user_id = :id ORDER BY created_at DESC, id DESC LIMIT 51',
+        {'id': 1}
+    ),
+    'user_preferences': ('SELECT * FROM user_preference WHERE user_id = :id', {'id': 1}),
+    'user_cart': ('SELECT * FROM shopping_cart WHERE user_id = :id', {'id': 1}),
+    'cart_items': ('SELECT * FROM cart_item WHERE cart_id = :id', {'id': 1}),
+    'cart_summary': ('SELECT * FROM cart_totals WHERE user_id = :id ORDER BY cart_id LIMIT 1', {'id': 1}),
+    'transaction_by_id': (
+        'SELECT * FROM payment_transaction WHERE transaction_id = :id',
+        {'id': 'TXN'}
+    ),
+    'order_invoice': ('SELECT * FROM invoice WHERE order_id = :id', {'id': 1}),
+    'promotion_by_code': ('SELECT * FROM promotion WHERE code = :code', {'code': 'CODE'}),
+    'export_orders': (
+        'SELECT * FROM "order" WHERE updated_at >= :since AND updated_at < :until ORDER BY updated_at, id',
+        {'since': '2024-01-01', 'until': '2024-01-02'}
+    ),
+    'export_invoices': (
+        'SELECT * FROM invoice WHERE COALESCE(paid_date, created_at) >= :since '
+        'AND COALESCE(paid_date, created_at) < :until ORDER BY COALESCE(paid_date, created_at), id',
+        {'since': '2024-01-01', 'until': '2024-01-02'}
+    ),
+    'export_transactions': (
+        'SELECT * FROM payment_transaction WHERE updated_at >= :since AND updated_at < :until '
+        'ORDER BY updated_at, id',
+        {'since': '2024-01-01', 'until': '2024-01-02'}
+    ),
+    'trending': ('SELECT * FROM product_popularity ORDER BY score DESC LIMIT 50', {}),
+    'trending_by_category': (
+        'SELECT * FROM product_popularity WHERE category = :category ORDER BY score DESC LIMIT 50',
+        {'category': 'lipstick'}
+    )
+}
+
+def current_version(connection):
+    schema_version.create(connection, checkfirst=True)
+    version = connection.execute(text('SELECT MAX(version) FROM schema_version')).scalar()
+    return version or 0
+
+def upgrade(engine):
+    """Apply pending migrations in place, each in its own transaction"""
+    applied = []
+
+    with engine.begin() as connection:
+        version = current_version(connection)
+
+    for migration_version, description, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+
+        with engine.begin() as connection:
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(text(statement))
+            connection.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': migration_version, 'd': description, 't': datetime.utcnow()}
+            )
+        applied.append(migration_version)
+
+    return applied
+
+# Plan rows that walk an index in order; allowed only for top-K queries
+INDEX_SCAN = re.compile(r'SCAN \S+ USING (COVERING )?INDEX ')
+TOP_K_QUERY = re.compile(r'\bORDER BY\b.*\bLIMIT\b', re.IGNORECASE | re.DOTALL)
+
+def plan_uses_indexes(sql, details):
+    """
+    True if every EXPLAIN QUERY PLAN row is an index SEARCH, or an in-order
+    index SCAN for a query with ORDER BY ... LIMIT. Full scans, rowid scans
+    and temp b-trees for sorting fail.
+    """
+    top_k = bool(TOP_K_QUERY.search(sql))
+    return all(
+        detail.startswith('SEARCH ') or (top_k and INDEX_SCAN.match(detail))
+        for detail in details
+    )
+
+def check_query_plans(engine):
+    """
+    Run EXPLAIN QUERY PLAN on every hot query.
+    Returns {query_name: [plan details]} for queries that do not use indexes
+    (see plan_uses_indexes).
+    """
+    failures = {}
+
+    with engine.connect() as connection:
+        for name, (sql, params) in HOT_QUERIES.items():
+            plan = connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'), params).fetchall()
+            details = [row[-1] for row in plan]
+            if not plan_uses_indexes(sql, details):
+                failures[name] = details
+
+    return failures
+
+if __name__ == '__main__':
+    from src.main import app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+
+    with app.app_context():
+        if command == 'upgrade':
+            applied = upgrade(db.engine)
+            with db.engine.connect() as connection:
+                print(f"Schema version: {current_version(connection)} (applied: {applied or 'none'})")
+        elif command == 'check':
+            failures = check_query_plans(db.engine)
+            for name, details in failures.items():
+                print(f"FAIL {name}: {' | '.join(details)}")
+            if failures:
+                sys.exit(1)
+            print(f"All {len(HOT_QUERIES)} hot queries use indexes")
+        else:
+            print('Usage: migrations.py [upgrade|check]')
+            sys.exit(2)
@@ -0,0 +1,162 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockGatewayHandler(BaseHTTPRequestHandler):
+    """بوابة دفع وهمية محلية لاختبارات الحمل دون اتصال بالمزودين"""
+
+    # HTTP/1.1 حتى يعيد العميل استخدام الاتصالات (keep-alive)
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # حالة دفعة سابقة بمرجعها (تستخدمها مطابقة المعاملات العالقة)
+        prefix = '/v1/payments/'
+        if not self.path.startswith(prefix):
+            return self._send(404, {'status': 'failed', 'message': 'Not found'})
+        with self.server.lock:
+            result = self.server.results.get(urllib.parse.unquote(self.path[len(prefix):]))
+        if result is None:
+            return self._send(404, {'status': 'failed', 'message': 'Payment not found'})
+        self._send(200, result)
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send(400, {'status': 'failed', 'message': 'Invalid JSON'})
+
+        if self.path.rstrip('/') != '/v1/payments':
+            return self._send(404, {'status': 'failed', 'message': 'Not found'})
+
+        rng = random.random()
+        if rng < config['timeout_rate']:
+            # محاكاة بوابة لا ترد ضمن المهلة
+            time.sleep(config['hang_seconds'])
+        rng = random.random()
+        latency = max(0.0, random.gauss(config['latency_ms'], config['jitter_ms'])) / 1000
+        time.sleep(latency)
+
+        if rng < config['failure_rate']:
+            return self._send(503, {'status': 'failed', 'message': 'Gateway unavailable'})
+
+        # نفس المفتاح يعيد نفس النتيجة فإعادة المحاولة لا تكرر الخصم
+        key = self.headers.get('Idempotency-Key') or payload.get('reference')
+        with self.server.lock:
+            result = self.server.results.get(key)
+            if result is None:
+                declined = random.random() < config['decline_rate']
+                result = {
+                    'status': 'declined' if declined else 'completed',
+                    'gateway_transaction_id': f"MOCK_{uuid.uuid4().hex[:12]}",
+                    'message': 'Payment declined' if declined else 'Payment processed successfully via mock gateway'
+                }
+                self.server.results[key] = result
+                self.server.charges += 1
+                if config['webhook_url']:
+                    # وضع البوابة غير المتزامنة: الرد الآن pending والنتيجة في إشعار لاحق
+                    threading.Timer(
+                        config['webhook_delay_ms'] / 1000, send_webhook, (self.server, key, result)
+                    ).start()
+
+        if config['webhook_url']:
+            return self._send(200, {'status': 'pending', 'gateway_transaction_id': result['gateway_transaction_id']})
+        self._send(200, result)
+
+    def _send(self, status, body):
+        encoded = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        try:
+            self.wfile.write(encoded)
+        except (BrokenPipeError, ConnectionResetError):
+            # العميل أغلق الاتصال بعد انتهاء مهلته
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def send_webhook(server, reference, result):
+    """إرسال إشعار موقّع بنتيجة الدفع بنفس صيغة التوقيع التي يتحقق منها التطبيق"""
+    config = server.config
+    body = json.dumps(dict(result, reference=reference)).encode()
+    timestamp = str(int(time.time()))
+    signature = hmac.new(config['webhook_secret'].encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(config['webhook_url'], data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'X-GlowMirror-Timestamp': timestamp,
+        'X-GlowMirror-Signature': signature
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+        server.webhooks += 1
+    except OSError:
+        server.webhook_failures += 1
+
+def create_server(host='127.0.0.1', port=0, latency_ms=50.0, jitter_ms=10.0, failure_rate=0.0,
+                  decline_rate=0.0, timeout_rate=0.0, hang_seconds=30.0,
+                  webhook_url=None, webhook_secret=None, webhook_delay_ms=100.0):
+    """إنشاء البوابة الوهمية (المنفذ 0 يختار منفذاً متاحاً: server.server_address)"""
+    server = ThreadingHTTPServer((host, port), MockGatewayHandler)
+    server.daemon_threads = True
+    server.config = {
+        'latency_ms': latency_ms,
+        'jitter_ms': jitter_ms,
+        'failure_rate': failure_rate,
+        'decline_rate': decline_rate,
+        'timeout_rate': timeout_rate,
+        'hang_seconds': hang_seconds,
+        'webhook_url': webhook_url,
+        'webhook_secret': webhook_secret,
+        'webhook_delay_ms': webhook_delay_ms
+    }
+    server.lock = threading.Lock()
+    server.results = {}
+    server.charges = 0
+    server.webhooks = 0
+    server.webhook_failures = 0
+    return server
+
+def start_in_thread(**options):
+    server = create_server(**options)
+    threading.Thread(target=server.serve_forever, name='mock-gateway', daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='بوابة دفع وهمية لاختبارات الحمل')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='متوسط زمن الرد')
+    parser.add_argument('--jitter-ms', type=float, default=10.0, help='الانحراف المعياري لزمن الرد')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='نسبة ردود 503')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='نسبة الدفعات المرفوضة')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='نسبة الطلبات التي تتجاوز المهلة')
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--webhook-url', help='عنوان /api/payment-webhook لإرسال النتائج كإشعارات')
+    parser.add_argument('--webhook-secret', default=os.environ.get('GLOWMIRROR_GATEWAY_WEBHOOK_SECRET'),
+                        help='نفس GLOWMIRROR_GATEWAY_WEBHOOK_SECRET في التطبيق')
+    parser.add_argument('--webhook-delay-ms', type=float, default=100.0)
+    args = parser.parse_args()
+    if args.webhook_url and not args.webhook_secret:
+        parser.error('--webhook-url requires --webhook-secret or GLOWMIRROR_GATEWAY_WEBHOOK_SECRET')
+
+    server = create_server(
+        args.host, args.port, args.latency_ms, args.jitter_ms, args.failure_rate,
+        args.decline_rate, args.timeout_rate, args.hang_seconds,
+        args.webhook_url, args.webhook_secret, args.webhook_delay_ms
+    )
+    print(f'Mock gateway on http://{args.host}:{args.port} (set GLOWMIRROR_GATEWAY_URL to use it)')
+    server.serve_forever()
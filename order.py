@@ -1,6 +1,15 @@
 from src.models.user import db
 from datetime import datetime
 
+def order_load_options():
+    """Eager-load options that fetch items, products and colours in a fixed number of batched queries"""
+    from src.models.product import Product
+    
+    return [
+        db.selectinload(Order.items).selectinload(OrderItem.product).selectinload(Product.colors),
+        db.selectinload(Order.items).selectinload(OrderItem.color)
+    ]
+
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
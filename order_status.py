@@ -0,0 +1,183 @@
+import json
+from datetime import datetime
+from sqlalchemy import select, update
+from src.models.user import db
+from src.models.order import Order
+from src.models.payment import PaymentTransaction
+from src.inventory import publish_stock, release_order_reservations
+
+# Target status -> statuses an order may move from
+TRANSITIONS = {
+    'confirmed': {'pending'},
+    'shipped': {'confirmed'},
+    'delivered': {'shipped'},
+    'cancelled': {'pending', 'confirmed'}
+}
+
+# Orders validated and updated per transaction
+CHUNK_SIZE = 500
+
+# Outcome groups of a status request
+OUTCOMES = ('updated', 'unchanged', 'not_found', 'rejected', 'conflict', 'invalid')
+
+# Upper bound on one bulk request, which keeps the summary a sane size
+MAX_BULK_UPDATES = 50000
+
+class BulkStatusError(Exception):
+    """A bulk status request that cannot be processed"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def iter_updates(request):
+    """
+    (line, payload) pairs from an NDJSON body, read from the request stream
+    line by line, or from a JSON body {"updates": [{"id": ..., "status": ...}]}.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        for line_number, line in enumerate(request.stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+        return
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('updates'), list):
+        raise BulkStatusError('Send NDJSON lines or a JSON body with an updates list')
+    yield from enumerate(data['updates'], 1)
+
+def cancel_orders(order_ids):
+    """
+    Cancel orders in the caller's transaction. Returns (cancelled ids, ids
+    whose payment is processing, stock to publish after the commit).
+
+    An order whose payment is with the gateway is left alone, since the
+    payment may still complete. The others move to cancelled with a
+    conditional UPDATE; their pending payments are then cancelled and
+    completed ones flagged for refund, both conditionally, so a late
+    process_payment or gateway result cannot confirm them again. Only then
+    is their stock, committed stock included, released.
+    """
+    processing = set(db.session.execute(
+        select(PaymentTransaction.order_id).where(
+            PaymentTransaction.order_id.in_(order_ids),
+            PaymentTransaction.status == 'processing'
+        )
+    ).scalars())
+    candidates = [order_id for order_id in order_ids if order_id not in processing]
+    if not candidates:
+        return [], sorted(processing), {}
+
+    cancelled = list(db.session.execute(
+        update(Order)
+        .where(Order.id.in_(candidates), Order.status.in_(TRANSITIONS['cancelled']))
+        .values(status='cancelled', updated_at=datetime.utcnow())
+        .returning(Order.id)
+    ).scalars())
+
+    if cancelled:
+        for source, target in (('pending', 'cancelled'), ('completed', 'refund_pending')):
+            db.session.execute(
+                update(PaymentTransaction)
+                .where(PaymentTransaction.order_id.in_(cancelled), PaymentTransaction.status == source)
+                .values(status=target)
+            )
+    stock = release_order_reservations(cancelled, include_committed=True)
+    return cancelled, sorted(processing), stock
+
+def apply_status_chunk(updates, results):
+    """
+    Validate and apply one chunk of {order_id: target} in a single transaction.
+
+    Current statuses are read in one query; each target status is then
+    applied with one UPDATE conditioned on the allowed source statuses, so
+    an order changed concurrently is reported as a conflict rather than
+    overwritten. Cancellations go through cancel_orders(), and orders whose
+    payment is processing are reported as conflicts.
+    """
+    current = dict(db.session.execute(
+        select(Order.id, Order.status).where(Order.id.in_(updates))
+    ).all())
+
+    by_target = {}
+    for order_id, target in updates.items():
+        status = current.get(order_id)
+        if status is None:
+            results['not_found'].append(order_id)
+        elif status == target:
+            results['unchanged'].append(order_id)
+        elif status not in TRANSITIONS[target]:
+            results['rejected'].append({'id': order_id, 'status': status, 'requested': target})
+        else:
+            by_target.setdefault(target, []).append(order_id)
+
+    stock = {}
+    for target, order_ids in by_target.items():
+        if target == 'cancelled':
+            updated, _, stock = cancel_orders(order_ids)
+            updated = set(updated)
+        else:
+            updated = set(db.session.execute(
+                update(Order)
+                .where(Order.id.in_(order_ids), Order.status.in_(TRANSITIONS[target]))
+                .values(status=target, updated_at=datetime.utcnow())
+                .returning(Order.id)
+            ).scalars())
+        for order_id in order_ids:
+            if order_id in updated:
+                results['updated'].append(order_id)
+            else:
+                results['conflict'].append(order_id)
+
+    db.session.commit()
+    publish_stock(stock)
+
+def bulk_update_status(entries, chunk_size=CHUNK_SIZE):
+    """
+    Apply (line, {"id", "status"}) entries in chunked transactions.
+    Returns ids grouped by outcome; malformed entries are listed by line.
+    Chunks commit independently, so a failure leaves earlier chunks applied
+    and the same batch can simply be sent again.
+    """
+    results = {key: [] for key in OUTCOMES}
+    chunk = {}
+    count = 0
+
+    for line, entry in entries:
+        count += 1
+        if count > MAX_BULK_UPDATES:
+            # Earlier chunks are already committed; report where processing stopped
+            results['truncated_at_line'] = line
+            break
+
+        order_id = entry.get('id') if isinstance(entry, dict) else None
+        target = entry.get('status') if isinstance(entry, dict) else None
+        if not isinstance(order_id, int) or isinstance(order_id, bool) or target not in TRANSITIONS:
+            results['invalid'].append(line)
+            continue
+
+        # A later line for the same order in this chunk wins
+        chunk[order_id] = target
+        if len(chunk) >= chunk_size:
+            apply_status_chunk(chunk, results)
+            chunk = {}
+
+    if chunk:
+        apply_status_chunk(chunk, results)
+    return results
+
+def set_order_status(order_id, target):
+    """
+    Move one order with the same checks as a bulk request (including the
+    payment handling of cancel_orders). Returns (outcome, entry), e.g.
+    ('rejected', {'id': ..., 'status': ..., 'requested': ...}).
+    """
+    results = {key: [] for key in OUTCOMES}
+    apply_status_chunk({order_id: target}, results)
+    outcome = next(key for key in OUTCOMES if results[key])
+    return outcome, results[outcome][0]
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, User
-from src.models.order import Order, OrderItem
+from src.models.order import Order, OrderItem, order_load_options
 from src.models.product import Product, ProductColor
+from src.trending import record_purchases
+from src.recommender import recommender
+from src.pagination import parse_page_args, paginate_query, project_model
+from src.order_status import TRANSITIONS, BulkStatusError, bulk_update_status, iter_updates, set_order_status
 
 orders_bp = Blueprint('orders', __name__)
 
+ORDER_FIELDS = ['id', 'user_id', 'total_amount', 'status', 'payment_method', 'shipping_address', 'created_at', 'updated_at', 'items']
+
 @orders_bp.route('/orders', methods=['POST'])
 def create_order():
     """Create a new order"""
@@ -33,8 +39,21 @@ def create_order():
             )
             db.session.add(order_item)
         
+        # Count the purchases towards trending in the same transaction
+        product_ids = {item_data['product_id'] for item_data in data['items']}
+        categories = dict(db.session.query(Product.id, Product.category).filter(Product.id.in_(product_ids)))
+        record_purchases(
+            (item_data['product_id'], categories[item_data['product_id']])
+            for item_data in data['items']
+            if item_data['product_id'] in categories
+        )
+        
         db.session.commit()
         
+        recommender.invalidate_user(order.user_id)
+        
+        order = Order.query.options(*order_load_options()).filter_by(id=order.id).first()
+        
         return jsonify({
             'success': True,
             'order': order.to_dict()
@@ -50,7 +69,7 @@ def create_order():
 def get_order(order_id):
     """Get a specific order by ID"""
     try:
-        order = Order.query.get_or_404(order_id)
+        order = Order.query.options(*order_load_options()).filter_by(id=order_id).first_or_404()
         return jsonify({
             'success': True,
             'order': order.to_dict()
@@ -65,10 +84,29 @@ def get_order(order_id):
 def get_user_orders(user_id):
     """Get all orders for a specific user"""
     try:
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
+        try:
+            limit, cursor, fields = parse_page_args(ORDER_FIELDS)
+            query = Order.query.filter_by(user_id=user_id)
+            if fields is None or 'items' in fields:
+                query = query.options(*order_load_options())
+            
+            orders, next_cursor = paginate_query(
+                query,
+                [Order.created_at, Order.id],
+                limit,
+                cursor,
+                descending=True
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         return jsonify({
             'success': True,
-            'orders': [order.to_dict() for order in orders]
+            'orders': [project_model(order, fields, nested=['items']) for order in orders],
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({
@@ -78,13 +116,36 @@ def get_user_orders(user_id):
 
 @orders_bp.route('/orders/<int:order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
-    """Update order status"""
+    """Update order status (only moves allowed by TRANSITIONS)"""
     try:
         data = request.get_json()
-        order = Order.query.get_or_404(order_id)
+        target = data.get('status') if isinstance(data, dict) else None
+        if target not in TRANSITIONS:
+            return jsonify({
+                'success': False,
+                'error': f"Status must be one of: {', '.join(sorted(TRANSITIONS))}"
+            }), 400
         
-        order.status = data['status']
-        db.session.commit()
+        # Same checks as the bulk path; cancelling also claims the payment and returns the stock
+        outcome, entry = set_order_status(order_id, target)
+        if outcome == 'not_found':
+            return jsonify({
+                'success': False,
+                'error': 'Order not found'
+            }), 404
+        if outcome == 'rejected':
+            return jsonify({
+                'success': False,
+                'error': f"Order cannot move from {entry['status']} to {target}"
+            }), 409
+        if outcome == 'conflict':
+            return jsonify({
+                'success': False,
+                'error': 'Order changed concurrently or its payment is being processed'
+            }), 409
+        
+        # Reload with items, products and colours batched
+        order = Order.query.options(*order_load_options()).filter_by(id=order_id).first()
         
         return jsonify({
             'success': True,
@@ -97,20 +158,55 @@ def update_order_status(order_id):
             'error': str(e)
         }), 500
 
+@orders_bp.route('/orders/status', methods=['POST'])
+def bulk_update_order_status():
+    """
+    Move many orders to new statuses (fulfilment batches).
+    Body: NDJSON lines {"id": 1, "status": "shipped"} or {"updates": [...]}.
+    Returns order ids grouped by outcome instead of full orders.
+    """
+    try:
+        results = bulk_update_status(iter_updates(request))
+        
+        return jsonify({
+            'success': True,
+            'counts': {key: len(value) for key, value in results.items() if isinstance(value, list)},
+            'results': results
+        }), 200
+    except BulkStatusError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @orders_bp.route('/orders/<int:order_id>', methods=['DELETE'])
 def cancel_order(order_id):
     """Cancel an order (set status to cancelled)"""
     try:
-        order = Order.query.get_or_404(order_id)
+        outcome, _ = set_order_status(order_id, 'cancelled')
         
-        if order.status in ['pending', 'confirmed']:
-            order.status = 'cancelled'
-            db.session.commit()
-            
+        if outcome == 'updated':
             return jsonify({
                 'success': True,
                 'message': 'Order cancelled successfully'
             }), 200
+        elif outcome == 'not_found':
+            return jsonify({
+                'success': False,
+                'error': 'Order not found'
+            }), 404
+        elif outcome == 'conflict':
+            return jsonify({
+                'success': False,
+                'error': 'Order changed concurrently or its payment is being processed'
+            }), 409
         else:
             return jsonify({
                 'success': False,
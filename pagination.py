@@ -0,0 +1,106 @@
+import json
+import base64
+from datetime import datetime
+from flask import request
+from src.models.user import db
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+def encode_cursor(values):
+    """Encode the sort key of the last row as an opaque cursor"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+def parse_page_args(allowed_fields):
+    """
+    Read limit, cursor and fields from the query string.
+    Raises ValueError for malformed values.
+    """
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    limit = min(limit, MAX_LIMIT)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError:
+            raise ValueError('Invalid cursor')
+        if not isinstance(cursor, list):
+            raise ValueError('Invalid cursor')
+
+    fields = request.args.get('fields')
+    if fields:
+        fields = {field.strip() for field in fields.split(',') if field.strip()}
+        unknown = fields - set(allowed_fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    else:
+        fields = None
+
+    return limit, cursor or None, fields
+
+def paginate_query(query, columns, limit, cursor, descending=False):
+    """
+    Keyset pagination over a stable ordering of columns (last one unique).
+    Returns (rows, next_cursor).
+    """
+    if cursor:
+        if len(cursor) != len(columns):
+            raise ValueError('Invalid cursor')
+
+        values = []
+        for column, value in zip(columns, cursor):
+            if isinstance(column.type, db.DateTime) and value is not None:
+                try:
+                    value = datetime.fromisoformat(value)
+                except (TypeError, ValueError):
+                    raise ValueError('Invalid cursor')
+            values.append(value)
+
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y)
+        condition = None
+        for i in reversed(range(len(columns))):
+            column, value = columns[i], values[i]
+            step = column < value if descending else column > value
+            condition = step if condition is None else db.or_(step, db.and_(column == value, condition))
+        query = query.filter(condition)
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return rows, next_cursor
+
+def project(data, fields):
+    """Keep only the requested keys of a serialized row"""
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
+
+def project_model(obj, fields, nested):
+    """
+    Serialize a model, skipping to_dict() (and its relationship loads)
+    when none of the requested fields are nested collections.
+    """
+    if fields is None:
+        return obj.to_dict()
+    if fields & set(nested):
+        return project(obj.to_dict(), fields)
+
+    data = {}
+    for field in fields:
+        value = getattr(obj, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
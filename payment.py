@@ -1,7 +1,20 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from src.models.user import db, User
-from src.models.payment import PaymentMethod, PaymentTransaction, ShoppingCart, Promotion, Invoice
+from src.models.payment import PaymentMethod, PaymentTransaction, ShoppingCart, CartItem, Promotion, Invoice
 from src.models.order import Order, OrderItem
+from src.models.product import Product
+from src.db_routing import use_primary
+from src.cart_store import CartError, merge_session_cart
+from src.session_cart import clear_session_cart, load_session_cart, session_cart_items
+from src.trending import record_purchases
+from src.recommender import recommender
+from src.idempotency import IdempotencyError, find_response, request_hash, request_key, store_response
+from src.inventory import OutOfStockError, publish_stock, reserve
+from src.gateway_client import gateway_client
+from src.promotion_index import PromotionError, promotion_index
+from src.payment_settlement import WEBHOOK_SECRET, dispatch_payment, finalize_transaction, verify_signature
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 import uuid
 import hashlib
@@ -9,59 +22,13 @@ import hmac
 
 payment_bp = Blueprint('payment', __name__)
 
-class PaymentGateway:
-    """فئة محاكاة بوابة الدفع"""
-    
-    @staticmethod
-    def process_stc_pay(amount, phone_number, transaction_id):
-        """محاكاة معالجة دفع STC Pay"""
-        # في التطبيق الحقيقي، هنا سيتم الاتصال بـ API الخاص بـ STC Pay
-        return {
-            'success': True,
-            'gateway_transaction_id': f"STC_{uuid.uuid4().hex[:12]}",
-            'status': 'completed',
-            'message': 'Payment processed successfully via STC Pay'
-        }
-    
-    @staticmethod
-    def process_apple_pay(amount, payment_token, transaction_id):
-        """محاكاة معالجة دفع Apple Pay"""
-        return {
-            'success': True,
-            'gateway_transaction_id': f"APPLE_{uuid.uuid4().hex[:12]}",
-            'status': 'completed',
-            'message': 'Payment processed successfully via Apple Pay'
-        }
-    
-    @staticmethod
-    def process_google_pay(amount, payment_token, transaction_id):
-        """محاكاة معالجة دفع Google Pay"""
-        return {
-            'success': True,
-            'gateway_transaction_id': f"GOOGLE_{uuid.uuid4().hex[:12]}",
-            'status': 'completed',
-            'message': 'Payment processed successfully via Google Pay'
-        }
-    
-    @staticmethod
-    def process_credit_card(amount, card_data, transaction_id):
-        """محاكاة معالجة دفع البطاقة الائتمانية"""
-        return {
-            'success': True,
-            'gateway_transaction_id': f"CARD_{uuid.uuid4().hex[:12]}",
-            'status': 'completed',
-            'message': 'Payment processed successfully via Credit Card'
-        }
-    
-    @staticmethod
-    def process_mada(amount, card_data, transaction_id):
-        """محاكاة معالجة دفع مدى"""
-        return {
-            'success': True,
-            'gateway_transaction_id': f"MADA_{uuid.uuid4().hex[:12]}",
-            'status': 'completed',
-            'message': 'Payment processed successfully via Mada'
-        }
+def _payment_data(method_name, data):
+    """بيانات الدفع التي ترسل إلى البوابة حسب طريقة الدفع"""
+    if method_name == 'stc_pay':
+        return {'phone_number': data.get('phone_number')}
+    if method_name in ('apple_pay', 'google_pay'):
+        return {'payment_token': data.get('payment_token')}
+    return {'card_data': data.get('card_data')}
 
 @payment_bp.route('/payment-methods', methods=['GET'])
 def get_payment_methods():
@@ -96,9 +63,32 @@ def checkout():
         user_id = data['user_id']
         payment_method_id = data['payment_method_id']
         
-        # الحصول على السلة
-        cart = ShoppingCart.query.filter_by(user_id=user_id).first()
-        if not cart or not cart.items:
+        # إعادة الرد المخزن إذا أعاد العميل نفس الطلب بنفس مفتاح عدم التكرار
+        idempotency_key = request_key(request)
+        scope = f'checkout:{user_id}'
+        body_hash = request_hash(data)
+        if idempotency_key:
+            stored = find_response(scope, idempotency_key, body_hash)
+            if stored is not None:
+                return stored
+        
+        # دمج سلة الزائر (إن وجدت) قبل إتمام الشراء
+        guest_cart = load_session_cart(request)
+        if guest_cart['lines']:
+            merge_session_cart(user_id, guest_cart['session_id'], session_cart_items(guest_cart))
+        
+        # أسطر السلة مع الأسعار والفئات في استعلام واحد
+        lines = db.session.query(
+            CartItem.product_id,
+            CartItem.color_id,
+            CartItem.quantity,
+            Product.price,
+            Product.category
+        ).join(ShoppingCart, ShoppingCart.id == CartItem.cart_id).join(
+            Product, Product.id == CartItem.product_id
+        ).filter(ShoppingCart.user_id == user_id).all()
+        
+        if not lines:
             return jsonify({
                 'success': False,
                 'error': 'Cart is empty'
@@ -112,18 +102,18 @@ def checkout():
                 'error': 'Invalid payment method'
             }), 400
         
-        # حساب المبلغ الإجمالي
-        subtotal = cart.get_total_amount()
+        # حساب المبلغ الإجمالي من نفس الأسعار المستخدمة لعناصر الطلب
+        subtotal = sum(line.quantity * line.price for line in lines)
         discount_amount = 0
         
-        # تطبيق كود الخصم إذا كان موجوداً
+        # تطبيق كود الخصم إذا كان موجوداً (من فهرس العروض في الذاكرة؛ الاستخدام يُحتسب عند الكتابة)
+        promotion = None
         if 'promotion_code' in data:
-            promotion = Promotion.query.filter_by(code=data['promotion_code']).first()
+            promotion = promotion_index.get(data['promotion_code'])
             if promotion:
                 is_valid, message = promotion.is_valid()
                 if is_valid:
                     discount_amount = promotion.calculate_discount(subtotal)
-                    promotion.used_count += 1
                 else:
                     return jsonify({
                         'success': False,
@@ -137,7 +127,7 @@ def checkout():
         
         total_amount = subtotal - discount_amount + tax_amount + shipping_amount
         
-        # إنشاء الطلب
+        # كل الكتابات في نهاية المعاملة لإبقائها قصيرة
         order = Order(
             user_id=user_id,
             total_amount=total_amount,
@@ -147,16 +137,20 @@ def checkout():
         db.session.add(order)
         db.session.flush()  # للحصول على order.id
         
-        # إضافة عناصر الطلب
-        for cart_item in cart.items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                color_id=cart_item.color_id,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.product.price
-            )
-            db.session.add(order_item)
+        # إدراج عناصر الطلب دفعة واحدة
+        db.session.execute(insert(OrderItem), [
+            {
+                'order_id': order.id,
+                'product_id': line.product_id,
+                'color_id': line.color_id,
+                'quantity': line.quantity,
+                'unit_price': line.price
+            }
+            for line in lines
+        ])
+        
+        # تحديث عدادات الرواج في نفس المعاملة
+        record_purchases((line.product_id, line.category) for line in lines)
         
         # إنشاء معاملة الدفع
         transaction = PaymentTransaction(
@@ -180,10 +174,16 @@ def checkout():
             due_date=datetime.utcnow() + timedelta(days=30)
         )
         db.session.add(invoice)
+        db.session.flush()
         
-        db.session.commit()
+        # احتساب استخدام العرض بتحديث شرطي لا يتجاوز حد الاستخدام
+        if promotion:
+            promotion_index.redeem(promotion)
         
-        return jsonify({
+        # حجز المخزون آخر الكتابات حتى تبقى أقفال صفوف الألوان أقصر ما يمكن
+        stock = reserve(order.id, [(line.color_id, line.quantity) for line in lines])
+        
+        body = {
             'success': True,
             'order_id': order.id,
             'transaction_id': transaction.transaction_id,
@@ -191,8 +191,53 @@ def checkout():
             'total_amount': total_amount,
             'currency': 'SAR',
             'payment_method': payment_method.to_dict()
-        }), 200
+        }
+        if idempotency_key:
+            store_response(scope, idempotency_key, body_hash, 200, body)
         
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # طلب متزامن بنفس المفتاح سبقنا: نعيد رده المخزن
+            db.session.rollback()
+            if not idempotency_key:
+                raise
+            stored = find_response(scope, idempotency_key, body_hash)
+            if stored is None:
+                raise
+            return stored
+        
+        recommender.invalidate_user(user_id)
+        publish_stock(stock)
+        
+        response = jsonify(body)
+        return clear_session_cart(response) if guest_cart['lines'] else response
+        
+    except IdempotencyError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
+    except CartError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
+    except OutOfStockError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'color_id': e.color_id
+        }), e.status_code
+    except PromotionError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status_code
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -202,7 +247,10 @@ def checkout():
 
 @payment_bp.route('/process-payment', methods=['POST'])
 def process_payment():
-    """معالجة الدفع"""
+    """
+    بدء معالجة الدفع: ترسل الدفعة إلى البوابة في الخلفية ويعود الرد فوراً بحالة processing
+    النتيجة النهائية تطبق من رد البوابة أو من إشعارها (/payment-webhook)
+    """
     try:
         data = request.get_json()
         
@@ -223,107 +271,81 @@ def process_payment():
                 'error': 'Transaction not found'
             }), 404
         
-        if transaction.status != 'pending':
+        payment_method = transaction.payment_method
+        if not gateway_client.supports(payment_method.name):
             return jsonify({
                 'success': False,
-                'error': 'Transaction already processed'
+                'error': f'Unsupported payment method: {payment_method.name}'
             }), 400
         
-        # تحديث حالة المعاملة
-        transaction.status = 'processing'
+        # تحديث حالة المعاملة بشكل شرطي حتى لا تتعارض مع طلب مكرر أو مع انتهاء مهلة الحجز
+        claimed = db.session.execute(
+            update(PaymentTransaction)
+            .where(PaymentTransaction.id == transaction.id, PaymentTransaction.status == 'pending')
+            .values(status='processing')
+        ).rowcount
         db.session.commit()
         
-        # معالجة الدفع حسب طريقة الدفع
-        payment_method = transaction.payment_method
-        gateway_response = None
+        if not claimed:
+            return jsonify({
+                'success': False,
+                'error': 'Transaction already processed'
+            }), 400
+        db.session.refresh(transaction)
         
-        try:
-            if payment_method.name == 'stc_pay':
-                gateway_response = PaymentGateway.process_stc_pay(
-                    transaction.amount,
-                    data.get('phone_number'),
-                    transaction.transaction_id
-                )
-            elif payment_method.name == 'apple_pay':
-                gateway_response = PaymentGateway.process_apple_pay(
-                    transaction.amount,
-                    data.get('payment_token'),
-                    transaction.transaction_id
-                )
-            elif payment_method.name == 'google_pay':
-                gateway_response = PaymentGateway.process_google_pay(
-                    transaction.amount,
-                    data.get('payment_token'),
-                    transaction.transaction_id
-                )
-            elif payment_method.name == 'credit_card':
-                gateway_response = PaymentGateway.process_credit_card(
-                    transaction.amount,
-                    data.get('card_data'),
-                    transaction.transaction_id
-                )
-            elif payment_method.name == 'mada':
-                gateway_response = PaymentGateway.process_mada(
-                    transaction.amount,
-                    data.get('card_data'),
-                    transaction.transaction_id
-                )
-            else:
-                raise Exception(f"Unsupported payment method: {payment_method.name}")
-            
-            # تحديث المعاملة بناءً على استجابة البوابة
-            transaction.gateway_response = gateway_response
-            transaction.gateway_transaction_id = gateway_response.get('gateway_transaction_id')
-            
-            if gateway_response.get('success'):
-                transaction.status = 'completed'
-                
-                # تحديث حالة الطلب
-                order = transaction.order
-                order.status = 'confirmed'
-                order.payment_method = payment_method.name
-                
-                # تحديث الفاتورة
-                invoice = Invoice.query.filter_by(order_id=order.id).first()
-                if invoice:
-                    invoice.status = 'paid'
-                    invoice.paid_date = datetime.utcnow()
-                
-                # مسح السلة
-                cart = ShoppingCart.query.filter_by(user_id=order.user_id).first()
-                if cart:
-                    for item in cart.items:
-                        db.session.delete(item)
-                
-            else:
-                transaction.status = 'failed'
-                order = transaction.order
-                order.status = 'payment_failed'
-            
-            db.session.commit()
-            
+        dispatch_payment(current_app._get_current_object(), transaction, _payment_data(payment_method.name, data))
+        
+        return jsonify({
+            'success': True,
+            'transaction': transaction.to_dict(),
+            'message': 'Payment is being processed'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@payment_bp.route('/payment-webhook', methods=['POST'])
+def payment_webhook():
+    """إشعار البوابة بنتيجة الدفع (موقّع بـ HMAC)؛ تكرار الإشعار لا يغير النتيجة"""
+    try:
+        if not WEBHOOK_SECRET:
+            # لا يوجد سر مضبوط: لا يمكن التحقق من أي إشعار
             return jsonify({
-                'success': gateway_response.get('success', False),
-                'transaction': transaction.to_dict(),
-                'message': gateway_response.get('message', 'Payment processing completed')
-            }), 200
-            
-        except Exception as gateway_error:
-            # فشل في معالجة الدفع
-            transaction.status = 'failed'
-            transaction.gateway_response = {'error': str(gateway_error)}
-            
-            order = transaction.order
-            order.status = 'payment_failed'
-            
-            db.session.commit()
-            
+                'success': False,
+                'error': 'Payment webhooks are not configured'
+            }), 503
+        
+        body = request.get_data()
+        if not verify_signature(request.headers, body):
             return jsonify({
                 'success': False,
-                'transaction': transaction.to_dict(),
-                'error': f'Payment processing failed: {str(gateway_error)}'
+                'error': 'Invalid signature'
+            }), 401
+        
+        data = request.get_json(silent=True) or {}
+        if 'reference' not in data or 'status' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Reference and status are required'
             }), 400
         
+        status = finalize_transaction(data['reference'], {
+            'success': data['status'] == 'completed',
+            'gateway_transaction_id': data.get('gateway_transaction_id'),
+            'status': data['status'],
+            'message': data.get('message')
+        })
+        
+        # 200 حتى للإشعار المكرر أو المتأخر فلا تعيد البوابة إرساله
+        return jsonify({
+            'success': True,
+            'applied': status is not None
+        }), 200
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -332,6 +354,7 @@ def process_payment():
         }), 500
 
 @payment_bp.route('/transaction/<transaction_id>', methods=['GET'])
+@use_primary
 def get_transaction(transaction_id):
     """الحصول على تفاصيل المعاملة"""
     try:
@@ -368,7 +391,7 @@ def validate_promotion():
                 'error': 'Promotion code and order amount are required'
             }), 400
         
-        promotion = Promotion.query.filter_by(code=data['code']).first()
+        promotion = promotion_index.get(data['code'])
         
         if not promotion:
             return jsonify({
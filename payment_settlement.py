@@ -0,0 +1,202 @@
+import os
+import time
+import hmac
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, tuple_, update
+from src.models.user import db
+from src.models.payment import PaymentMethod, PaymentTransaction, ShoppingCart, CartItem, Invoice
+from src.models.order import Order, OrderItem
+from src.cart_store import refresh_cart_totals
+from src.gateway_client import CircuitOpenError, GatewayError, gateway_client
+from src.idempotency import purge_expired
+from src.inventory import commit_reservations, publish_stock, release_reservations
+
+# سر توقيع إشعارات البوابة (webhook) المشترك مع المزود؛ بدونه تُرفض كل الإشعارات
+WEBHOOK_SECRET = os.environ.get('GLOWMIRROR_GATEWAY_WEBHOOK_SECRET')
+SIGNATURE_HEADER = 'X-GlowMirror-Signature'
+TIMESTAMP_HEADER = 'X-GlowMirror-Timestamp'
+
+# أقصى فرق مقبول بين وقت التوقيع ووقت الاستلام لمنع إعادة إرسال إشعار قديم
+SIGNATURE_TOLERANCE = 300
+
+# المعاملة العالقة في processing أطول من هذه المدة تُطابق مع البوابة
+STUCK_AFTER = timedelta(minutes=int(os.environ.get('GLOWMIRROR_PAYMENT_STUCK_MINUTES', 10)))
+SWEEP_INTERVAL = int(os.environ.get('GLOWMIRROR_PAYMENT_SWEEP_SECONDS', 60))
+
+# الحالات النهائية في ردود البوابة؛ غيرها (مثل pending) ينتظر الإشعار
+FINAL_STATUSES = {'completed': 'completed', 'declined': 'failed', 'failed': 'failed'}
+
+def sign_payload(timestamp, body, secret):
+    message = str(timestamp).encode() + b'.' + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+def verify_signature(headers, body, now=None):
+    """التحقق من توقيع HMAC-SHA256 لإشعار البوابة وحداثته"""
+    if not WEBHOOK_SECRET:
+        return False
+    signature = headers.get(SIGNATURE_HEADER, '')
+    timestamp = headers.get(TIMESTAMP_HEADER, '')
+    if not signature or not timestamp.isdigit():
+        return False
+    if abs((now or time.time()) - int(timestamp)) > SIGNATURE_TOLERANCE:
+        return False
+    return hmac.compare_digest(sign_payload(timestamp, body, WEBHOOK_SECRET), signature)
+
+def finalize_transaction(transaction_id, gateway_response):
+    """
+    إنهاء معاملة processing بحسب رد البوابة (من الإشعار أو من رد الطلب أو من المطابقة)
+    التحويل الشرطي للحالة يجعل الإنهاء يحدث مرة واحدة مهما تكررت الإشعارات
+    الدفع الناجح لطلب لم يعد pending لا يؤكده بل يُعلِّم المعاملة refund_pending
+    يعيد الحالة الجديدة أو None إذا لم تكن الحالة نهائية أو سبق إنهاء المعاملة
+    """
+    status = FINAL_STATUSES.get(gateway_response.get('status'))
+    if status is None:
+        return None
+
+    row = db.session.execute(
+        update(PaymentTransaction)
+        .where(PaymentTransaction.transaction_id == transaction_id, PaymentTransaction.status == 'processing')
+        .values(
+            status=status,
+            gateway_response=gateway_response,
+            gateway_transaction_id=gateway_response.get('gateway_transaction_id')
+        )
+        .returning(PaymentTransaction.order_id, PaymentTransaction.payment_method_id)
+    ).first()
+    if row is None:
+        db.session.rollback()
+        return None
+
+    if status == 'completed':
+        # تأكيد الطلب شرطي: طلب أُلغي أو تغيرت حالته قبل وصول نتيجة الدفع لا يعود مؤكداً
+        order = db.session.execute(
+            update(Order)
+            .where(Order.id == row.order_id, Order.status == 'pending')
+            .values(status='confirmed', payment_method=_payment_method_name(row.payment_method_id))
+            .returning(Order.id, Order.user_id)
+        ).first()
+        if order is None:
+            # المبلغ خُصم لطلب لم يعد ينتظر الدفع: لا يُثبت الحجز وتُعلَّم المعاملة للاسترداد
+            db.session.execute(
+                update(PaymentTransaction)
+                .where(PaymentTransaction.transaction_id == transaction_id)
+                .values(status='refund_pending')
+            )
+            status = 'refund_pending'
+            stock = release_reservations(row.order_id)
+        else:
+            # تحديث الفاتورة
+            db.session.execute(
+                update(Invoice)
+                .where(Invoice.order_id == order.id)
+                .values(status='paid', paid_date=datetime.utcnow())
+            )
+
+            # حذف أسطر السلة التي اشتُريت فقط؛ ما أُضيف بعد الطلب يبقى في السلة
+            cart_id = db.session.query(ShoppingCart.id).filter_by(user_id=order.user_id).scalar()
+            if cart_id is not None:
+                db.session.execute(
+                    delete(CartItem).where(
+                        CartItem.cart_id == cart_id,
+                        tuple_(CartItem.product_id, CartItem.color_id).in_(
+                            select(OrderItem.product_id, OrderItem.color_id).where(OrderItem.order_id == order.id)
+                        )
+                    )
+                )
+                refresh_cart_totals(cart_id, order.user_id)
+
+            commit_reservations(order.id)
+            stock = {}
+    else:
+        db.session.execute(
+            update(Order).where(Order.id == row.order_id, Order.status == 'pending').values(status='payment_failed')
+        )
+        stock = release_reservations(row.order_id)
+
+    db.session.commit()
+    publish_stock(stock)
+    return status
+
+def _payment_method_name(payment_method_id):
+    return db.session.query(PaymentMethod.name).filter_by(id=payment_method_id).scalar()
+
+def return_to_pending(transaction_id):
+    """الطلب لم يصل البوابة (قاطع الدائرة مفتوح): تعود المعاملة معلقة ويبقى الحجز"""
+    db.session.execute(
+        update(PaymentTransaction)
+        .where(PaymentTransaction.transaction_id == transaction_id, PaymentTransaction.status == 'processing')
+        .values(status='pending')
+    )
+    db.session.commit()
+
+def dispatch_payment(app, transaction, payment_data):
+    """
+    إرسال الدفع إلى البوابة في الخلفية دون حجز خيط الطلب
+    الرد النهائي يُطبق عند وصوله أو عبر الإشعار، أيهما أسبق
+    """
+    transaction_id = transaction.transaction_id
+    future = gateway_client.submit(
+        transaction.payment_method.name,
+        transaction.amount,
+        transaction.currency,
+        transaction_id,
+        payment_data
+    )
+
+    def on_result(future):
+        with app.app_context():
+            try:
+                finalize_transaction(transaction_id, future.result())
+            except CircuitOpenError:
+                return_to_pending(transaction_id)
+            except GatewayError:
+                # قد تكون البوابة خصمت المبلغ: تبقى المعاملة processing حتى الإشعار أو المطابقة
+                pass
+            except Exception:
+                db.session.rollback()
+
+    future.add_done_callback(on_result)
+    return future
+
+def reconcile_stuck_transactions(now=None):
+    """
+    مطابقة المعاملات العالقة في processing مع البوابة:
+    الحالة النهائية لدى البوابة تُطبق، والدفعة التي لم تصل البوابة تفشل ويُرجع مخزونها
+    """
+    cutoff = (now or datetime.utcnow()) - STUCK_AFTER
+    stuck = db.session.query(PaymentTransaction.transaction_id, PaymentTransaction.payment_method_id).filter(
+        PaymentTransaction.status == 'processing',
+        PaymentTransaction.updated_at < cutoff
+    ).all()
+    db.session.commit()
+
+    reconciled = 0
+    for transaction_id, payment_method_id in stuck:
+        try:
+            result = gateway_client.lookup(_payment_method_name(payment_method_id), transaction_id)
+        except GatewayError:
+            # البوابة غير متاحة الآن: نعيد المحاولة في الدورة التالية
+            continue
+        if result is None:
+            result = {'status': 'failed', 'message': 'Payment not received by gateway'}
+        if finalize_transaction(transaction_id, result):
+            reconciled += 1
+    return reconciled
+
+def start_settlement_sweeper(app, interval=SWEEP_INTERVAL):
+    """تشغيل مطابقة المعاملات العالقة وحذف مفاتيح منع التكرار المنتهية دورياً في خيط خلفي"""
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    reconcile_stuck_transactions()
+                    purge_expired()
+                except Exception:
+                    db.session.rollback()
+
+    thread = threading.Thread(target=run, name='settlement-sweeper', daemon=True)
+    thread.start()
+    return thread
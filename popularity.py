@@ -0,0 +1,28 @@
+from src.models.user import db
+from datetime import datetime
+
+class ProductPopularity(db.Model):
+    """Time-decayed purchase counter per product, maintained at checkout"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
+    # Log of the decayed score expressed at the fixed trending epoch (see src.trending)
+    score = db.Column(db.Float, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_product_popularity_score', 'score'),
+        db.Index('ix_product_popularity_category_score', 'category', 'score'),
+    )
+
+    def __repr__(self):
+        return f'<ProductPopularity {self.product_id}>'
+
+    def to_dict(self):
+        return {
+            'product_id': self.product_id,
+            'category': self.category,
+            'score': self.score,
+            'order_count': self.order_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
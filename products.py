@@ -1,23 +1,47 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from src.models.user import db
 from src.models.product import Product, ProductColor
+from src.color_index import color_index
+from src.catalog_cache import catalog_cache
+from src.recommender import recommender
+from src.pagination import parse_page_args, encode_cursor, project
 
 products_bp = Blueprint('products', __name__)
 
+PRODUCT_FIELDS = ['id', 'name', 'category', 'brand', 'price', 'description', 'image_url', 'created_at', 'colors']
+
 @products_bp.route('/products', methods=['GET'])
 def get_products():
     """Get all products with optional filtering by category"""
     try:
         category = request.args.get('category')
         
-        if category:
-            products = Product.query.filter_by(category=category).all()
-        else:
-            products = Product.query.all()
+        try:
+            limit, cursor, fields = parse_page_args(PRODUCT_FIELDS)
+            if cursor and (len(cursor) != 1 or not isinstance(cursor[0], int)):
+                raise ValueError('Invalid cursor')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        products = catalog_cache.products(category)
+        
+        # A single full page is served pre-encoded from the catalog snapshot
+        if cursor is None and fields is None and len(products) <= limit:
+            return Response(catalog_cache.encoded_products(category), status=200, mimetype='application/json')
+        
+        # Keyset pagination on product id
+        if cursor:
+            products = [p for p in products if p['id'] > cursor[0]]
+        page = products[:limit]
+        next_cursor = encode_cursor([page[-1]['id']]) if len(products) > limit else None
         
         return jsonify({
             'success': True,
-            'products': [product.to_dict() for product in products]
+            'products': [project(product, fields) for product in page],
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({
@@ -29,10 +53,16 @@ def get_products():
 def get_product(product_id):
     """Get a specific product by ID"""
     try:
-        product = Product.query.get_or_404(product_id)
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            return jsonify({
+                'success': False,
+                'error': 'Product not found'
+            }), 404
+        
         return jsonify({
             'success': True,
-            'product': product.to_dict()
+            'product': product
         }), 200
     except Exception as e:
         return jsonify({
@@ -71,6 +101,11 @@ def create_product():
         
         db.session.commit()
         
+        # Keep the catalog snapshot, colour index and recommender features in sync
+        catalog_cache.upsert_product(product)
+        color_index.upsert_product(product)
+        recommender.invalidate()
+        
         return jsonify({
             'success': True,
             'product': product.to_dict()
@@ -86,12 +121,16 @@ def create_product():
 def get_product_colors(product_id):
     """Get all colors for a specific product"""
     try:
-        product = Product.query.get_or_404(product_id)
-        colors = ProductColor.query.filter_by(product_id=product_id).all()
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            return jsonify({
+                'success': False,
+                'error': 'Product not found'
+            }), 404
         
         return jsonify({
             'success': True,
-            'colors': [color.to_dict() for color in colors]
+            'colors': product['colors']
         }), 200
     except Exception as e:
         return jsonify({
@@ -103,12 +142,9 @@ def get_product_colors(product_id):
 def get_categories():
     """Get all available product categories"""
     try:
-        categories = db.session.query(Product.category).distinct().all()
-        category_list = [category[0] for category in categories]
-        
         return jsonify({
             'success': True,
-            'categories': category_list
+            'categories': catalog_cache.categories()
         }), 200
     except Exception as e:
         return jsonify({
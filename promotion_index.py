@@ -0,0 +1,112 @@
+import time
+import threading
+from sqlalchemy import event, func, or_, update
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.payment import Promotion
+
+class PromotionError(Exception):
+    """A promotion code that cannot be applied"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class PromotionIndex:
+    """
+    Per-process index of promotions by code.
+
+    Promotions are loaded in one query and detached from the session, so
+    validation (Promotion.is_valid / calculate_discount) runs without touching
+    the database and unknown codes are rejected from memory. The index is
+    reloaded when older than max_age and after any ORM write to a promotion.
+    The cached used_count is advisory only; redeem() enforces usage_limit with
+    an atomic conditional UPDATE, and the cache follows a redemption only
+    once its transaction commits.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._promotions = {}
+        self._built_at = None
+
+    def build(self):
+        promotions = Promotion.query.all()
+        for promotion in promotions:
+            db.session.expunge(promotion)
+
+        with self._lock:
+            self._promotions = {promotion.code: promotion for promotion in promotions}
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.build()
+
+    def invalidate(self):
+        """Force a full reload on the next read"""
+        self._built_at = None
+
+    def get(self, code):
+        self.ensure_fresh()
+        return self._promotions.get(code)
+
+    def redeem(self, promotion):
+        """
+        Count one use of a promotion inside the caller's transaction.
+
+        The increment only happens while the promotion is active and under
+        its usage_limit (an empty limit means unlimited), so concurrent
+        checkouts can neither lose increments nor overshoot the limit.
+        Raises PromotionError when the limit was reached; returns the new used_count.
+        The cached promotion sees the new count after the caller commits.
+        """
+        used_count = db.session.execute(
+            update(Promotion)
+            .where(
+                Promotion.id == promotion.id,
+                Promotion.is_active.is_(True),
+                or_(
+                    Promotion.usage_limit.is_(None),
+                    Promotion.usage_limit == 0,
+                    func.coalesce(Promotion.used_count, 0) < Promotion.usage_limit
+                )
+            )
+            .values(used_count=func.coalesce(Promotion.used_count, 0) + 1)
+            .returning(Promotion.used_count)
+        ).scalar()
+
+        if used_count is None:
+            raise PromotionError('Promotion code error: Promotion usage limit reached')
+        redemptions = db.session.info.setdefault('promotion_redemptions', {})
+        redemptions[promotion] = max(redemptions.get(promotion, 0), used_count)
+        return used_count
+
+    def record_redemptions(self, redemptions):
+        """Apply committed {promotion: used_count} to the cached promotions"""
+        with self._lock:
+            for promotion, used_count in redemptions.items():
+                promotion.used_count = max(promotion.used_count or 0, used_count)
+
+@event.listens_for(Session, 'after_flush')
+def _track_promotion_writes(session, flush_context):
+    if any(isinstance(instance, Promotion) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info['promotions_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_promotions(session):
+    if session.info.pop('promotions_changed', False):
+        promotion_index.invalidate()
+    redemptions = session.info.pop('promotion_redemptions', None)
+    if redemptions:
+        promotion_index.record_redemptions(redemptions)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_redemptions(session):
+    session.info.pop('promotions_changed', None)
+    session.info.pop('promotion_redemptions', None)
+
+# Shared per-process index
+promotion_index = PromotionIndex()
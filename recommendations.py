@@ -3,7 +3,12 @@ from src.models.user import db, User
 from src.models.product import Product, ProductColor
 from src.models.gallery import UserPreference, SavedLook
 from src.models.order import Order, OrderItem
-import random
+from src.color_index import HEX_COLOR_PATTERN, color_index
+from src.catalog_cache import catalog_cache
+from src.similar_looks import look_product_ids, similar_looks_index
+from src.recommender import recommender
+from src.copurchase import copurchase_model
+from src.trending import TOP_K, decayed, trending_cache
 
 recommendations_bp = Blueprint('recommendations', __name__)
 
@@ -11,61 +16,19 @@ recommendations_bp = Blueprint('recommendations', __name__)
 def get_recommendations(user_id):
     """Get personalized product recommendations for a user"""
     try:
-        # Get user preferences
-        preferences = UserPreference.query.filter_by(user_id=user_id).first()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+        diversity = max(request.args.get('diversity', 0.0, type=float), 0.0)
+        seed = request.args.get('seed', type=int)
         
-        # Get user's order history
-        orders = Order.query.filter_by(user_id=user_id).all()
-        purchased_products = []
-        for order in orders:
-            for item in order.items:
-                purchased_products.append(item.product_id)
-        
-        # Get user's saved looks
-        saved_looks = SavedLook.query.filter_by(user_id=user_id).all()
-        
-        # Base query for products
-        query = Product.query
-        
-        # Filter by preferred categories if available
-        if preferences and preferences.preferred_categories:
-            query = query.filter(Product.category.in_(preferences.preferred_categories))
-        
-        # Filter by budget range if available
-        if preferences and preferences.budget_range:
-            if preferences.budget_range == 'low':
-                query = query.filter(Product.price <= 100)
-            elif preferences.budget_range == 'medium':
-                query = query.filter(Product.price.between(100, 300))
-            elif preferences.budget_range == 'high':
-                query = query.filter(Product.price >= 300)
-        
-        # Exclude already purchased products
-        if purchased_products:
-            query = query.filter(~Product.id.in_(purchased_products))
-        
-        # Get products
-        products = query.limit(20).all()
-        
-        # If we have user's favorite colors, prioritize products with similar colors
-        if preferences and preferences.favorite_colors:
-            products_with_colors = []
-            for product in products:
-                for color in product.colors:
-                    if color.color_hex in preferences.favorite_colors:
-                        products_with_colors.append(product)
-                        break
-            
-            # Mix prioritized products with others
-            other_products = [p for p in products if p not in products_with_colors]
-            products = products_with_colors + other_products[:10]
-        
-        # Shuffle for variety
-        random.shuffle(products)
+        recommendations = []
+        for product_id in recommender.recommend(user_id, limit, diversity, seed):
+            product = catalog_cache.get_product(product_id)
+            if product is not None:
+                recommendations.append(product)
         
         return jsonify({
             'success': True,
-            'recommendations': [product.to_dict() for product in products[:10]]
+            'recommendations': recommendations
         }), 200
     except Exception as e:
         return jsonify({
@@ -75,24 +38,19 @@ def get_recommendations(user_id):
 
 @recommendations_bp.route('/users/<int:user_id>/trending', methods=['GET'])
 def get_trending_products(user_id):
-    """Get trending products based on overall popularity"""
+    """Get trending products from the time-decayed popularity counters"""
     try:
-        # Get most ordered products
-        popular_products = db.session.query(
-            Product,
-            db.func.count(OrderItem.product_id).label('order_count')
-        ).join(
-            OrderItem, Product.id == OrderItem.product_id
-        ).group_by(
-            Product.id
-        ).order_by(
-            db.func.count(OrderItem.product_id).desc()
-        ).limit(10).all()
+        category = request.args.get('category')
+        limit = min(request.args.get('limit', 10, type=int), TOP_K)
         
         trending_list = []
-        for product, count in popular_products:
-            product_dict = product.to_dict()
-            product_dict['order_count'] = count
+        for product_id, score, order_count in trending_cache.top(category, limit):
+            product = catalog_cache.get_product(product_id)
+            if product is None:
+                continue
+            product_dict = dict(product)
+            product_dict['order_count'] = order_count
+            product_dict['trending_score'] = round(decayed(score), 4)
             trending_list.append(product_dict)
         
         return jsonify({
@@ -105,48 +63,65 @@ def get_trending_products(user_id):
             'error': str(e)
         }), 500
 
+@recommendations_bp.route('/products/<int:product_id>/frequently-bought-together', methods=['GET'])
+def get_frequently_bought_together(product_id):
+    """Products most often bought (or tried on) together with a product"""
+    try:
+        limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+        
+        related = []
+        # Over-fetch so products removed from the catalog can be skipped
+        for related_id, score in copurchase_model.related(product_id, k=limit * 2):
+            product = catalog_cache.get_product(related_id)
+            if product is None:
+                continue
+            product_dict = dict(product)
+            product_dict['co_purchase_score'] = round(score, 4)
+            related.append(product_dict)
+        
+        return jsonify({
+            'success': True,
+            'products': related[:limit]
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @recommendations_bp.route('/users/<int:user_id>/similar-looks', methods=['GET'])
 def get_similar_looks(user_id):
     """Get looks similar to user's saved looks"""
     try:
         # Get user's saved looks
-        user_looks = SavedLook.query.filter_by(user_id=user_id).all()
+        user_looks = SavedLook.query.with_entities(SavedLook.products_used).filter_by(user_id=user_id).all()
+        
+        # Extract products used in user's looks
+        user_products = set()
+        for look in user_looks:
+            user_products |= look_product_ids(look.products_used)
         
-        if not user_looks:
+        if not user_products:
             return jsonify({
                 'success': True,
                 'similar_looks': []
             }), 200
         
-        # Extract products used in user's looks
-        user_products = set()
-        for look in user_looks:
-            if look.products_used:
-                for product in look.products_used:
-                    if 'product_id' in product:
-                        user_products.add(product['product_id'])
+        similar_looks_index.ensure_fresh()
+        
+        # Over-fetch so looks deleted by other workers can be skipped
+        ranked = similar_looks_index.query(user_products, exclude_user=user_id, k=20)
+        looks = {look.id: look for look in SavedLook.query.filter(SavedLook.id.in_([look_id for look_id, _ in ranked]))}
         
-        # Find other users' looks that use similar products
         similar_looks = []
-        if user_products:
-            all_looks = SavedLook.query.filter(SavedLook.user_id != user_id).all()
-            
-            for look in all_looks:
-                if look.products_used:
-                    look_products = set()
-                    for product in look.products_used:
-                        if 'product_id' in product:
-                            look_products.add(product['product_id'])
-                    
-                    # Check for overlap
-                    overlap = user_products.intersection(look_products)
-                    if len(overlap) > 0:
-                        look_dict = look.to_dict()
-                        look_dict['similarity_score'] = len(overlap) / len(user_products.union(look_products))
-                        similar_looks.append(look_dict)
-        
-        # Sort by similarity score
-        similar_looks.sort(key=lambda x: x['similarity_score'], reverse=True)
+        for look_id, score in ranked:
+            look = looks.get(look_id)
+            if look is None:
+                similar_looks_index.remove(look_id)
+                continue
+            look_dict = look.to_dict()
+            look_dict['similarity_score'] = score
+            similar_looks.append(look_dict)
         
         return jsonify({
             'success': True,
@@ -165,26 +140,8 @@ def get_color_recommendations():
         data = request.get_json()
         skin_tone = data.get('skin_tone', 'medium')
         
-        # Color recommendations based on skin tone
-        color_recommendations = {
-            'light': {
-                'lipstick': ['#ff6b9d', '#ff7675', '#fd79a8'],
-                'eyeshadow': ['#a55eea', '#3742fa', '#ff6348'],
-                'blush': ['#ff9ff3', '#ff6b9d', '#fd79a8']
-            },
-            'medium': {
-                'lipstick': ['#ff4757', '#c44569', '#f8b500'],
-                'eyeshadow': ['#2f3542', '#ff6348', '#ff9ff3'],
-                'blush': ['#ff7675', '#fd79a8', '#e84393']
-            },
-            'dark': {
-                'lipstick': ['#c44569', '#8b0000', '#ff4757'],
-                'eyeshadow': ['#2f3542', '#8b4513', '#ff6348'],
-                'blush': ['#e84393', '#ff7675', '#c44569']
-            }
-        }
-        
-        recommendations = color_recommendations.get(skin_tone, color_recommendations['medium'])
+        # Nearest in-stock shades to the skin tone palette
+        recommendations = color_index.recommend_for_skin_tone(skin_tone)
         
         return jsonify({
             'success': True,
@@ -196,3 +153,57 @@ def get_color_recommendations():
             'error': str(e)
         }), 500
 
+@recommendations_bp.route('/colors/nearest', methods=['GET'])
+def get_nearest_colors():
+    """Get the in-stock shades perceptually closest to a colour"""
+    try:
+        color_hex = request.args.get('hex', '')
+        if not HEX_COLOR_PATTERN.fullmatch(color_hex):
+            return jsonify({
+                'success': False,
+                'error': 'hex must be a #RRGGBB colour'
+            }), 400
+        
+        limit = request.args.get('limit', 5, type=int)
+        if limit <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'limit must be positive'
+            }), 400
+        
+        shades = color_index.nearest(
+            color_hex=color_hex,
+            k=min(limit, 50),
+            category=request.args.get('category')
+        )
+        
+        return jsonify({
+            'success': True,
+            'shades': shades
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@recommendations_bp.route('/colors/<int:color_id>/dupes', methods=['GET'])
+def get_color_dupes(color_id):
+    """Get cross-brand dupes for a shade"""
+    try:
+        dupes = color_index.dupes(color_id, k=min(request.args.get('limit', 5, type=int), 50))
+        if dupes is None:
+            return jsonify({
+                'success': False,
+                'error': 'Color not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'dupes': dupes
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
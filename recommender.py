@@ -0,0 +1,234 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.color_index import HEX_COLOR_PATTERN, hex_to_lab
+from src.copurchase import copurchase_model
+
+# Price bands match UserPreference.budget_range
+PRICE_BANDS = ['low', 'medium', 'high']
+
+# Weights of each signal in the personalized score
+PREFERRED_CATEGORY_WEIGHT = 2.0
+HISTORY_CATEGORY_WEIGHT = 1.0
+BUDGET_WEIGHT = 1.0
+COLOR_WEIGHT = 1.5
+POPULARITY_WEIGHT = 0.5
+COPURCHASE_WEIGHT = 1.0
+
+# Delta E at which a shade counts as half a match for a favourite colour
+COLOR_DELTA_E = 20.0
+
+# Candidates kept per user; recommendations (and diversity sampling) draw from these
+CANDIDATE_POOL = 100
+
+def price_band(price):
+    if price <= 100:
+        return 0
+    if price < 300:
+        return 1
+    return 2
+
+class ProductFeatures:
+    """
+    Feature matrix over the catalog, one row per product:
+    category one-hot, price band one-hot and normalized popularity.
+    Shade colours are kept as a flat Lab array with the row of each shade.
+    """
+
+    def __init__(self, products, popularity):
+        self.product_ids = np.array([p['id'] for p in products], dtype=np.int64)
+        self.rows = {product_id: row for row, product_id in enumerate(self.product_ids.tolist())}
+        self.categories = sorted({p['category'] for p in products})
+        category_columns = {category: column for column, category in enumerate(self.categories)}
+
+        count = len(products)
+        self.category = np.zeros((count, len(self.categories)), dtype=np.float32)
+        self.band = np.zeros((count, len(PRICE_BANDS)), dtype=np.float32)
+        self.popularity = np.zeros(count, dtype=np.float32)
+        self.category_index = np.zeros(count, dtype=np.int32)
+
+        shade_rows, shade_hexes = [], []
+        for row, product in enumerate(products):
+            self.category_index[row] = category_columns[product['category']]
+            self.category[row, self.category_index[row]] = 1.0
+            self.band[row, price_band(product['price'])] = 1.0
+            self.popularity[row] = np.log1p(popularity.get(product['id'], 0.0))
+            for color in product['colors']:
+                shade_rows.append(row)
+                shade_hexes.append(color['color_hex'])
+
+        if count and self.popularity.max() > 0:
+            self.popularity /= self.popularity.max()
+
+        self.shade_rows = np.array(shade_rows, dtype=np.int64)
+        self.shade_labs = np.array([hex_to_lab(h) for h in shade_hexes]).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def color_match(self, favorite_labs):
+        """Per product: best similarity (0-1) between any shade and any favourite colour"""
+        match = np.zeros(len(self), dtype=np.float32)
+        if not len(favorite_labs) or not len(self.shade_labs):
+            return match
+        distances = np.linalg.norm(self.shade_labs[:, None, :] - favorite_labs[None, :, :], axis=2)
+        similarity = COLOR_DELTA_E / (COLOR_DELTA_E + distances.min(axis=1))
+        np.maximum.at(match, self.shade_rows, similarity.astype(np.float32))
+        return match
+
+class Recommender:
+    """
+    Scores the whole catalog for a user in one vectorized pass.
+
+    The feature matrix is rebuilt from the catalog snapshot and popularity
+    counters when older than max_age. Each user's ranked candidate pool is
+    cached until their orders, preferences or looks change in this process
+    (invalidate_user), or for user_ttl seconds for changes made by other
+    workers.
+    """
+
+    def __init__(self, max_age=300, user_ttl=60, max_users=10000):
+        self.max_age = max_age
+        self.user_ttl = user_ttl
+        self.max_users = max_users
+
+        self._lock = threading.Lock()
+        self._features = None
+        self._built_at = None
+        self._candidates = OrderedDict()
+
+    def build(self):
+        from src.models.popularity import ProductPopularity
+        from src.catalog_cache import catalog_cache
+        from src.trending import decayed
+
+        popularity = {
+            product_id: decayed(score)
+            for product_id, score in ProductPopularity.query.with_entities(
+                ProductPopularity.product_id, ProductPopularity.score
+            )
+        }
+        features = ProductFeatures(catalog_cache.products(), popularity)
+
+        with self._lock:
+            self._features = features
+            self._built_at = time.monotonic()
+            self._candidates = OrderedDict()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.build()
+
+    def invalidate(self):
+        self._built_at = None
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._candidates.pop(user_id, None)
+
+    def _load_signals(self, user_id):
+        from src.models.user import db
+        from src.models.gallery import UserPreference, SavedLook
+        from src.models.order import Order, OrderItem
+        from src.similar_looks import look_product_ids
+
+        preferences = UserPreference.query.filter_by(user_id=user_id).first()
+        purchased = {
+            product_id for product_id, in db.session.query(OrderItem.product_id)
+            .join(Order, Order.id == OrderItem.order_id)
+            .filter(Order.user_id == user_id)
+            .distinct()
+        }
+        looked = set()
+        for look in SavedLook.query.with_entities(SavedLook.products_used).filter_by(user_id=user_id):
+            looked |= look_product_ids(look.products_used)
+
+        return preferences, purchased, looked
+
+    def score(self, features, preferences, purchased, looked):
+        """Score every product for one user; purchased products score -inf"""
+        categories = np.zeros(features.category.shape[1], dtype=np.float32)
+        bands = np.zeros(len(PRICE_BANDS), dtype=np.float32)
+        favorite_labs = np.zeros((0, 3))
+
+        if preferences:
+            for category in preferences.preferred_categories or []:
+                if category in features.categories:
+                    categories[features.categories.index(category)] += PREFERRED_CATEGORY_WEIGHT
+            if preferences.budget_range in PRICE_BANDS:
+                bands[PRICE_BANDS.index(preferences.budget_range)] = BUDGET_WEIGHT
+            favorite_labs = np.array([
+                hex_to_lab(color_hex) for color_hex in preferences.favorite_colors or []
+                if isinstance(color_hex, str) and HEX_COLOR_PATTERN.fullmatch(color_hex)
+            ]).reshape(-1, 3)
+
+        # Category mix of the products the user bought or tried on
+        history = [features.rows[p] for p in purchased | looked if p in features.rows]
+        if history:
+            counts = np.bincount(features.category_index[history], minlength=len(categories))
+            categories += HISTORY_CATEGORY_WEIGHT * counts / counts.sum()
+
+        # Products frequently bought or tried on together with the user's history
+        related = copurchase_model.related_scores(purchased | looked, features.product_ids)
+        if related.max(initial=0) > 0:
+            related /= related.max()
+
+        scores = (
+            features.category @ categories
+            + features.band @ bands
+            + POPULARITY_WEIGHT * features.popularity
+            + COLOR_WEIGHT * features.color_match(favorite_labs)
+            + COPURCHASE_WEIGHT * related
+        )
+
+        purchased_mask = np.zeros(len(features), dtype=bool)
+        purchased_mask[[features.rows[p] for p in purchased if p in features.rows]] = True
+        scores[purchased_mask] = -np.inf
+        return scores
+
+    def candidates(self, user_id):
+        """Ranked (product_id, score) pool for a user, best first"""
+        self.ensure_fresh()
+        with self._lock:
+            cached = self._candidates.get(user_id)
+            if cached is not None and time.monotonic() - cached[0] <= self.user_ttl:
+                self._candidates.move_to_end(user_id)
+                return cached[1]
+            features = self._features
+
+        scores = self.score(features, *self._load_signals(user_id))
+
+        pool = min(CANDIDATE_POOL, int(np.isfinite(scores).sum()))
+        top = np.argpartition(-scores, pool - 1)[:pool] if 0 < pool < len(scores) else np.arange(len(scores))
+        top = top[np.isfinite(scores[top])]
+        # Ties broken by product id so results are deterministic
+        top = top[np.lexsort((features.product_ids[top], -scores[top]))]
+        ranked = [(int(features.product_ids[i]), float(scores[i])) for i in top]
+
+        with self._lock:
+            self._candidates[user_id] = (time.monotonic(), ranked)
+            self._candidates.move_to_end(user_id)
+            while len(self._candidates) > self.max_users:
+                self._candidates.popitem(last=False)
+        return ranked
+
+    def recommend(self, user_id, limit=10, diversity=0.0, seed=None):
+        """
+        Top-N product ids for a user. With diversity > 0, N products are
+        sampled from the candidate pool (weighted towards higher scores)
+        instead; the same seed gives the same sample.
+        """
+        ranked = self.candidates(user_id)
+        if not diversity or len(ranked) <= limit:
+            return [product_id for product_id, _ in ranked[:limit]]
+
+        scores = np.array([score for _, score in ranked])
+        rng = np.random.default_rng(user_id if seed is None else seed)
+        # Gumbel top-k: sampling without replacement proportional to exp(score / diversity)
+        keys = scores / diversity + rng.gumbel(size=len(scores))
+        chosen = np.sort(np.argsort(-keys, kind='stable')[:limit])
+        return [ranked[i][0] for i in chosen]
+
+# Shared per-process recommender
+recommender = Recommender()
@@ -0,0 +1,107 @@
+import os
+
+# متغيرات البيئة التي تتحكم في عدد خيوط مكتبات BLAS و OpenMP
+# يجب ضبطها قبل استيراد numpy أو cv2 أو mediapipe لأول مرة
+THREAD_ENV_VARS = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'TF_NUM_INTRAOP_THREADS',
+    'TF_NUM_INTEROP_THREADS'
+]
+
+_applied_budget = None
+
+def available_cpus():
+    """عدد الأنوية المتاحة لهذه العملية (مع احترام أي تثبيت مسبق)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def get_workers_per_host():
+    """عدد عمليات Gunicorn على نفس الجهاز"""
+    value = os.environ.get('GLOWMIRROR_WORKERS_PER_HOST') or os.environ.get('WEB_CONCURRENCY') or 1
+    return max(1, int(value))
+
+def compute_thread_budget(workers_per_host=None, cpu_count=None):
+    """
+    حساب عدد الخيوط لكل عملية بحيث لا يتجاوز المجموع عدد الأنوية
+    """
+    workers_per_host = workers_per_host or get_workers_per_host()
+    cpu_count = cpu_count or available_cpus()
+
+    override = os.environ.get('GLOWMIRROR_THREADS_PER_WORKER')
+    if override:
+        threads = int(override)
+    else:
+        threads = cpu_count // workers_per_host
+
+    return {
+        'workers_per_host': workers_per_host,
+        'cpu_count': cpu_count,
+        'threads_per_worker': max(1, threads)
+    }
+
+def configure_threads(workers_per_host=None, cpu_count=None):
+    """
+    ضبط خيوط OpenCV و MediaPipe/TFLite و BLAS بشكل موحد
+    """
+    global _applied_budget
+
+    budget = compute_thread_budget(workers_per_host, cpu_count)
+    threads = str(budget['threads_per_worker'])
+
+    # خيوط BLAS و OpenMP و TFLite (تُقرأ عند تحميل المكتبات)
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = threads
+
+    # خيوط OpenCV يمكن تغييرها في أي وقت
+    import cv2
+    cv2.setNumThreads(budget['threads_per_worker'])
+
+    _applied_budget = budget
+    return budget
+
+def pin_worker_process(worker_index, workers_per_host=None, pid=0):
+    """
+    تثبيت عملية العامل على مجموعة أنوية خاصة بها
+
+    يُستدعى من خطاف post_fork في Gunicorn، مثلاً:
+        def post_fork(server, worker):
+            pin_worker_process(worker.age % server.num_workers, server.num_workers)
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+
+    workers_per_host = workers_per_host or get_workers_per_host()
+    cpus = sorted(os.sched_getaffinity(pid))
+    per_worker = max(1, len(cpus) // workers_per_host)
+
+    start = (worker_index % workers_per_host) * per_worker % len(cpus)
+    cpu_set = set(cpus[start:start + per_worker]) or {cpus[start]}
+    os.sched_setaffinity(pid, cpu_set)
+
+    # إعادة ضبط الخيوط لتطابق الأنوية المثبتة
+    configure_threads(workers_per_host=1, cpu_count=len(cpu_set))
+    return cpu_set
+
+def init_resources():
+    """
+    تهيئة الموارد عند بدء التطبيق بناءً على إعدادات البيئة
+    """
+    if _applied_budget is not None:
+        return _applied_budget
+
+    budget = configure_threads()
+
+    if os.environ.get('GLOWMIRROR_PIN_CPUS') == '1' and 'GLOWMIRROR_WORKER_INDEX' in os.environ:
+        pin_worker_process(int(os.environ['GLOWMIRROR_WORKER_INDEX']))
+
+    return _applied_budget or budget
+
+def get_thread_budget():
+    """الحصول على إعدادات الخيوط المطبقة حالياً"""
+    return _applied_budget
@@ -6,6 +6,7 @@ from src.models.user import db, User
 from src.models.product import Product, ProductColor
 from src.models.gallery import UserPreference
 from src.main import app
+from src.migrations import upgrade
 
 def seed_database():
     """Add sample data to the database"""
@@ -13,6 +14,7 @@ def seed_database():
         # Clear existing data
         db.drop_all()
         db.create_all()
+        upgrade(db.engine)
         
         # Create sample users
         user1 = User(username='sara_beauty', email='sara@example.com')
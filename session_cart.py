@@ -0,0 +1,109 @@
+import os
+import uuid
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from src.catalog_cache import catalog_cache
+from src.cart_store import CartError, parse_lines
+
+# سلة الزائر المجهول تُحفظ في ملف تعريف ارتباط موقّع ولا تُكتب في قاعدة البيانات
+# إلا عند الدمج بعد تسجيل الدخول أو عند إتمام الشراء
+COOKIE_NAME = 'glowmirror_cart'
+COOKIE_MAX_AGE = int(os.environ.get('GLOWMIRROR_SESSION_CART_DAYS', 30)) * 24 * 60 * 60
+
+# لإبقاء ملف الارتباط ضمن حد 4KB في أغلب المتصفحات
+MAX_SESSION_LINES = 50
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='glowmirror-session-cart')
+
+def load_session_cart(request):
+    """قراءة سلة الزائر من ملف الارتباط؛ التوقيع غير الصالح يعني سلة فارغة"""
+    raw = request.cookies.get(COOKIE_NAME)
+    if raw:
+        try:
+            data = _serializer().loads(raw)
+            return {
+                'session_id': data['sid'],
+                'lines': {(product_id, color_id): quantity for product_id, color_id, quantity in data['lines']}
+            }
+        except (BadSignature, KeyError, TypeError, ValueError):
+            pass
+    return {'session_id': uuid.uuid4().hex, 'lines': {}}
+
+def save_session_cart(response, cart):
+    response.set_cookie(
+        COOKIE_NAME,
+        _serializer().dumps({
+            'sid': cart['session_id'],
+            'lines': [[product_id, color_id, quantity] for (product_id, color_id), quantity in cart['lines'].items()]
+        }),
+        max_age=COOKIE_MAX_AGE,
+        httponly=True,
+        samesite='Lax'
+    )
+    return response
+
+def clear_session_cart(response):
+    response.delete_cookie(COOKIE_NAME)
+    return response
+
+def apply_session_lines(cart, items, mode='add'):
+    """تعديل سلة الزائر في الذاكرة مع التحقق من المنتجات عبر لقطة الكتالوج"""
+    if mode not in ('add', 'set'):
+        raise CartError("Mode must be 'add' or 'set'")
+
+    for (product_id, color_id), quantity in parse_lines(items).items():
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            raise CartError('Product not found', 404)
+        color = next((color for color in product['colors'] if color['id'] == color_id), None)
+        if color is None:
+            raise CartError('Color not found or does not belong to this product', 404)
+
+        key = (product_id, color_id)
+        if mode == 'add':
+            quantity += cart['lines'].get(key, 0)
+        if quantity > (color['stock_quantity'] or 0):
+            raise CartError('Insufficient stock', 409)
+        if quantity > 0:
+            cart['lines'][key] = quantity
+        else:
+            cart['lines'].pop(key, None)
+
+    if len(cart['lines']) > MAX_SESSION_LINES:
+        raise CartError(f'At most {MAX_SESSION_LINES} items in a guest cart')
+    return cart
+
+def session_cart_to_dict(cart, user_id=None):
+    """تمثيل سلة الزائر بنفس شكل ShoppingCart.to_dict()"""
+    items = []
+    total_items = 0
+    total_amount = 0
+    for (product_id, color_id), quantity in cart['lines'].items():
+        product = catalog_cache.get_product(product_id)
+        if product is None:
+            continue
+        items.append({
+            'id': None,
+            'product_id': product_id,
+            'color_id': color_id,
+            'quantity': quantity,
+            'product': product
+        })
+        total_items += quantity
+        total_amount += quantity * product['price']
+
+    return {
+        'id': None,
+        'user_id': user_id,
+        'session_id': cart['session_id'],
+        'items': items,
+        'total_items': total_items,
+        'total_amount': total_amount
+    }
+
+def session_cart_items(cart):
+    return [
+        {'product_id': product_id, 'color_id': color_id, 'quantity': quantity}
+        for (product_id, color_id), quantity in cart['lines'].items()
+    ]
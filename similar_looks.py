@@ -0,0 +1,178 @@
+import time
+import threading
+from array import array
+import numpy as np
+
+# MinHash parameters (fixed seed so signatures are stable across processes)
+NUM_PERM = 16
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+_HASH_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_HASH_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_EMPTY_SIGNATURE = np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+
+# Product ids are 32-bit integer keys; anything else in a look is ignored
+MAX_PRODUCT_ID = 2 ** 31 - 1
+
+# Above this many postings the query ranks a capped candidate set by MinHash
+MAX_EXACT_POSTINGS = 200000
+
+def look_product_ids(products_used):
+    """Distinct product ids referenced by a look's products_used JSON"""
+    product_ids = set()
+    for product in products_used or []:
+        if not isinstance(product, dict):
+            continue
+        product_id = product.get('product_id')
+        if type(product_id) is int and 0 < product_id <= MAX_PRODUCT_ID:
+            product_ids.add(product_id)
+    return product_ids
+
+def minhash(product_ids):
+    if not product_ids:
+        return _EMPTY_SIGNATURE.copy()
+    ids = np.fromiter(product_ids, dtype=np.uint64, count=len(product_ids))
+    hashes = (np.outer(ids, _HASH_A) + _HASH_B) % _PRIME
+    return hashes.min(axis=0).astype(np.uint32)
+
+class SimilarLooksIndex:
+    """
+    Inverted index from product id to look ids plus a MinHash signature per
+    look, kept in flat arrays indexed by look id.
+
+    Looks saved or deleted in this process update the index directly; looks
+    saved by other workers are pulled in by id every refresh_interval
+    seconds, and looks deleted elsewhere are dropped when a query finds
+    them missing from the database. Only sync() advances the id it resumes
+    from, so this worker's own saves never skip lower ids saved elsewhere.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._indexed = np.zeros(0, dtype=bool)
+        self._alive = np.zeros(0, dtype=bool)
+        self._user = np.zeros(0, dtype=np.int32)
+        self._size = np.zeros(0, dtype=np.int16)
+        self._signatures = np.zeros((0, NUM_PERM), dtype=np.uint32)
+        self._synced_id = 0
+        self._synced_at = None
+
+    def _ensure_capacity(self, look_id):
+        capacity = len(self._alive)
+        if look_id < capacity:
+            return
+        new_capacity = max(look_id + 1, capacity * 2, 1024)
+        grow = new_capacity - capacity
+        self._indexed = np.concatenate([self._indexed, np.zeros(grow, dtype=bool)])
+        self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+        self._user = np.concatenate([self._user, np.zeros(grow, dtype=np.int32)])
+        self._size = np.concatenate([self._size, np.zeros(grow, dtype=np.int16)])
+        self._signatures = np.concatenate([self._signatures, np.zeros((grow, NUM_PERM), dtype=np.uint32)])
+
+    def add(self, look_id, user_id, products_used):
+        """Index a look saved by this worker (picked up by the first sync otherwise)"""
+        if self._synced_at is not None:
+            self._index(look_id, user_id, products_used)
+
+    def load(self, rows):
+        """Bulk-index (look_id, user_id, products_used) rows and mark the index as synced"""
+        synced_id = self._synced_id
+        for look_id, user_id, products_used in rows:
+            self._index(look_id, user_id, products_used)
+            synced_id = max(synced_id, look_id)
+        with self._lock:
+            self._synced_id = max(self._synced_id, synced_id)
+        self._synced_at = time.monotonic()
+
+    def _index(self, look_id, user_id, products_used):
+        product_ids = look_product_ids(products_used)
+        signature = minhash(product_ids)
+
+        with self._lock:
+            self._ensure_capacity(look_id)
+            # Already indexed by add() or an earlier sync (possibly since removed)
+            if self._indexed[look_id]:
+                return
+            self._indexed[look_id] = True
+            for product_id in product_ids:
+                self._postings.setdefault(product_id, array('i')).append(look_id)
+            self._alive[look_id] = bool(product_ids)
+            self._user[look_id] = user_id
+            self._size[look_id] = len(product_ids)
+            self._signatures[look_id] = signature
+
+    def remove(self, look_id):
+        """Tombstone a deleted look; its postings are skipped from now on"""
+        with self._lock:
+            if look_id < len(self._alive):
+                self._alive[look_id] = False
+
+    def sync(self):
+        """Pull in looks saved since the last sync (by any worker, including this one)"""
+        from src.models.gallery import SavedLook
+
+        query = SavedLook.query.with_entities(
+            SavedLook.id, SavedLook.user_id, SavedLook.products_used
+        ).filter(SavedLook.id > self._synced_id).order_by(SavedLook.id)
+
+        self.load((row.id, row.user_id, row.products_used) for row in query.yield_per(10000))
+
+    def ensure_fresh(self):
+        if self._synced_at is None or time.monotonic() - self._synced_at > self.refresh_interval:
+            self.sync()
+
+    def query(self, product_ids, exclude_user=None, k=10):
+        """
+        Top-k looks by Jaccard similarity to a product set, as a list of
+        (look_id, score). Exact via posting-list counts; when the postings
+        are too large, the rarest lists up to the cap are ranked by MinHash.
+        """
+        product_ids = set(product_ids)
+        if not product_ids:
+            return []
+
+        with self._lock:
+            lists = sorted(
+                (self._postings[p] for p in product_ids if p in self._postings),
+                key=len
+            )
+            exact = sum(len(postings) for postings in lists) <= MAX_EXACT_POSTINGS
+            chunks, total = [], 0
+            for postings in lists:
+                if not exact and chunks and total + len(postings) > MAX_EXACT_POSTINGS:
+                    break
+                chunks.append(np.array(postings, dtype=np.int32))
+                total += len(postings)
+            alive, users, sizes, signatures = self._alive, self._user, self._size, self._signatures
+
+        if not chunks:
+            return []
+
+        ids = np.concatenate(chunks)
+        keep = alive[ids]
+        if exclude_user is not None:
+            keep &= users[ids] != exclude_user
+        ids = ids[keep]
+        if not len(ids):
+            return []
+
+        candidates, overlap = np.unique(ids, return_counts=True)
+        if exact:
+            scores = overlap / (len(product_ids) + sizes[candidates] - overlap)
+        else:
+            target = minhash(product_ids)
+            scores = (signatures[candidates] == target).mean(axis=1)
+
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.lexsort((candidates[top], -scores[top]))]
+
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+# Shared per-process index
+similar_looks_index = SimilarLooksIndex()
@@ -0,0 +1,30 @@
+from src.models.user import db
+from datetime import datetime
+
+class StockReservation(db.Model):
+    """Stock held for an unpaid order; committed on payment, released on failure, cancellation or expiry"""
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    color_id = db.Column(db.Integer, db.ForeignKey('product_color.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='held')  # held, committed, released
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_stock_reservation_order_id', 'order_id'),
+        db.Index('ix_stock_reservation_status_expires_at', 'status', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f'<StockReservation {self.order_id}:{self.color_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'color_id': self.color_id,
+            'quantity': self.quantity,
+            'status': self.status,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+# The app builds its engine at import time, so point it at a throwaway
+# database before anything imports src.main
+_fd, DATABASE_PATH = tempfile.mkstemp(suffix='.db')
+os.close(_fd)
+os.environ['GLOWMIRROR_DATABASE_URI'] = f'sqlite:///{DATABASE_PATH}'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    app.config['TESTING'] = True
+    yield app
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE_PATH + suffix):
+            os.remove(DATABASE_PATH + suffix)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def db(app):
+    from src.models.user import db
+    with app.app_context():
+        yield db
+        db.session.rollback()
+
+@pytest.fixture
+def count_queries():
+    """Context manager yielding a list that collects every SQL statement executed inside it"""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        # Listen on every engine: reads may be routed to a replica
+        event.listen(Engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(Engine, 'before_cursor_execute', record)
+
+    return counter
@@ -0,0 +1,71 @@
+import itertools
+from datetime import datetime, timedelta
+
+_names = itertools.count()
+
+def make_order(db, status, payment_status, reservation_status='held'):
+    """An order of one unit with a payment transaction and a stock reservation; returns (order id, colour id)"""
+    from src.models.user import User
+    from src.models.product import Product, ProductColor
+    from src.models.order import Order, OrderItem
+    from src.models.payment import PaymentMethod, PaymentTransaction
+    from src.models.stock_reservation import StockReservation
+
+    name = f'cancel-{next(_names)}'
+    user = User(username=name, email=f'{name}@example.com')
+    product = Product(name=name, category='lipstick', brand='Test', price=10.0)
+    product.colors.append(ProductColor(color_name='Ruby', color_hex='#c44569', stock_quantity=0))
+    method = PaymentMethod(name='mada', display_name='Mada', is_active=True)
+    db.session.add_all([user, product, method])
+    db.session.flush()
+
+    order = Order(user_id=user.id, total_amount=10.0, status=status)
+    order.items.append(OrderItem(product_id=product.id, color_id=product.colors[0].id, quantity=1, unit_price=10.0))
+    db.session.add(order)
+    db.session.flush()
+    db.session.add(PaymentTransaction(order_id=order.id, payment_method_id=method.id, amount=10.0, status=payment_status))
+    db.session.add(StockReservation(
+        order_id=order.id, color_id=product.colors[0].id, quantity=1, status=reservation_status,
+        expires_at=datetime.utcnow() + timedelta(minutes=15)
+    ))
+    db.session.commit()
+    return order.id, product.colors[0].id
+
+def current(db, order_id, color_id):
+    from src.models.product import ProductColor
+    from src.models.order import Order
+    from src.models.payment import PaymentTransaction
+
+    db.session.expire_all()
+    payment = PaymentTransaction.query.filter_by(order_id=order_id).one()
+    return db.session.get(Order, order_id).status, payment.status, db.session.get(ProductColor, color_id).stock_quantity
+
+def test_cancel_claims_pending_payment(db, client):
+    order_id, color_id = make_order(db, 'pending', 'pending')
+
+    assert client.delete(f'/api/orders/{order_id}').status_code == 200
+    assert current(db, order_id, color_id) == ('cancelled', 'cancelled', 1)
+
+def test_cancel_waits_for_processing_payment(db, client):
+    order_id, color_id = make_order(db, 'pending', 'processing')
+
+    assert client.delete(f'/api/orders/{order_id}').status_code == 409
+    assert client.put(f'/api/orders/{order_id}/status', json={'status': 'cancelled'}).status_code == 409
+    assert current(db, order_id, color_id) == ('pending', 'processing', 0)
+
+def test_cancel_flags_completed_payment_for_refund(db, client):
+    order_id, color_id = make_order(db, 'confirmed', 'completed', 'committed')
+
+    assert client.put(f'/api/orders/{order_id}/status', json={'status': 'cancelled'}).status_code == 200
+    assert current(db, order_id, color_id) == ('cancelled', 'refund_pending', 1)
+
+def test_status_update_rejects_illegal_moves(db, client):
+    order_id, color_id = make_order(db, 'shipped', 'completed', 'committed')
+
+    assert client.put(f'/api/orders/{order_id}/status', json={'status': 'cancelled'}).status_code == 409
+    assert client.put(f'/api/orders/{order_id}/status', json={'status': 'lost'}).status_code == 400
+    assert current(db, order_id, color_id) == ('shipped', 'completed', 0)
+
+    response = client.put(f'/api/orders/{order_id}/status', json={'status': 'delivered'})
+    assert response.status_code == 200
+    assert response.get_json()['order']['status'] == 'delivered'
@@ -0,0 +1,65 @@
+import itertools
+
+_names = itertools.count()
+
+def make_orders(db, count, items_per_order=3):
+    """A user with `count` orders, each line on a different product and colour"""
+    from src.models.user import User
+    from src.models.product import Product, ProductColor
+    from src.models.order import Order, OrderItem
+
+    name = f'orders-{next(_names)}'
+    user = User(username=name, email=f'{name}@example.com')
+    db.session.add(user)
+    db.session.flush()
+
+    for order_number in range(count):
+        order = Order(user_id=user.id, total_amount=0, status='confirmed')
+        for line in range(items_per_order):
+            product = Product(name=f'{name}-{order_number}-{line}', category='lipstick', brand='Test', price=10.0)
+            product.colors.append(ProductColor(color_name='Ruby', color_hex='#c44569', stock_quantity=5))
+            product.colors.append(ProductColor(color_name='Rose', color_hex='#f8a5c2', stock_quantity=5))
+            db.session.add(product)
+            db.session.flush()
+            order.items.append(OrderItem(
+                product_id=product.id, color_id=product.colors[0].id, quantity=1, unit_price=product.price
+            ))
+            order.total_amount += product.price
+        db.session.add(order)
+
+    db.session.commit()
+    return user.id
+
+def serialize_orders(db, user_id):
+    from src.models.order import Order, order_load_options
+
+    db.session.expunge_all()
+    orders = Order.query.options(*order_load_options()).filter_by(user_id=user_id).all()
+    return [order.to_dict() for order in orders]
+
+def test_order_serialisation_query_count_is_constant(db, count_queries):
+    one = make_orders(db, 1)
+    many = make_orders(db, 20)
+
+    with count_queries() as single:
+        assert len(serialize_orders(db, one)) == 1
+    with count_queries() as batch:
+        serialized = serialize_orders(db, many)
+
+    assert len(serialized) == 20
+    assert all(item['product']['colors'] and item['color'] for order in serialized for item in order['items'])
+    assert len(batch) == len(single)
+
+def test_user_orders_endpoint_query_count_is_constant(db, client, count_queries):
+    one = make_orders(db, 1)
+    many = make_orders(db, 20)
+
+    with count_queries() as single:
+        response = client.get(f'/api/users/{one}/orders')
+    assert response.status_code == 200
+    with count_queries() as batch:
+        response = client.get(f'/api/users/{many}/orders')
+    assert response.status_code == 200
+    assert len(response.get_json()['orders']) == 20
+
+    assert len(batch) == len(single)
@@ -0,0 +1,19 @@
+from src.migrations import check_query_plans, plan_uses_indexes
+
+def test_hot_queries_use_indexes(db):
+    failures = check_query_plans(db.engine)
+    assert not failures, '\n'.join(f"{name}: {' | '.join(details)}" for name, details in failures.items())
+
+def test_plan_predicate_rejects_scans():
+    assert plan_uses_indexes('SELECT * FROM t WHERE a = 1', ['SEARCH t USING INDEX ix_t_a (a=?)'])
+    assert not plan_uses_indexes('SELECT * FROM t', ['SCAN t'])
+    # An ordered index walk only bounds the work when the query stops at LIMIT
+    top_k = 'SELECT * FROM t ORDER BY b DESC LIMIT 10'
+    assert plan_uses_indexes(top_k, ['SCAN t USING INDEX ix_t_b'])
+    assert not plan_uses_indexes('SELECT * FROM t ORDER BY b', ['SCAN t USING INDEX ix_t_b'])
+    assert not plan_uses_indexes(top_k, ['SCAN t USING INTEGER PRIMARY KEY'])
+    assert not plan_uses_indexes(top_k, ['SCAN t', 'USE TEMP B-TREE FOR ORDER BY'])
+    assert not plan_uses_indexes(
+        'SELECT * FROM t WHERE a = 1 ORDER BY b',
+        ['SEARCH t USING INDEX ix_t_a (a=?)', 'USE TEMP B-TREE FOR ORDER BY']
+    )
@@ -0,0 +1,110 @@
+import os
+import math
+import time
+import threading
+from datetime import datetime
+from sqlalchemy import case, func
+from src.models.user import db
+from src.models.popularity import ProductPopularity
+from src.database_config import dialect_insert
+
+# Scores are stored as log(sum(weight * exp(DECAY * (t - EPOCH)))). Every
+# stored score shares the same decay factor, so ranking by the stored value
+# equals ranking by the decayed value, and a purchase is a single atomic
+# log-add. Keeping the log means the weights never overflow however far
+# from EPOCH a purchase is: the log of one weight grows linearly with time.
+EPOCH = datetime(2025, 1, 1)
+HALF_LIFE_DAYS = float(os.environ.get('GLOWMIRROR_TRENDING_HALF_LIFE_DAYS', 7))
+DECAY = math.log(2) / (HALF_LIFE_DAYS * 24 * 60 * 60)
+
+TOP_K = 50
+
+def log_weight(at=None):
+    """Log of the weight of one purchase at time `at`, expressed at EPOCH"""
+    at = at or datetime.utcnow()
+    return DECAY * (at - EPOCH).total_seconds()
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without leaving log space"""
+    high, low = (a, b) if a >= b else (b, a)
+    return high + math.log1p(math.exp(low - high))
+
+def sql_log_add(a, b):
+    """log_add() as a SQL expression, for the atomic upsert"""
+    return case(
+        (a >= b, a + func.ln(1 + func.exp(b - a))),
+        else_=b + func.ln(1 + func.exp(a - b))
+    )
+
+def decayed(score, now=None):
+    """Convert a stored (log) score to its value at `now`"""
+    return math.exp(score - log_weight(now))
+
+def record_purchases(lines, at=None):
+    """
+    Add purchases to the popularity counters in the caller's transaction.
+    `lines` is an iterable of (product_id, category) pairs, one per order line.
+    """
+    weight = log_weight(at)
+    increments = {}
+    for product_id, category in lines:
+        entry = increments.setdefault(product_id, {'category': category, 'lines': 0})
+        entry['lines'] += 1
+
+    for product_id, entry in increments.items():
+        statement = dialect_insert(ProductPopularity, db.session).values(
+            product_id=product_id,
+            category=entry['category'],
+            score=weight + math.log(entry['lines']),
+            order_count=entry['lines'],
+            updated_at=datetime.utcnow()
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[ProductPopularity.product_id],
+            set_={
+                'score': sql_log_add(ProductPopularity.score, statement.excluded.score),
+                'order_count': ProductPopularity.order_count + statement.excluded.order_count,
+                'updated_at': statement.excluded.updated_at
+            }
+        )
+        db.session.execute(statement)
+
+class TrendingCache:
+    """
+    Per-process top-K lists (overall and per category), refreshed from the
+    score indexes every refresh_interval seconds. Each refresh reads K rows.
+    """
+
+    def __init__(self, k=TOP_K, refresh_interval=30):
+        self.k = k
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._lists = {}
+
+    def top(self, category=None, limit=10):
+        cached = self._lists.get(category)
+        if cached is None or time.monotonic() - cached[0] > self.refresh_interval:
+            cached = self._refresh(category)
+        return cached[1][:limit]
+
+    def _refresh(self, category):
+        query = db.session.query(
+            ProductPopularity.product_id,
+            ProductPopularity.score,
+            ProductPopularity.order_count
+        )
+        if category:
+            query = query.filter(ProductPopularity.category == category)
+        rows = query.order_by(ProductPopularity.score.desc()).limit(self.k).all()
+
+        cached = (time.monotonic(), [(row.product_id, row.score, row.order_count) for row in rows])
+        with self._lock:
+            self._lists[category] = cached
+        return cached
+
+    def invalidate(self):
+        with self._lock:
+            self._lists = {}
+
+# Shared per-process top-K lists
+trending_cache = TrendingCache()
@@ -0,0 +1,164 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import threading
+
+# حجم الجزء الذي يُقرأ من الطلب في كل مرة
+CHUNK_SIZE = 64 * 1024
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class UploadError(Exception):
+    """خطأ في تخزين الملف المرفوع"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class UploadStore:
+    """
+    مخزن الصور المرفوعة حسب بصمة المحتوى (SHA-256)
+    الملفات تُحفظ في مسار مجزأ uploads/ab/cd/<hash> مع إزالة التكرار
+    وحصة تخزين ومدة صلاحية تُطبق بواسطة منظف في الخلفية
+    """
+
+    def __init__(self, root, max_file_size, quota_bytes, ttl_seconds, sweep_interval=300):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.max_file_size = max_file_size
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self.used_bytes = self._disk_usage()
+
+    def path_for(self, content_hash):
+        """مسار الملف المجزأ لبصمة معينة"""
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash)
+
+    def save(self, stream):
+        """
+        حفظ الملف بالتدفق إلى القرص مع حساب البصمة في نفس الوقت
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+
+        try:
+            with open(tmp_path, 'wb') as tmp_file:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        raise UploadError('File too large', 413)
+
+                    hasher.update(chunk)
+                    tmp_file.write(chunk)
+
+            if size == 0:
+                raise UploadError('Empty file')
+
+            content_hash = hasher.hexdigest()
+            final_path = self.path_for(content_hash)
+
+            with self._lock:
+                # الملف موجود مسبقاً: تجديد صلاحيته فقط
+                if os.path.exists(final_path):
+                    os.remove(tmp_path)
+                    os.utime(final_path)
+                    return {'hash': content_hash, 'size': size, 'path': final_path, 'deduplicated': True}
+
+                if self.used_bytes + size > self.quota_bytes:
+                    self._sweep_locked()
+                    if self.used_bytes + size > self.quota_bytes:
+                        raise UploadError('Upload storage quota exceeded', 507)
+
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+                self.used_bytes += size
+
+            return {'hash': content_hash, 'size': size, 'path': final_path, 'deduplicated': False}
+
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def resolve(self, content_hash):
+        """
+        الحصول على مسار ملف مرفوع من بصمته، أو None إذا لم يكن موجوداً
+        """
+        if not content_hash or not HASH_PATTERN.match(content_hash):
+            return None
+
+        path = self.path_for(content_hash)
+        try:
+            # كل استخدام يجدد صلاحية الملف
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def sweep(self):
+        """حذف الملفات المنتهية الصلاحية"""
+        with self._lock:
+            return self._sweep_locked()
+
+    def _sweep_locked(self):
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        used = 0
+
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.tmp_dir:
+                continue
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                    else:
+                        used += stat.st_size
+                except FileNotFoundError:
+                    continue
+
+        self.used_bytes = used
+        return removed
+
+    def _disk_usage(self):
+        used = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.tmp_dir:
+                continue
+            for filename in filenames:
+                try:
+                    used += os.path.getsize(os.path.join(dirpath, filename))
+                except FileNotFoundError:
+                    continue
+        return used
+
+    def start_sweeper(self):
+        """تشغيل المنظف الدوري في خيط خلفي"""
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    self.sweep()
+                except OSError:
+                    pass
+
+        self._sweeper = threading.Thread(target=run, name='upload-sweeper', daemon=True)
+        self._sweeper.start()
@@ -1,12 +1,24 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.pagination import parse_page_args, paginate_query, project
 
 user_bp = Blueprint('user', __name__)
 
+USER_FIELDS = ['id', 'username', 'email']
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users])
+    try:
+        limit, cursor, fields = parse_page_args(USER_FIELDS)
+        users, next_cursor = paginate_query(User.query, [User.id], limit, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The body stays a plain list; the next page cursor travels in a header
+    response = jsonify([project(user.to_dict(), fields) for user in users])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():